@@ -0,0 +1,327 @@
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+from db import connection_kwargs, get_db_config
+
+logger = logging.getLogger(__name__)
+
+# Filters shared by every report: $1/$2 bound order_timestamp (-infinity and
+# infinity when unset), $3 is an optional array of store ids
+ORDER_FILTER = """
+    o.order_timestamp >= $1 AND o.order_timestamp < $2
+    AND ($3::integer[] IS NULL OR o.store_id = ANY($3))
+"""
+
+# The queries of sql/analysis_queries.sql with date range, store filter and
+# top-N parameters; without filters they return the same rows as the raw queries
+REPORTS = OrderedDict([
+    ('total_sales_revenue_per_store', f"""
+        SELECT
+            s.store_id,
+            s.city,
+            COUNT(o.order_id) as total_orders,
+            SUM(o.total_amount) as total_revenue,
+            ROUND(AVG(o.total_amount), 2) as avg_order_value
+        FROM Stores s
+        JOIN Orders o ON s.store_id = o.store_id
+        WHERE {ORDER_FILTER}
+        GROUP BY s.store_id, s.city
+        ORDER BY total_revenue DESC
+    """),
+    ('top_10_most_valuable_customers', f"""
+        SELECT
+            c.customer_id,
+            c.first_name,
+            c.last_name,
+            c.email,
+            COUNT(o.order_id) as total_orders,
+            SUM(o.total_amount) as total_spent,
+            ROUND(AVG(o.total_amount), 2) as avg_order_value
+        FROM Customers c
+        JOIN Orders o ON c.customer_id = o.customer_id
+        WHERE {ORDER_FILTER}
+        GROUP BY c.customer_id, c.first_name, c.last_name, c.email
+        ORDER BY total_spent DESC
+        LIMIT $4
+    """),
+    ('most_popular_menu_items_by_quantity_sold', f"""
+        SELECT
+            mi.name,
+            mi.category,
+            mi.size,
+            SUM(oi.quantity) as total_quantity_sold,
+            SUM(oi.quantity * oi.unit_price) as total_revenue
+        FROM Menu_Items mi
+        JOIN Order_Items oi ON mi.item_id = oi.item_id
+        JOIN Orders o ON o.order_id = oi.order_id
+        WHERE {ORDER_FILTER}
+        GROUP BY mi.item_id, mi.name, mi.category, mi.size
+        ORDER BY total_quantity_sold DESC
+        LIMIT $4
+    """),
+    ('average_order_value', f"""
+        SELECT
+            ROUND(AVG(o.total_amount), 2) as overall_avg_order_value,
+            MIN(o.total_amount) as min_order_value,
+            MAX(o.total_amount) as max_order_value
+        FROM Orders o
+        WHERE {ORDER_FILTER}
+    """),
+    ('busiest_hours_of_the_day_for_orders', f"""
+        SELECT
+            EXTRACT(HOUR FROM o.order_timestamp) as hour_of_day,
+            COUNT(*) as order_count,
+            ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (), 2) as percentage
+        FROM Orders o
+        WHERE {ORDER_FILTER}
+        GROUP BY hour_of_day
+        ORDER BY order_count DESC
+    """),
+    ('monthly_revenue_trend', f"""
+        SELECT
+            DATE_TRUNC('month', o.order_timestamp) as month,
+            COUNT(*) as order_count,
+            SUM(o.total_amount) as monthly_revenue
+        FROM Orders o
+        WHERE {ORDER_FILTER}
+        GROUP BY month
+        ORDER BY month
+    """),
+    ('customer_retention_analysis', f"""
+        SELECT
+            COUNT(DISTINCT customer_id) as total_customers,
+            COUNT(DISTINCT CASE WHEN order_count > 1 THEN customer_id END) as returning_customers,
+            ROUND(COUNT(DISTINCT CASE WHEN order_count > 1 THEN customer_id END) * 100.0 / NULLIF(COUNT(DISTINCT customer_id), 0), 2) as retention_rate
+        FROM (
+            SELECT o.customer_id, COUNT(*) as order_count
+            FROM Orders o
+            WHERE {ORDER_FILTER}
+            GROUP BY o.customer_id
+        ) customer_orders
+    """),
+])
+
+# Default top-N of the reports that take a limit
+REPORT_LIMITS = {
+    'top_10_most_valuable_customers': 10,
+    'most_popular_menu_items_by_quantity_sold': 15,
+}
+
+# Changes whenever orders are appended, updated or deleted (the statistics
+# counters trail writes until the writing session flushes them, at most
+# about ten seconds for an idle one; the result TTL bounds the rest).
+# pg_partition_tree() returns nothing for a plain table, so the tables
+# themselves are listed too.
+WATERMARK_SQL = """
+    SELECT
+        (SELECT MAX(order_id) FROM Orders),
+        (SELECT COALESCE(SUM(n_tup_ins + n_tup_upd + n_tup_del), 0)
+         FROM pg_stat_user_tables
+         WHERE relid IN (SELECT relid FROM pg_partition_tree('orders') UNION SELECT 'orders'::regclass
+                         UNION SELECT relid FROM pg_partition_tree('order_items')
+                         UNION SELECT 'order_items'::regclass))
+"""
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ttl seconds"""
+
+    def __init__(self, maxsize=256, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class AnalyticsClient:
+    """Run the analysis reports over pooled connections with prepared statements
+
+    Connections (and their TLS sessions) are reused from a psycopg2
+    ThreadedConnectionPool. minconn defaults to maxconn because the pool
+    closes returned connections above minconn, and a fresh connection has
+    to PREPARE every report again. Each report is PREPAREd once per
+    connection and then EXECUTEd with its parameters. Results are cached per report,
+    parameters and data watermark, so repeated dashboard hits are served
+    from memory until the orders change or the TTL runs out. Prepared
+    statements need session-level pooling if a connection pooler such as
+    PgBouncer sits in between.
+    """
+
+    def __init__(self, db_config=None, minconn=None, maxconn=10, cache_size=256, cache_ttl=60.0,
+                 watermark_ttl=1.0):
+        minconn = maxconn if minconn is None else minconn
+        self.pool = ThreadedConnectionPool(minconn, maxconn, **connection_kwargs(db_config or get_db_config()))
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.watermark_ttl = watermark_ttl
+        self._watermark = None
+        self._watermark_checked = 0.0
+        self._prepared = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.pool.closeall()
+        self._prepared.clear()
+
+    def _with_connection(self, func):
+        """Run func(conn, cursor) on a pooled connection, retrying once on a broken connection"""
+        for attempt in range(2):
+            conn = self.pool.getconn()
+            broken = False
+            try:
+                if conn not in self._prepared:
+                    conn.set_session(readonly=True, autocommit=True)
+                    self._prepared[conn] = set()
+                with conn.cursor() as cur:
+                    return func(conn, cur)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+                self._prepared.pop(conn, None)
+                if attempt:
+                    raise
+                logger.warning("Discarding broken pooled connection and retrying")
+            finally:
+                self.pool.putconn(conn, close=broken)
+                if conn.closed:
+                    # Closed by the pool: its prepared statements are gone with it
+                    self._prepared.pop(conn, None)
+
+    def watermark(self):
+        """Return the data watermark, re-read at most every watermark_ttl seconds"""
+        with self._lock:
+            if self._watermark is not None and time.monotonic() - self._watermark_checked < self.watermark_ttl:
+                return self._watermark
+
+        def read(conn, cur):
+            cur.execute(WATERMARK_SQL)
+            return cur.fetchone()
+
+        watermark = self._with_connection(read)
+        with self._lock:
+            self._watermark = watermark
+            self._watermark_checked = time.monotonic()
+        return watermark
+
+    def run(self, name, start=None, end=None, stores=None, limit=None):
+        """Run a report by name and return its rows as a list of dicts
+
+        start/end bound order_timestamp (start inclusive, end exclusive),
+        stores restricts the report to a list of store ids and limit is the
+        top-N of the reports that have one.
+        """
+        if name not in REPORTS:
+            raise ValueError(f"Unknown report: {name} (choose from {', '.join(REPORTS)})")
+        params = [start or '-infinity', end or 'infinity', list(stores) if stores is not None else None]
+        if name in REPORT_LIMITS:
+            params.append(limit if limit is not None else REPORT_LIMITS[name])
+
+        key = (name, tuple(map(str, params)), self.watermark())
+        rows = self.cache.get(key)
+        if rows is None:
+            rows = self._with_connection(lambda conn, cur: self._execute(conn, cur, name, params))
+            self.cache.put(key, rows)
+        return [dict(row) for row in rows]
+
+    def _execute(self, conn, cur, name, params):
+        statement = f"analytics_{name}"
+        if name not in self._prepared[conn]:
+            types = ['timestamp', 'timestamp', 'integer[]'] + ['integer'] * (name in REPORT_LIMITS)
+            cur.execute(f"PREPARE {statement} ({', '.join(types)}) AS {REPORTS[name]}")
+            self._prepared[conn].add(name)
+        cur.execute(f"EXECUTE {statement} ({', '.join(['%s'] * len(params))})", params)
+        columns = [column.name for column in cur.description]
+        return [tuple(zip(columns, row)) for row in cur.fetchall()]
+
+    # One function per query in sql/analysis_queries.sql
+
+    def revenue_per_store(self, start=None, end=None, stores=None):
+        return self.run('total_sales_revenue_per_store', start, end, stores)
+
+    def top_customers(self, start=None, end=None, stores=None, limit=10):
+        return self.run('top_10_most_valuable_customers', start, end, stores, limit)
+
+    def popular_menu_items(self, start=None, end=None, stores=None, limit=15):
+        return self.run('most_popular_menu_items_by_quantity_sold', start, end, stores, limit)
+
+    def average_order_value(self, start=None, end=None, stores=None):
+        return self.run('average_order_value', start, end, stores)
+
+    def busiest_hours(self, start=None, end=None, stores=None):
+        return self.run('busiest_hours_of_the_day_for_orders', start, end, stores)
+
+    def monthly_revenue(self, start=None, end=None, stores=None):
+        return self.run('monthly_revenue_trend', start, end, stores)
+
+    def customer_retention(self, start=None, end=None, stores=None):
+        return self.run('customer_retention_analysis', start, end, stores)
+
+
+def main():
+    """Run a report through the analytics client and print it as JSON"""
+    import argparse
+
+    def day(value):
+        return datetime.strptime(value, '%Y-%m-%d')
+
+    parser = argparse.ArgumentParser(description='Run RushMore Pizzeria analysis reports')
+    parser.add_argument('report', choices=list(REPORTS))
+    parser.add_argument('--start', type=day, default=None, metavar='YYYY-MM-DD',
+                        help='Only orders on or after this date')
+    parser.add_argument('--end', type=day, default=None, metavar='YYYY-MM-DD',
+                        help='Only orders before this date')
+    parser.add_argument('--store', type=int, action='append', default=None, dest='stores',
+                        help='Restrict to a store id (repeatable)')
+    parser.add_argument('--limit', type=int, default=None,
+                        help='Top-N for the reports that have one')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Run the report several times and log the latency of each run')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    with AnalyticsClient(maxconn=2) as client:
+        for run in range(args.repeat):
+            started = time.perf_counter()
+            rows = client.run(args.report, args.start, args.end, args.stores, args.limit)
+            logger.info(f"Run {run + 1}: {len(rows)} rows in {(time.perf_counter() - started) * 1000:.2f} ms "
+                        f"(cache hits {client.cache.hits}, misses {client.cache.misses})")
+    print(json.dumps(rows, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
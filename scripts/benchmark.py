@@ -0,0 +1,386 @@
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import platform
+import statistics
+import subprocess
+import tempfile
+import logging
+from datetime import datetime, timezone
+import psycopg2
+from db import connection_kwargs, get_db_config
+from populate_database import DatabasePopulator
+from queries import load_analysis_queries
+from workload import WorkloadModel
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sql', 'schema.sql')
+
+# Scale factor 1 is the populator's default size
+SCALE_CUSTOMERS = 1000
+SCALE_ORDERS = 5000
+
+# Tables whose rows are written by each population stage
+STAGE_TABLES = {
+    'stores': ['Stores'],
+    'customers': ['Customers'],
+    'ingredients': ['Ingredients'],
+    'menu_items': ['Menu_Items'],
+    'menu_item_ingredients': ['Menu_Item_Ingredients'],
+    'orders': ['Orders', 'Order_Items']
+}
+
+# Stages and queries faster than this are reported but too noisy to flag
+MIN_COMPARABLE_SECONDS = 0.1
+MIN_COMPARABLE_MS = 1.0
+
+
+def find_pg_bin(pg_bin=None):
+    """Locate the directory holding initdb and pg_ctl"""
+    if pg_bin:
+        return pg_bin
+    initdb = shutil.which('initdb')
+    if initdb:
+        return os.path.dirname(initdb)
+    try:
+        return subprocess.run(['pg_config', '--bindir'], check=True, capture_output=True,
+                              text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        raise RuntimeError("Cannot find initdb; put the PostgreSQL binaries on PATH or pass --pg-bin")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class TemporaryPostgres:
+    """Throwaway PostgreSQL cluster created with initdb in a temporary directory
+
+    The server listens on a unix socket in the temporary directory only, so
+    it never clashes with a local installation. It is stopped and removed
+    on exit.
+    """
+
+    def __init__(self, pg_bin=None, settings=None):
+        self.pg_bin = find_pg_bin(pg_bin)
+        self.settings = dict(settings or {})
+        self.base_dir = None
+        self.port = None
+
+    def _run(self, program, *args):
+        return subprocess.run([os.path.join(self.pg_bin, program)] + list(args), check=True,
+                              capture_output=True, text=True)
+
+    def __enter__(self):
+        if hasattr(os, 'geteuid') and os.geteuid() == 0:
+            raise RuntimeError("PostgreSQL refuses to run as root; run the benchmark as an unprivileged "
+                               "user or point it at an existing database with --use-env")
+        self.base_dir = tempfile.mkdtemp(prefix='rushmore_bench_')
+        data_dir = os.path.join(self.base_dir, 'data')
+        self.port = free_port()
+        try:
+            self._run('initdb', '-D', data_dir, '-U', 'postgres', '-A', 'trust', '-E', 'UTF8')
+            options = [f"-p {self.port}", f"-k {self.base_dir}", "-c listen_addresses=''"]
+            options += [f"-c {name}={value}" for name, value in self.settings.items()]
+            self._run('pg_ctl', '-D', data_dir, '-l', os.path.join(self.base_dir, 'server.log'),
+                      '-o', ' '.join(options), '-w', 'start')
+        except subprocess.CalledProcessError as e:
+            shutil.rmtree(self.base_dir, ignore_errors=True)
+            raise RuntimeError(f"Could not start temporary PostgreSQL: {e.stderr.strip()}")
+        logger.info(f"Started temporary PostgreSQL in {self.base_dir} on port {self.port}")
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self._run('pg_ctl', '-D', os.path.join(self.base_dir, 'data'), '-m', 'fast', '-w', 'stop')
+        finally:
+            shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def db_config(self, database):
+        return {
+            'host': self.base_dir,
+            'database': database,
+            'user': 'postgres',
+            'password': '',
+            'port': str(self.port),
+            'sslmode': 'disable'
+        }
+
+
+def create_database(admin_config, database):
+    """(Re)create a database and apply sql/schema.sql to it"""
+    conn = connect(dict(admin_config, database='postgres'))
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"DROP DATABASE IF EXISTS {database}")
+            cur.execute(f"CREATE DATABASE {database}")
+    finally:
+        conn.close()
+
+    config = dict(admin_config, database=database)
+    with open(SCHEMA_PATH) as f:
+        schema = f.read()
+    conn = connect(config)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(schema)
+        conn.commit()
+    finally:
+        conn.close()
+    return config
+
+
+def connect(config):
+    return psycopg2.connect(**connection_kwargs(config))
+
+
+def benchmark_population(populator, customers, orders):
+    """Time every population stage; returns {stage: {seconds, rows, rows_per_second}}"""
+    results = {}
+    populator.connect()
+    try:
+        populator.clear_existing_data()
+        for name, stage in populator.stages(customers, orders):
+            started = time.perf_counter()
+            stage()
+            seconds = time.perf_counter() - started
+            rows = 0
+            for table in STAGE_TABLES[name]:
+                populator.cur.execute(f"SELECT COUNT(*) FROM {table}")
+                rows += populator.cur.fetchone()[0]
+            results[name] = {
+                'seconds': round(seconds, 4),
+                'rows': rows,
+                'rows_per_second': round(rows / seconds, 1) if seconds > 0 else None
+            }
+            logger.info(f"Stage {name}: {rows} rows in {seconds:.3f}s")
+    finally:
+        populator.disconnect()
+    return results
+
+
+def benchmark_queries(config, queries, repeat=5, warmup=1):
+    """Time every analysis query and capture its EXPLAIN (ANALYZE, BUFFERS) plan"""
+    results = {}
+    conn = connect(config)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            # Fresh statistics so plans are comparable between runs
+            cur.execute("VACUUM ANALYZE")
+            for name, sql in queries.items():
+                for _ in range(warmup):
+                    cur.execute(sql)
+                    cur.fetchall()
+                timings = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    cur.execute(sql)
+                    rows = len(cur.fetchall())
+                    timings.append((time.perf_counter() - started) * 1000)
+                cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+                plan = cur.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                plan = plan[0]
+                timings.sort()
+                results[name] = {
+                    'rows': rows,
+                    'median_ms': round(statistics.median(timings), 3),
+                    'min_ms': round(timings[0], 3),
+                    'max_ms': round(timings[-1], 3),
+                    'p95_ms': round(timings[min(len(timings) - 1, int(0.95 * len(timings)))], 3),
+                    'execution_ms': plan.get('Execution Time'),
+                    'planning_ms': plan.get('Planning Time'),
+                    'shared_hit_blocks': plan['Plan'].get('Shared Hit Blocks'),
+                    'shared_read_blocks': plan['Plan'].get('Shared Read Blocks'),
+                    'plan': plan
+                }
+                logger.info(f"Query {name}: median {results[name]['median_ms']:.2f} ms over {repeat} runs")
+    finally:
+        conn.close()
+    return results
+
+
+def server_version(config):
+    conn = connect(config)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SHOW server_version")
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], check=True, capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(current, baseline, threshold):
+    """Compare two result documents; returns a list of regression messages
+
+    Stage throughput regresses when rows/s drops by more than threshold,
+    query latency when the median grows by more than threshold. Only scale
+    factors, stages and queries present in both documents are compared, and
+    only flagged when the baseline is above the noise floor.
+    """
+    regressions = []
+    baseline_runs = {run['scale']: run for run in baseline.get('runs', [])}
+    for run in current['runs']:
+        previous = baseline_runs.get(run['scale'])
+        if previous is None:
+            continue
+        for stage, result in run['stages'].items():
+            baseline_stage = previous['stages'].get(stage, {})
+            before = baseline_stage.get('rows_per_second')
+            after = result.get('rows_per_second')
+            if before and after is not None:
+                change = after / before - 1
+                logger.info(f"scale {run['scale']} stage {stage}: {before:.0f} -> {after:.0f} rows/s ({change:+.1%})")
+                if change < -threshold and baseline_stage['seconds'] >= MIN_COMPARABLE_SECONDS:
+                    regressions.append(f"scale {run['scale']} stage {stage} throughput {change:+.1%}")
+        for query, result in run['queries'].items():
+            before = previous['queries'].get(query, {}).get('median_ms')
+            after = result['median_ms']
+            if before:
+                change = after / before - 1
+                logger.info(f"scale {run['scale']} query {query}: {before:.2f} -> {after:.2f} ms ({change:+.1%})")
+                if change > threshold and before >= MIN_COMPARABLE_MS:
+                    regressions.append(f"scale {run['scale']} query {query} latency {change:+.1%}")
+    return regressions
+
+
+def run_benchmark(args, admin_config, database, temporary):
+    queries = load_analysis_queries()
+    workload = WorkloadModel.from_yaml(args.workload) if args.workload else None
+    runs = []
+    version = None
+    for scale in args.scales:
+        customers = max(1, int(SCALE_CUSTOMERS * scale))
+        orders = max(1, int(SCALE_ORDERS * scale))
+        logger.info(f"Benchmarking scale factor {scale}: {customers} customers, {orders} orders")
+
+        # Every scale factor starts from a fresh database in the temporary cluster
+        config = create_database(admin_config, database) if temporary else admin_config
+        version = version or server_version(config)
+        populator = DatabasePopulator(loader=args.loader, copy_format=args.copy_format,
+                                      chunk_size=args.chunk_size, workers=args.workers,
+                                      seed=args.seed, db_config=config, generator=args.generator,
+                                      workload=workload)
+        stages = benchmark_population(populator, customers, orders)
+        runs.append({
+            'scale': scale,
+            'customers': customers,
+            'orders': orders,
+            'stages': stages,
+            'load_seconds': round(sum(stage['seconds'] for stage in stages.values()), 4),
+            'queries': benchmark_queries(config, queries, repeat=args.repeat, warmup=args.warmup)
+        })
+
+    return {
+        'metadata': {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'git_commit': git_commit(),
+            'postgres_version': version,
+            'python_version': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'temporary_cluster': temporary,
+            'options': {
+                'scales': args.scales,
+                'repeat': args.repeat,
+                'warmup': args.warmup,
+                'loader': args.loader,
+                'copy_format': args.copy_format,
+                'chunk_size': args.chunk_size,
+                'workers': args.workers,
+                'seed': args.seed,
+                'generator': args.generator,
+                'workload': args.workload
+            }
+        },
+        'runs': runs
+    }
+
+
+def main():
+    """Benchmark the population stages and analysis queries at several scale factors"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark RushMore Pizzeria data population and analysis queries')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10],
+                        help=f'Scale factors; 1 = {SCALE_CUSTOMERS} customers and {SCALE_ORDERS} orders (default: 1 10)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Timed runs per query (default: 5)')
+    parser.add_argument('--warmup', type=int, default=1,
+                        help='Untimed warm-up runs per query (default: 1)')
+    parser.add_argument('--output', default='benchmark_results.json',
+                        help='JSON results file (default: benchmark_results.json)')
+    parser.add_argument('--compare', default=None,
+                        help='Previous JSON results to compare against; exits non-zero on regressions')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative change treated as a regression with --compare (default: 0.2)')
+    parser.add_argument('--use-env', action='store_true',
+                        help='Benchmark the DB_* database from the environment instead of a temporary cluster '
+                             '(its data is replaced)')
+    parser.add_argument('--pg-bin', default=None,
+                        help='Directory with initdb and pg_ctl (default: from PATH or pg_config)')
+    parser.add_argument('--pg-setting', action='append', default=[], metavar='NAME=VALUE',
+                        help='Server setting for the temporary cluster, e.g. shared_buffers=256MB (repeatable)')
+    parser.add_argument('--loader', choices=['copy', 'batch'], default='copy',
+                        help='Load backend (default: copy)')
+    parser.add_argument('--copy-format', choices=['text', 'binary'], default='text',
+                        help='COPY data format (default: text)')
+    parser.add_argument('--chunk-size', type=int, default=10000,
+                        help='Rows generated and flushed per chunk (default: 10000)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes for customers and orders (default: 1)')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Seed so every run loads the same data (default: 42)')
+    parser.add_argument('--generator', choices=['python', 'numpy'], default='python',
+                        help='Order generator (default: python)')
+    parser.add_argument('--workload', default=None,
+                        help='YAML workload model for order traffic (default: uniform)')
+
+    args = parser.parse_args()
+
+    try:
+        if args.use_env:
+            config = get_db_config()
+            results = run_benchmark(args, config, config['database'], temporary=False)
+        else:
+            settings = dict(setting.split('=', 1) for setting in args.pg_setting)
+            with TemporaryPostgres(args.pg_bin, settings) as server:
+                results = run_benchmark(args, server.db_config('postgres'), 'rushmore_bench', temporary=True)
+    except (RuntimeError, psycopg2.Error) as e:
+        logger.error(f"Benchmark failed: {e}")
+        sys.exit(1)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, default=str)
+    logger.info(f"Wrote benchmark results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        for regression in regressions:
+            logger.warning(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        logger.info("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import os
+from collections import OrderedDict
+
+import yaml
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'config', 'catalog.yaml')
+
+
+def _quantities(recipe, where):
+    """Validate an {ingredient: quantity} mapping from the spec"""
+    quantities = OrderedDict()
+    for ingredient, quantity in (recipe or {}).items():
+        quantity = float(quantity)
+        if quantity <= 0:
+            raise ValueError(f"Catalog {where}: quantity of '{ingredient}' must be positive")
+        quantities[str(ingredient)] = quantity
+    return quantities
+
+
+class Catalog:
+    """Ingredients, menu items and recipes loaded from a YAML spec
+
+    Menu items and recipes are indexed by (name, size), so linking the rows
+    written to the database back to their recipes is one dict lookup per
+    item. Every recipe is checked against the ingredient list when the
+    catalog is built.
+    """
+
+    def __init__(self, ingredients, menu_items, recipes):
+        self.ingredients = list(ingredients)
+        self.menu_items = list(menu_items)
+        self.recipes = dict(recipes)
+        self.validate()
+
+    @classmethod
+    def from_yaml(cls, path=CATALOG_PATH):
+        """Load a catalog from a YAML file (config/catalog.yaml by default)"""
+        with open(path) as f:
+            config = yaml.safe_load(f) or {}
+        return cls.from_spec(config)
+
+    @classmethod
+    def from_spec(cls, config):
+        """Build a catalog from a parsed spec (see config/catalog.yaml)"""
+        ingredients = [(str(entry['name']), str(entry['unit']), float(entry.get('stock', 0.0)))
+                       for entry in config.get('ingredients') or []]
+        category_recipes = {category: _quantities(recipe, f"category '{category}'")
+                            for category, recipe in (config.get('category_recipes') or {}).items()}
+
+        menu_items = []
+        recipes = {}
+        for entry in config.get('menu') or []:
+            name, category = str(entry['name']), str(entry['category'])
+            sizes = entry.get('sizes') or {}
+            if not sizes:
+                raise ValueError(f"Catalog item '{name}' has no sizes")
+            base = category_recipes.get(category, OrderedDict()).copy()
+            base.update(_quantities(entry.get('recipe'), f"item '{name}'"))
+            size_recipes = entry.get('size_recipes') or {}
+            unknown = set(map(str, size_recipes)) - set(map(str, sizes))
+            if unknown:
+                raise ValueError(f"Catalog item '{name}' has recipes for unknown sizes: {', '.join(sorted(unknown))}")
+            for size, price in sizes.items():
+                size = str(size)
+                key = (name, size)
+                if key in recipes:
+                    raise ValueError(f"Catalog item '{name}' ({size}) is defined twice")
+                recipe = base.copy()
+                recipe.update(_quantities(size_recipes.get(size), f"item '{name}' ({size})"))
+                menu_items.append((name, category, size, float(price)))
+                recipes[key] = recipe
+        return cls(ingredients, menu_items, recipes)
+
+    def validate(self):
+        """Raise ValueError on duplicate ingredients or recipes using unknown ingredients"""
+        names = [name for name, _, _ in self.ingredients]
+        if len(set(names)) != len(names):
+            raise ValueError("Catalog lists an ingredient more than once")
+        known = set(names)
+        for (name, size), recipe in self.recipes.items():
+            missing = [ingredient for ingredient in recipe if ingredient not in known]
+            if missing:
+                raise ValueError(f"Recipe of '{name}' ({size}) uses unknown ingredients: {', '.join(missing)}")
+
+    def with_variants(self, variants):
+        """Return a catalog with every menu item repeated as `variants` distinct SKUs
+
+        Variant k > 1 is named '<name> #k' and shares the recipe of the
+        original, which gives large catalogs for load tests.
+        """
+        if variants <= 1:
+            return self
+        menu_items = []
+        recipes = {}
+        for k in range(1, variants + 1):
+            for name, category, size, price in self.menu_items:
+                variant = name if k == 1 else f"{name} #{k}"
+                menu_items.append((variant, category, size, price))
+                recipes[(variant, size)] = self.recipes[(name, size)]
+        return Catalog(self.ingredients, menu_items, recipes)
+
+    def link(self, menu_rows, ingredient_ids):
+        """Turn (item_id, name, size) rows into (menu_item_id, ingredient_id, quantity) rows
+
+        ingredient_ids maps ingredient names to the ids in the database; a
+        recipe ingredient missing from it raises ValueError. Menu rows with
+        no recipe in the catalog are skipped.
+        """
+        missing = sorted({ingredient for recipe in self.recipes.values() for ingredient in recipe}
+                         - set(ingredient_ids))
+        if missing:
+            raise ValueError(f"Ingredients table is missing recipe ingredients: {', '.join(missing)}")
+        mappings = []
+        for item_id, name, size in menu_rows:
+            for ingredient, quantity in self.recipes.get((name, size), {}).items():
+                mappings.append((item_id, ingredient_ids[ingredient], quantity))
+        return mappings
@@ -0,0 +1,99 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sql', 'populate_checkpoints.sql')
+
+CHUNK_SQL = """
+    INSERT INTO populate_checkpoints (run_id, stage, chunk_first_id, row_count)
+    VALUES (%s, %s, %s, %s)
+"""
+
+
+class CheckpointLog:
+    """Record the progress of one population run in the populate_* control tables
+
+    None of the methods commit: stage and chunk records are written on the
+    caller's connection inside the transaction that loads the rows, so a
+    checkpoint exists exactly when its data does.
+    """
+
+    def __init__(self, conn, run_id):
+        self.conn = conn
+        self.run_id = run_id
+
+    @staticmethod
+    def install(cur):
+        """Create the control tables if they do not exist yet"""
+        with open(CHECKPOINTS_PATH) as f:
+            cur.execute(f.read())
+
+    @classmethod
+    def start(cls, conn, seed, as_of, settings):
+        """Register a new run and return its log"""
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO populate_runs (seed, as_of, settings) VALUES (%s, %s, %s)
+                RETURNING run_id
+            """, (seed, as_of, json.dumps(settings)))
+            return cls(conn, cur.fetchone()[0])
+
+    @classmethod
+    def unfinished(cls, conn):
+        """Return (log, seed, as_of, settings) of the latest run if it did not finish, or None"""
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT run_id, seed, as_of, settings, finished_at FROM populate_runs
+                ORDER BY run_id DESC
+                LIMIT 1
+            """)
+            row = cur.fetchone()
+        if row is None or row[4] is not None:
+            return None
+        run_id, seed, as_of, settings, _ = row
+        return cls(conn, run_id), seed, as_of, settings
+
+    def stage(self, stage):
+        """Return (first_id, row_count, completed) of a recorded stage, or None"""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT first_id, row_count, completed_at IS NOT NULL FROM populate_stages
+                WHERE run_id = %s AND stage = %s
+            """, (self.run_id, stage))
+            return cur.fetchone()
+
+    def begin_stage(self, stage, first_id=None, row_count=None):
+        """Record the id block a stage reserved"""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO populate_stages (run_id, stage, first_id, row_count) VALUES (%s, %s, %s, %s)
+                ON CONFLICT (run_id, stage) DO NOTHING
+            """, (self.run_id, stage, first_id, row_count))
+
+    def complete_stage(self, stage):
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO populate_stages (run_id, stage, completed_at) VALUES (%s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (run_id, stage) DO UPDATE SET completed_at = EXCLUDED.completed_at
+            """, (self.run_id, stage))
+
+    def committed_chunks(self, stage, first_id, last_id):
+        """Return the first ids of the chunks of [first_id, last_id] already committed"""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT chunk_first_id FROM populate_checkpoints
+                WHERE run_id = %s AND stage = %s AND chunk_first_id BETWEEN %s AND %s
+            """, (self.run_id, stage, first_id, last_id))
+            return {row[0] for row in cur.fetchall()}
+
+    def chunk(self, stage, chunk_first_id, row_count):
+        """Record a loaded chunk; commit it together with the chunk's rows"""
+        with self.conn.cursor() as cur:
+            cur.execute(CHUNK_SQL, (self.run_id, stage, chunk_first_id, row_count))
+
+    def finish(self):
+        with self.conn.cursor() as cur:
+            cur.execute("UPDATE populate_runs SET finished_at = CURRENT_TIMESTAMP WHERE run_id = %s",
+                        (self.run_id,))
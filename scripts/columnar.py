@@ -0,0 +1,287 @@
+import struct
+from array import array
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; batches fall back to per-row encoding
+    np = None
+
+EPOCH = datetime(1970, 1, 1)
+# Microseconds between the Unix epoch and the PostgreSQL epoch (2000-01-01)
+PG_EPOCH_MICROS = 946684800 * 10**6
+
+COPY_BINARY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+COPY_BINARY_TRAILER = struct.pack('>h', -1)
+
+# Storage of each column kind: array typecode (None for a list of str) and
+# the PostgreSQL types a column of that kind can be copied into
+KINDS = {
+    'int4': ('i', ('int4',)),
+    'int8': ('q', ('int8',)),
+    'timestamp': ('q', ('timestamp',)),  # microseconds since the Unix epoch
+    'cents': ('q', ('numeric',)),        # NUMERIC with scale 2 as integer cents
+    'text': (None, ('varchar', 'text', 'bpchar')),
+    'category': ('i', ('varchar', 'text', 'bpchar')),  # codes into an interned value list
+}
+
+# Largest magnitude the fixed three-digit NUMERIC encoding holds (NUMERIC(10, 2))
+MAX_CENTS = 10**10 - 1
+
+# Columns of the generated order batches
+ORDER_COLUMNS = (('order_id', 'int4'), ('customer_id', 'int4'), ('store_id', 'int4'),
+                 ('order_timestamp', 'timestamp'), ('total_amount', 'cents'))
+ORDER_ITEM_COLUMNS = (('order_id', 'int4'), ('item_id', 'int4'), ('quantity', 'int4'), ('unit_price', 'cents'))
+
+_INT4 = struct.Struct('>ii')
+_INT8 = struct.Struct('>iq')
+_NUMERIC = struct.Struct('>ihhHhHHH')
+
+
+def to_micros(moment):
+    """datetime -> microseconds since the Unix epoch"""
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(micros):
+    """Microseconds since the Unix epoch -> datetime"""
+    return EPOCH + timedelta(microseconds=int(micros))
+
+
+def to_cents(amount):
+    """Decimal, int or float amount -> integer cents, without float arithmetic"""
+    if not isinstance(amount, Decimal):
+        amount = Decimal(repr(amount)) if isinstance(amount, float) else Decimal(amount)
+    return int(amount.scaleb(2).to_integral_value())
+
+
+def _escape(value):
+    return (value.replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def _cents_text(cents):
+    sign = '-' if cents < 0 else ''
+    cents = abs(cents)
+    return f"{sign}{cents // 100}.{cents % 100:02d}"
+
+
+def _numeric_from_cents(cents):
+    """Binary NUMERIC field (length prefix included) for an amount in cents
+
+    Always three base-10000 digits with weight 1 and scale 2; the server
+    strips the leading and trailing zero digits on input.
+    """
+    magnitude = abs(cents)
+    if magnitude > MAX_CENTS:
+        raise ValueError(f"Amount of {cents} cents does not fit NUMERIC(10, 2)")
+    return _NUMERIC.pack(14, 3, 1, 0x4000 if cents < 0 else 0, 2,
+                         magnitude // 1000000, magnitude // 100 % 10000, magnitude % 100 * 100)
+
+
+class ColumnBatch:
+    """A batch of rows stored column by column in typed arrays
+
+    Ids are int32, timestamps int64 microseconds, amounts int64 cents and
+    repeated strings are codes into an interned value list, so a generated
+    order costs a few dozen bytes instead of a tuple of Python objects.
+    Batches encode straight to COPY text or binary and only materialize
+    Python tuples when rows() is asked for them.
+    """
+
+    def __init__(self, columns, values, categories=None):
+        self.columns = tuple(columns)
+        self.names = tuple(name for name, _ in self.columns)
+        self.kinds = tuple(kind for _, kind in self.columns)
+        self.values = list(values)
+        self.categories = dict(categories or {})
+        self.length = len(self.values[0]) if self.values else 0
+
+    def __len__(self):
+        return self.length
+
+    def column(self, name):
+        return self.values[self.names.index(name)]
+
+    def with_column(self, name, kind, values, categories=None):
+        """Return a batch with an extra column appended"""
+        extra = {len(self.columns): categories} if categories is not None else {}
+        return ColumnBatch(self.columns + ((name, kind),), self.values + [values],
+                           dict(self.categories, **extra))
+
+    def gather(self, name, keys, offset):
+        """Values of column name at positions key - offset (e.g. parent rows by id)"""
+        values = self.column(name)
+        if np is not None:
+            return _as_numpy(values)[_as_numpy(keys) - offset]
+        return array(KINDS[self.kinds[self.names.index(name)]][0], (values[key - offset] for key in keys))
+
+    def take(self, indices):
+        """Return a batch of the rows at the given positions"""
+        values = []
+        for kind, column in zip(self.kinds, self.values):
+            if np is not None and kind != 'text':
+                values.append(_as_numpy(column)[indices])
+            elif kind == 'text':
+                values.append([column[i] for i in indices])
+            else:
+                values.append(array(KINDS[kind][0], (column[i] for i in indices)))
+        return ColumnBatch(self.columns, values, self.categories)
+
+    def check_types(self, types):
+        """Raise ValueError unless every column can be copied into its PostgreSQL type"""
+        for name, kind in self.columns:
+            if types.get(name.lower()) not in KINDS[kind][1]:
+                raise ValueError(f"Column {name} of type {types.get(name.lower())} cannot take {kind} values")
+
+    def rows(self):
+        """Yield the rows as tuples of Python values (int, datetime, Decimal, str)"""
+        columns = []
+        for index, (kind, column) in enumerate(zip(self.kinds, self.values)):
+            if kind in ('int4', 'int8'):
+                columns.append(map(int, column))
+            elif kind == 'timestamp':
+                columns.append(map(from_micros, column))
+            elif kind == 'cents':
+                columns.append(Decimal(int(v)).scaleb(-2) for v in column)
+            elif kind == 'category':
+                columns.append(map(self.categories[index].__getitem__, column))
+            else:
+                columns.append(column)
+        return zip(*columns)
+
+    def copy_text(self):
+        """Encode the batch as COPY text format"""
+        columns = []
+        for index, (kind, column) in enumerate(zip(self.kinds, self.values)):
+            if kind in ('int4', 'int8'):
+                columns.append(map(str, column))
+            elif kind == 'timestamp':
+                columns.append(from_micros(v).isoformat(sep=' ') for v in column)
+            elif kind == 'cents':
+                columns.append(_cents_text(int(v)) for v in column)
+            elif kind == 'category':
+                escaped = [_escape(value) for value in self.categories[index]]
+                columns.append(map(escaped.__getitem__, column))
+            else:
+                columns.append(map(_escape, column))
+        return ''.join('\t'.join(row) + '\n' for row in zip(*columns)).encode('utf-8')
+
+    def copy_binary(self):
+        """Encode the batch as a complete COPY binary stream (header to trailer)"""
+        if np is not None and all(kind in ('int4', 'int8', 'timestamp', 'cents') for kind in self.kinds):
+            body = self._fixed_width_binary()
+        else:
+            body = b''.join(self._binary_rows())
+        return COPY_BINARY_HEADER + body + COPY_BINARY_TRAILER
+
+    def _fixed_width_binary(self):
+        """Build every row at once in a packed big-endian structured array"""
+        fields = [('count', '>i2')]
+        for index, kind in enumerate(self.kinds):
+            if kind == 'int4':
+                fields += [(f'len{index}', '>i4'), (f'value{index}', '>i4')]
+            elif kind == 'cents':
+                fields += [(f'len{index}', '>i4'), (f'head{index}', '>i2', (4,)), (f'digits{index}', '>u2', (3,))]
+            else:
+                fields += [(f'len{index}', '>i4'), (f'value{index}', '>i8')]
+        out = np.empty(self.length, dtype=fields)
+        out['count'] = len(self.kinds)
+        for index, (kind, column) in enumerate(zip(self.kinds, self.values)):
+            column = _as_numpy(column)
+            if kind == 'int4':
+                out[f'len{index}'] = 4
+                out[f'value{index}'] = column
+            elif kind == 'int8':
+                out[f'len{index}'] = 8
+                out[f'value{index}'] = column
+            elif kind == 'timestamp':
+                out[f'len{index}'] = 8
+                out[f'value{index}'] = column - PG_EPOCH_MICROS
+            else:
+                magnitude = np.abs(column)
+                if self.length and magnitude.max() > MAX_CENTS:
+                    raise ValueError(f"Amounts in column {self.names[index]} do not fit NUMERIC(10, 2)")
+                out[f'len{index}'] = 14
+                head = out[f'head{index}']
+                head[:, 0] = 3
+                head[:, 1] = 1
+                head[:, 2] = np.where(column < 0, 0x4000, 0)
+                head[:, 3] = 2
+                digits = out[f'digits{index}']
+                digits[:, 0] = magnitude // 1000000
+                digits[:, 1] = magnitude // 100 % 10000
+                digits[:, 2] = magnitude % 100 * 100
+        return out.tobytes()
+
+    def _binary_rows(self):
+        """Encode row by row with precompiled structs (text columns or no NumPy)"""
+        columns = []
+        for index, (kind, column) in enumerate(zip(self.kinds, self.values)):
+            if kind == 'int4':
+                columns.append(_INT4.pack(4, v) for v in column)
+            elif kind == 'int8':
+                columns.append(_INT8.pack(8, v) for v in column)
+            elif kind == 'timestamp':
+                columns.append(_INT8.pack(8, v - PG_EPOCH_MICROS) for v in column)
+            elif kind == 'cents':
+                columns.append(_numeric_from_cents(v) for v in column)
+            elif kind == 'category':
+                encoded = [_text_field(value) for value in self.categories[index]]
+                columns.append(map(encoded.__getitem__, column))
+            else:
+                columns.append(map(_text_field, column))
+        count = struct.pack('>h', len(self.kinds))
+        for fields in zip(*columns):
+            yield count + b''.join(fields)
+
+
+def _text_field(value):
+    data = value.encode('utf-8')
+    return struct.pack('>i', len(data)) + data
+
+
+def _as_numpy(values):
+    """View a column as a NumPy array without copying array.array storage"""
+    if isinstance(values, np.ndarray):
+        return values
+    return np.frombuffer(values, dtype=np.int32 if values.typecode == 'i' else np.int64)
+
+
+class ColumnBuilder:
+    """Accumulate rows of Python values into a ColumnBatch
+
+    Timestamps are stored as microseconds, amounts as cents and category
+    columns as codes into a value list interned per batch.
+    """
+
+    def __init__(self, columns):
+        self.columns = tuple(columns)
+        self.values = [array(KINDS[kind][0]) if KINDS[kind][0] else [] for _, kind in self.columns]
+        self.interned = {index: {} for index, (_, kind) in enumerate(self.columns) if kind == 'category'}
+        converters = []
+        for index, (_, kind) in enumerate(self.columns):
+            if kind == 'timestamp':
+                converters.append(to_micros)
+            elif kind == 'cents':
+                converters.append(to_cents)
+            elif kind == 'category':
+                interned = self.interned[index]
+                converters.append(lambda value, interned=interned: interned.setdefault(value, len(interned)))
+            else:
+                converters.append(None)
+        self.appenders = [(column.append, convert) for column, convert in zip(self.values, converters)]
+
+    def append(self, row):
+        for (append, convert), value in zip(self.appenders, row):
+            append(convert(value) if convert else value)
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+        return self
+
+    def build(self):
+        categories = {index: list(interned) for index, interned in self.interned.items()}
+        return ColumnBatch(self.columns, self.values, categories)
@@ -0,0 +1,43 @@
+import os
+import logging
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+def get_db_config():
+    """Get database configuration from environment variables"""
+    config = {
+        'host': os.getenv('DB_HOST'),
+        'database': os.getenv('DB_NAME'),
+        'user': os.getenv('DB_USER'),
+        'password': os.getenv('DB_PASSWORD'),
+        'port': os.getenv('DB_PORT', '5432')
+    }
+    
+    # Validate required environment variables
+    missing_vars = []
+    for key, value in config.items():
+        if value is None and key != 'port':
+            missing_vars.append(key)
+    
+    if missing_vars:
+        raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
+    
+    logger.info(f"Database configuration loaded for host: {config['host']}")
+    return config
+
+
+def connection_kwargs(config):
+    """psycopg2.connect() keyword arguments for a database configuration"""
+    return {
+        'host': config['host'],
+        'database': config['database'],
+        'user': config['user'],
+        'password': config['password'],
+        'port': config['port'],
+        'sslmode': config.get('sslmode', os.getenv('DB_SSLMODE', 'require'))
+    }
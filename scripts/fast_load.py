@@ -0,0 +1,178 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Definitions of dropped objects are persisted here until they are restored,
+# so an interrupted fast load can still be finished by a later run
+CONTROL_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS populate_deferred_objects (
+        object_type VARCHAR(20) NOT NULL,
+        table_name VARCHAR(100) NOT NULL,
+        object_name VARCHAR(100) NOT NULL,
+        definition TEXT NOT NULL,
+        PRIMARY KEY (object_type, object_name)
+    )
+"""
+
+
+class FastLoadManager:
+    """Defer secondary indexes and foreign keys around a bulk load
+
+    prepare() drops the secondary (non-unique) indexes and the foreign keys of
+    the given tables and optionally makes them UNLOGGED. finish() makes the
+    tables LOGGED again, rebuilds the indexes in parallel over separate
+    connections, re-adds the foreign keys NOT VALID and validates them, so
+    referential integrity is checked in bulk rather than row by row.
+    Primary keys and UNIQUE constraints stay in place during the load.
+    """
+
+    def __init__(self, conn, open_connection, tables, unlogged=False, index_workers=4):
+        self.conn = conn
+        self.open_connection = open_connection
+        self.tables = list(tables)
+        self.unlogged = unlogged
+        self.index_workers = max(1, index_workers)
+        self.timings = {}
+
+    def _timed(self, phase, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        self.timings[phase] = time.perf_counter() - started
+        logger.info(f"Fast load phase '{phase}' took {self.timings[phase]:.2f}s")
+        return result
+
+    def prepare(self):
+        """Drop secondary indexes and foreign keys (and optionally WAL logging)"""
+        with self.conn.cursor() as cur:
+            cur.execute(CONTROL_TABLE_DDL)
+            self._timed('capture definitions', self._capture_definitions, cur)
+            self.conn.commit()
+            self._timed('drop constraints and indexes', self._drop_objects, cur)
+            if self.unlogged:
+                self._timed('set unlogged', self._set_logging, cur, 'UNLOGGED')
+            self.conn.commit()
+
+    def finish(self):
+        """Restore logging, rebuild indexes in parallel and validate foreign keys"""
+        with self.conn.cursor() as cur:
+            # Any table left UNLOGGED (also by an interrupted earlier run) is made durable again
+            unlogged_tables = [table for table, persistence in self._leaf_tables(cur, self.tables)
+                               if persistence == 'u']
+            if unlogged_tables:
+                self._timed('set logged', self._set_logging, cur, 'LOGGED', unlogged_tables)
+                self.conn.commit()
+
+            cur.execute(CONTROL_TABLE_DDL)
+            cur.execute("""
+                SELECT object_type, table_name, object_name, definition
+                FROM populate_deferred_objects
+                ORDER BY object_type, object_name
+            """)
+            pending = cur.fetchall()
+            indexes = [(name, definition) for kind, _, name, definition in pending if kind == 'index']
+            foreign_keys = [(table, name, definition) for kind, table, name, definition in pending if kind == 'foreign_key']
+
+            # Indexes of partitioned tables are defined ON ONLY the parent;
+            # rebuilding them without ONLY recreates them on every partition
+            self._timed('rebuild indexes', self._run_parallel, [
+                definition.replace('CREATE INDEX ', 'CREATE INDEX IF NOT EXISTS ', 1).replace(' ON ONLY ', ' ON ', 1)
+                for _, definition in indexes
+            ])
+            self._timed('add foreign keys not valid', self._add_foreign_keys, cur, foreign_keys)
+            self.conn.commit()
+            self._timed('validate foreign keys', self._run_parallel, [
+                f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}" for table, name, _ in foreign_keys
+            ])
+            self._timed('analyze', self._analyze, cur)
+
+            cur.execute("DELETE FROM populate_deferred_objects")
+            self.conn.commit()
+
+        total = sum(self.timings.values())
+        logger.info(f"Fast load restored {len(indexes)} indexes and {len(foreign_keys)} foreign keys "
+                    f"({total:.2f}s in deferred phases)")
+
+    def _capture_definitions(self, cur):
+        cur.execute("""
+            INSERT INTO populate_deferred_objects (object_type, table_name, object_name, definition)
+            SELECT 'foreign_key', c.conrelid::regclass::text, c.conname, pg_get_constraintdef(c.oid)
+            FROM pg_constraint c
+            WHERE c.contype = 'f' AND c.conrelid = ANY(%s::regclass[])
+              AND c.conparentid = 0
+            ON CONFLICT DO NOTHING
+        """, (self.tables,))
+        cur.execute("""
+            INSERT INTO populate_deferred_objects (object_type, table_name, object_name, definition)
+            SELECT 'index', i.indrelid::regclass::text, i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+            FROM pg_index i
+            WHERE i.indrelid = ANY(%s::regclass[])
+              AND NOT i.indisprimary
+              AND NOT i.indisunique
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+            ON CONFLICT DO NOTHING
+        """, (self.tables,))
+
+    def _drop_objects(self, cur):
+        cur.execute("""
+            SELECT object_type, table_name, object_name
+            FROM populate_deferred_objects
+        """)
+        for kind, table, name in cur.fetchall():
+            if kind == 'foreign_key':
+                cur.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}")
+            else:
+                cur.execute(f"DROP INDEX IF EXISTS {name}")
+            logger.info(f"Deferred {kind.replace('_', ' ')} {name} on {table}")
+
+    def _leaf_tables(self, cur, tables):
+        # Persistence is a property of the leaf partitions of partitioned tables;
+        # pg_partition_tree() returns nothing for a plain table, so it is added itself
+        cur.execute("""
+            SELECT c.oid::regclass::text, c.relpersistence
+            FROM unnest(%s::regclass[]) AS t(relid)
+            CROSS JOIN LATERAL (
+                SELECT p.relid FROM pg_partition_tree(t.relid) p WHERE p.isleaf
+                UNION SELECT t.relid
+            ) leaf
+            JOIN pg_class c ON c.oid = leaf.relid
+            WHERE c.relkind = 'r'
+        """, (tables,))
+        return cur.fetchall()
+
+    def _set_logging(self, cur, mode, tables=None):
+        for table, _ in self._leaf_tables(cur, tables or self.tables):
+            cur.execute(f"ALTER TABLE {table} SET {mode}")
+
+    def _add_foreign_keys(self, cur, foreign_keys):
+        for table, name, definition in foreign_keys:
+            cur.execute("SELECT 1 FROM pg_constraint WHERE conname = %s AND conrelid = %s::regclass", (name, table))
+            if cur.fetchone() is None:
+                # Partitioned tables cannot take NOT VALID foreign keys, so theirs are checked right away
+                cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = %s::regclass", (table,))
+                not_valid = '' if cur.fetchone()[0] else ' NOT VALID'
+                cur.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}{not_valid}")
+
+    def _analyze(self, cur):
+        for table in self.tables:
+            cur.execute(f"ANALYZE {table}")
+
+    def _run_statement(self, statement):
+        conn = self.open_connection()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                started = time.perf_counter()
+                cur.execute(statement)
+                logger.info(f"{statement} ({time.perf_counter() - started:.2f}s)")
+        finally:
+            conn.close()
+
+    def _run_parallel(self, statements):
+        """Run independent DDL statements concurrently, one connection each"""
+        if not statements:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.index_workers, len(statements))) as pool:
+            for future in [pool.submit(self._run_statement, statement) for statement in statements]:
+                future.result()
@@ -0,0 +1,79 @@
+def to_base36(value):
+    """Encode a non-negative integer in lowercase base 36"""
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    if value == 0:
+        return '0'
+    encoded = []
+    while value:
+        value, remainder = divmod(value, 36)
+        encoded.append(digits[remainder])
+    return ''.join(reversed(encoded))
+
+
+class FeistelPermutation:
+    """Keyed bijection over [0, size) built from a balanced Feistel network
+
+    The network permutes [0, 2**bits); values that land outside the range are
+    re-encrypted (cycle walking), which keeps the mapping a bijection on
+    [0, size) while consecutive inputs come out scattered.
+    """
+
+    ROUNDS = 4
+
+    def __init__(self, size, key):
+        bits = max(size - 1, 1).bit_length()
+        self.half_bits = (bits + 1) // 2
+        self.half_mask = (1 << self.half_bits) - 1
+        self.size = size
+        self.round_keys = [(key * 0x9E3779B1 + i * 0x7F4A7C15) & 0xFFFFFFFF for i in range(self.ROUNDS)]
+
+    def _round(self, value, round_key):
+        mixed = ((value ^ round_key) * 0x45D9F3B) & 0xFFFFFFFF
+        mixed ^= mixed >> 16
+        return mixed & self.half_mask
+
+    def _encrypt(self, value):
+        left, right = value >> self.half_bits, value & self.half_mask
+        for round_key in self.round_keys:
+            left, right = right, left ^ self._round(right, round_key)
+        return (left << self.half_bits) | right
+
+    def __call__(self, n):
+        value = self._encrypt(n)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+
+class IdentityGenerator:
+    """Derive unique email suffixes and phone numbers from an entity's ordinal
+
+    Both are bijective functions of the ordinal (normally the row's serial id),
+    so uniqueness needs no lookup set, memory stays constant and any number of
+    processes can generate disjoint id ranges independently. The mappings are
+    fixed rather than seeded so rows appended by later runs never collide with
+    rows that are already loaded.
+    """
+
+    CAPACITY = 10**9
+
+    def __init__(self, namespace=0):
+        # Distinct scrambles for emails and phones so the two don't correlate
+        self._email_permutation = FeistelPermutation(self.CAPACITY, 2 * namespace + 1)
+        self._phone_permutation = FeistelPermutation(self.CAPACITY, 2 * namespace + 2)
+
+    def _check(self, ordinal):
+        if not 0 <= ordinal < self.CAPACITY:
+            raise ValueError(f"Ordinal {ordinal} is outside the unique identity range [0, {self.CAPACITY})")
+
+    def email(self, first_name, last_name, domain, ordinal):
+        """Email whose base36 suffix is unique per ordinal, e.g. jane.doe.1x2k9f@example.com"""
+        self._check(ordinal)
+        suffix = to_base36(self._email_permutation(ordinal))
+        return f"{first_name.lower()}.{last_name.lower()}.{suffix}@{domain}"
+
+    def phone_number(self, ordinal):
+        """NANP-style phone number unique per ordinal, e.g. +1-274-581-0093 (15 chars)"""
+        self._check(ordinal)
+        digits = f"{self._phone_permutation(ordinal):09d}"
+        return f"+1-2{digits[:2]}-{digits[2:5]}-{digits[5:]}"
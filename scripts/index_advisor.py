@@ -0,0 +1,412 @@
+import json
+import time
+import logging
+import statistics
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+import psycopg2
+from db import connection_kwargs, get_db_config
+from queries import load_analysis_queries
+from analytics import REPORTS, REPORT_LIMITS
+
+logger = logging.getLogger(__name__)
+
+# Tables the analytical workload reads
+WORKLOAD_TABLES = ['stores', 'customers', 'menu_items', 'orders', 'order_items']
+
+# Improvements smaller than this are within run-to-run noise
+MIN_GAIN_MS = 1.0
+
+Candidate = namedtuple('Candidate', 'name table definition rationale')
+
+# Indexes proposed for the analysis queries and the date-range reports of
+# the analytics client
+CANDIDATES = [
+    Candidate('idx_order_items_item_id_covering', 'order_items',
+              'Order_Items (item_id) INCLUDE (quantity, unit_price)',
+              'The top menu items report joins Order_Items on item_id, which has no index; the INCLUDE '
+              'columns let the per-item sums come from an index-only scan'),
+    Candidate('idx_orders_store_id_covering', 'orders',
+              'Orders (store_id) INCLUDE (total_amount)',
+              'Revenue per store only reads store_id and total_amount'),
+    Candidate('idx_orders_customer_id_covering', 'orders',
+              'Orders (customer_id) INCLUDE (total_amount) WHERE customer_id IS NOT NULL',
+              'Top customers and retention group orders by customer; orders without a customer never '
+              'join one, so the partial index leaves them out'),
+    Candidate('idx_orders_timestamp_covering', 'orders',
+              'Orders (order_timestamp) INCLUDE (store_id, customer_id, total_amount)',
+              'Date-range reports, the monthly trend and the busiest hours read the timestamp, store, '
+              'customer and amount only'),
+    Candidate('idx_orders_timestamp_brin', 'orders',
+              'Orders USING BRIN (order_timestamp)',
+              'Orders are appended in time order, so a BRIN index prunes date ranges at a fraction of '
+              'the B-tree size (effective while order_timestamp correlates with the physical order)'),
+]
+
+
+def workload_queries(cur, window_days=30):
+    """The analysis queries plus each analytics report over the last window_days of orders
+
+    The date-range variants are the statements AnalyticsClient runs for a
+    dashboard window, with the parameters inlined so every run is planned
+    for its actual range.
+    """
+    queries = load_analysis_queries()
+    if window_days:
+        cur.execute("SELECT MAX(order_timestamp) FROM Orders")
+        end = cur.fetchone()[0] or datetime.now()
+        start = end - timedelta(days=window_days)
+        for name, sql in REPORTS.items():
+            params = [start, end + timedelta(microseconds=1), None]
+            if name in REPORT_LIMITS:
+                params.append(REPORT_LIMITS[name])
+            for number in range(len(params), 0, -1):
+                sql = sql.replace(f"${number}", cur.mogrify('%s', (params[number - 1],)).decode())
+            queries[f"{name}_last_{window_days}_days"] = sql.strip()
+    return queries
+
+
+def _plan_nodes(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from _plan_nodes(child)
+
+
+def _index_relations(cur, name):
+    """(name, bytes) of an index, or of every index of its partition tree"""
+    cur.execute("""
+        SELECT relid::regclass::text, pg_relation_size(relid) FROM pg_partition_tree(%s::regclass)
+        UNION
+        SELECT %s::regclass::text, pg_relation_size(%s::regclass)
+    """, (name, name, name))
+    return cur.fetchall()
+
+
+def index_size(cur, name):
+    """Bytes of an index, summed over the partitions of a partitioned index"""
+    return int(sum(size for _, size in _index_relations(cur, name)))
+
+
+def index_tree(cur, name):
+    """Names of an index and, for a partitioned index, of its partition indexes"""
+    return {relation for relation, _ in _index_relations(cur, name)}
+
+
+def redundant_indexes(cur, tables=WORKLOAD_TABLES):
+    """Return (index, table, covered by) for plain indexes another index makes redundant
+
+    An index is redundant when it is a non-unique, non-partial B-tree whose
+    key columns are a prefix of another non-partial B-tree's key columns and
+    whose INCLUDE columns that index also holds. Indexes backing a
+    constraint are never reported.
+    """
+    cur.execute("""
+        SELECT c.relname, i.indrelid::regclass::text, am.amname, i.indisunique OR i.indisprimary,
+               EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid),
+               i.indpred IS NOT NULL OR i.indexprs IS NOT NULL,
+               (i.indkey::int2[])[0:i.indnkeyatts - 1], (i.indkey::int2[])[i.indnkeyatts:]
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_am am ON am.oid = c.relam
+        WHERE i.indrelid = ANY(%s::regclass[])
+          AND NOT c.relispartition
+        ORDER BY c.relname
+    """, (tables,))
+    indexes = cur.fetchall()
+    redundant = []
+    for name, table, am, unique, constraint, partial, keys, includes in indexes:
+        if am != 'btree' or unique or constraint or partial:
+            continue
+        for other, other_table, other_am, _, _, other_partial, other_keys, other_includes in indexes:
+            if (other == name or other_table != table or other_am != 'btree' or other_partial
+                    or other_keys[:len(keys)] != keys or not set(includes) <= set(other_keys + other_includes)):
+                continue
+            # Of two identical indexes only the later name is reported
+            if other_keys == keys and set(other_includes) == set(includes) and other > name:
+                continue
+            redundant.append((name, table, other))
+            break
+    return redundant
+
+
+class IndexAdvisor:
+    """Measure the analytical workload and benchmark candidate indexes against it
+
+    Every query is timed (median of `repeat` runs after `warmup` runs) and
+    explained with ANALYZE and BUFFERS. Each candidate is then created in a
+    transaction of its own, the workload is measured again and the
+    transaction is rolled back, so the database is left as it was. A
+    candidate is accepted when the planner uses it and it speeds up at least
+    one query by min_gain (and MIN_GAIN_MS). The accepted indexes are
+    finally tried together, with the indexes they make redundant dropped,
+    to measure the before/after latencies of the migration. Trials hold
+    locks that block writes to the table, so run the advisor against a
+    test or staging copy.
+    """
+
+    def __init__(self, conn, queries, candidates=CANDIDATES, repeat=5, warmup=1, min_gain=0.1):
+        self.conn = conn
+        self.queries = queries
+        self.candidates = list(candidates)
+        self.repeat = repeat
+        self.warmup = warmup
+        self.min_gain = min_gain
+
+    def measure(self, cur):
+        """Time and explain every workload query; returns {name: measurement}"""
+        results = OrderedDict()
+        for name, sql in self.queries.items():
+            for _ in range(self.warmup):
+                cur.execute(sql)
+                cur.fetchall()
+            timings = []
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                cur.execute(sql)
+                cur.fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+            plan = cur.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            plan = plan[0]
+            nodes = list(_plan_nodes(plan['Plan']))
+            results[name] = {
+                'median_ms': round(statistics.median(timings), 3),
+                'execution_ms': plan.get('Execution Time'),
+                'shared_blocks': plan['Plan'].get('Shared Hit Blocks', 0) + plan['Plan'].get('Shared Read Blocks', 0),
+                'scans': [f"{node['Node Type']} on {node['Relation Name']}"
+                          + (f" using {node['Index Name']}" if 'Index Name' in node else '')
+                          for node in nodes if 'Relation Name' in node],
+                'indexes': sorted({node['Index Name'] for node in nodes if 'Index Name' in node}),
+                'plan': plan,
+            }
+        return results
+
+    def gains(self, before, after, index_names=None):
+        """Queries that got faster by min_gain (using one of index_names, when given)"""
+        improved = OrderedDict()
+        for name, result in after.items():
+            old, new = before[name]['median_ms'], result['median_ms']
+            if old - new < MIN_GAIN_MS or old - new < self.min_gain * old:
+                continue
+            if index_names is not None and not index_names & set(result['indexes']):
+                continue
+            improved[name] = (old, new)
+        return improved
+
+    def regressions(self, before, after):
+        return OrderedDict((name, (before[name]['median_ms'], result['median_ms']))
+                           for name, result in after.items()
+                           if result['median_ms'] - before[name]['median_ms'] >= max(
+                               MIN_GAIN_MS, self.min_gain * before[name]['median_ms']))
+
+    def trial(self, candidates, drop=()):
+        """Create candidates and drop indexes in a transaction, measure, then roll back
+
+        Returns (measurement, {candidate: (size in bytes, build seconds, index names)}).
+        """
+        built = {}
+        try:
+            with self.conn.cursor() as cur:
+                for candidate in candidates:
+                    started = time.perf_counter()
+                    cur.execute(f"CREATE INDEX {candidate.name} ON {candidate.definition}")
+                    built[candidate.name] = (index_size(cur, candidate.name), time.perf_counter() - started,
+                                             index_tree(cur, candidate.name))
+                for name in drop:
+                    cur.execute(f"DROP INDEX {name}")
+                return self.measure(cur), built
+        finally:
+            self.conn.rollback()
+
+    def correlation(self, table, column):
+        """pg_stats correlation of a column with the physical row order (None before ANALYZE)"""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT correlation FROM pg_stats
+                WHERE tablename = %s AND attname = %s
+                ORDER BY inherited DESC
+                LIMIT 1
+            """, (table, column))
+            row = cur.fetchone()
+        self.conn.rollback()
+        return row[0] if row else None
+
+    def run(self):
+        """Benchmark the candidates and return the report the migration is written from"""
+        self.conn.autocommit = True
+        with self.conn.cursor() as cur:
+            # Fresh statistics and visibility maps, so index-only scans are possible
+            for table in WORKLOAD_TABLES:
+                cur.execute(f"VACUUM ANALYZE {table}")
+        self.conn.autocommit = False
+
+        with self.conn.cursor() as cur:
+            before = self.measure(cur)
+            cur.execute("SELECT COUNT(*) FROM Orders")
+            orders = cur.fetchone()[0]
+            cur.execute("SELECT COUNT(*) FROM Order_Items")
+            order_items = cur.fetchone()[0]
+            cur.execute("SELECT relname FROM pg_class WHERE relname = ANY(%s)",
+                        ([candidate.name for candidate in self.candidates],))
+            existing = {row[0] for row in cur.fetchall()}
+        self.conn.rollback()
+        for name, result in before.items():
+            logger.info(f"Baseline {name}: {result['median_ms']:.2f} ms, {result['shared_blocks']} buffers")
+
+        candidates = []
+        for candidate in self.candidates:
+            if candidate.name in existing:
+                logger.info(f"Skipping {candidate.name}: already exists")
+                continue
+            after, built = self.trial([candidate])
+            size, seconds, names = built[candidate.name]
+            improved = self.gains(before, after, names)
+            entry = {
+                'name': candidate.name,
+                'table': candidate.table,
+                'definition': candidate.definition,
+                'rationale': candidate.rationale,
+                'bytes': size,
+                'build_seconds': round(seconds, 3),
+                'accepted': bool(improved),
+                'improves': improved,
+                'regresses': self.regressions(before, after),
+                'queries': {name: {key: result[key] for key in ('median_ms', 'shared_blocks', 'indexes')}
+                            for name, result in after.items()},
+            }
+            if 'USING BRIN' in candidate.definition.upper():
+                column = candidate.definition[candidate.definition.index('(') + 1:candidate.definition.index(')')]
+                entry['correlation'] = self.correlation(candidate.table, column.strip())
+            candidates.append(entry)
+            logger.info(f"Candidate {candidate.name} ({size / 2**20:.2f} MiB): "
+                        + (', '.join(f"{name} {old:.2f} -> {new:.2f} ms" for name, (old, new) in improved.items())
+                           or 'no query improved'))
+
+        accepted = [candidate for candidate in self.candidates
+                    if any(entry['accepted'] and entry['name'] == candidate.name for entry in candidates)]
+        drops = []
+        after = before
+        if accepted:
+            # Redundancy is judged with the accepted indexes in place
+            try:
+                with self.conn.cursor() as cur:
+                    for candidate in accepted:
+                        cur.execute(f"CREATE INDEX {candidate.name} ON {candidate.definition}")
+                    drops = redundant_indexes(cur)
+            finally:
+                self.conn.rollback()
+            after, _ = self.trial(accepted, [name for name, _, _ in drops])
+
+        return {
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'database': self.conn.get_dsn_parameters().get('dbname'),
+            'orders': orders,
+            'order_items': order_items,
+            'repeat': self.repeat,
+            'before': before,
+            'after': after,
+            'candidates': candidates,
+            'accepted': [candidate.name for candidate in accepted],
+            'drops': [{'name': name, 'table': table, 'covered_by': other} for name, table, other in drops],
+        }
+
+
+def _mib(size):
+    return f"{size / 2**20:.2f} MiB"
+
+
+def migration_sql(report, partitioned_tables=()):
+    """Render the accepted indexes and redundant drops of a report as an SQL migration"""
+    lines = [
+        "-- RushMore Pizzeria index migration",
+        f"-- Generated by scripts/index_advisor.py on {report['generated_at']} against {report['database']}",
+        f"-- ({report['orders']} orders, {report['order_items']} order items; median of {report['repeat']} runs).",
+        "-- CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block:",
+        "-- apply with psql without --single-transaction.",
+        "--",
+        "-- Query latency before -> after (ms), shared buffers before -> after:",
+    ]
+    width = max(len(name) for name in report['before'])
+    for name, before in report['before'].items():
+        after = report['after'][name]
+        lines.append(f"--   {name:<{width}}  {before['median_ms']:>10.2f} -> {after['median_ms']:>10.2f}"
+                     f"   {before['shared_blocks']:>8} -> {after['shared_blocks']}")
+    lines.append("")
+
+    rejected = [entry for entry in report['candidates'] if not entry['accepted']]
+    for entry in report['candidates']:
+        if not entry['accepted']:
+            continue
+        concurrently = '' if entry['table'] in partitioned_tables else ' CONCURRENTLY'
+        lines.append(f"-- {entry['rationale']}")
+        lines.append(f"-- Size {_mib(entry['bytes'])}, built in {entry['build_seconds']:.2f}s; speeds up "
+                     + ', '.join(f"{name} ({old:.2f} -> {new:.2f} ms)" for name, (old, new) in entry['improves'].items()))
+        lines.append(f"CREATE INDEX{concurrently} IF NOT EXISTS {entry['name']} ON {entry['definition']};")
+        lines.append("")
+    for drop in report['drops']:
+        concurrently = '' if drop['table'] in partitioned_tables else ' CONCURRENTLY'
+        lines.append(f"-- Redundant: {drop['name']} on {drop['table']} is covered by {drop['covered_by']}")
+        lines.append(f"DROP INDEX{concurrently} IF EXISTS {drop['name']};")
+        lines.append("")
+    if not report['accepted']:
+        lines.append("-- No candidate index improved the workload; nothing to change.")
+        lines.append("")
+    if rejected:
+        lines.append("-- Benchmarked and not recommended:")
+        for entry in rejected:
+            note = f"{entry['name']} ON {entry['definition']} ({_mib(entry['bytes'])})"
+            if entry.get('correlation') is not None:
+                note += f", order_timestamp correlation {entry['correlation']:.2f}"
+            lines.append(f"--   {note}")
+    return '\n'.join(lines).rstrip() + '\n'
+
+
+def main():
+    """Benchmark candidate indexes for the analysis queries and write a migration"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Propose and benchmark indexes for the RushMore Pizzeria reports')
+    parser.add_argument('--output', default='index_migration.sql',
+                        help='SQL migration to write (default: index_migration.sql)')
+    parser.add_argument('--report', default=None, metavar='PATH',
+                        help='Also write the measurements and plans as JSON to PATH')
+    parser.add_argument('--window-days', type=int, default=30,
+                        help='Also run every analytics report over the last N days of orders (0 to skip; default: 30)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Timed runs per query (default: 5)')
+    parser.add_argument('--warmup', type=int, default=1,
+                        help='Untimed warm-up runs per query (default: 1)')
+    parser.add_argument('--min-gain', type=float, default=0.1,
+                        help='Relative speed-up a candidate must give a query to be recommended (default: 0.1)')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    conn = psycopg2.connect(**connection_kwargs(get_db_config()))
+    try:
+        with conn.cursor() as cur:
+            queries = workload_queries(cur, args.window_days)
+            cur.execute("""
+                SELECT relname FROM pg_class
+                WHERE relname = ANY(%s) AND relkind = 'p'
+            """, (WORKLOAD_TABLES,))
+            partitioned = {row[0] for row in cur.fetchall()}
+        conn.rollback()
+        advisor = IndexAdvisor(conn, queries, repeat=args.repeat, warmup=args.warmup, min_gain=args.min_gain)
+        report = advisor.run()
+    finally:
+        conn.close()
+
+    with open(args.output, 'w') as f:
+        f.write(migration_sql(report, partitioned))
+    logger.info(f"Wrote migration with {len(report['accepted'])} new and {len(report['drops'])} dropped "
+                f"indexes to {args.output}")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,550 @@
+import json
+import math
+import time
+import queue
+import random
+import logging
+import threading
+from array import array
+from collections import namedtuple
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+import psycopg2
+from db import connection_kwargs, get_db_config
+from partitions import is_partitioned
+from workload import WorkloadModel
+
+logger = logging.getLogger(__name__)
+
+# Largest order total NUMERIC(10, 2) holds
+MAX_TOTAL = Decimal('99999999.99')
+MAX_QUANTITY = 100
+
+# A validated order; items are (item_id, quantity, unit_price) tuples
+Order = namedtuple('Order', 'customer_id store_id order_timestamp total_amount items')
+
+# Insert a whole group of orders and their items in one statement. Order ids
+# are drawn from the Orders sequence per input position, so the items can be
+# joined to their order before either table is written; the foreign keys
+# are checked at the end of the statement. Drawing the ids in the statement
+# that writes Orders means they are drawn under its ROW EXCLUSIVE lock, which
+# InventoryEngine.committed_order_id() waits out.
+INSERT_GROUP_SQL = """
+    WITH input AS (
+        SELECT nextval(%(sequence)s) AS order_id, o.*
+        FROM unnest(%(customers)s::int[], %(stores)s::int[], %(timestamps)s::timestamp[], %(totals)s::numeric[])
+             WITH ORDINALITY AS o(customer_id, store_id, order_timestamp, total_amount, position)
+    ), new_orders AS (
+        INSERT INTO Orders (order_id, customer_id, store_id, order_timestamp, total_amount)
+        SELECT order_id, customer_id, store_id, order_timestamp, total_amount FROM input
+    ), new_items AS (
+        INSERT INTO Order_Items (order_id, item_id, quantity, unit_price{item_timestamp})
+        SELECT input.order_id, i.item_id, i.quantity, i.unit_price{input_timestamp}
+        FROM unnest(%(positions)s::bigint[], %(items)s::int[], %(quantities)s::int[], %(prices)s::numeric[])
+             AS i(position, item_id, quantity, unit_price)
+        JOIN input USING (position)
+    )
+    SELECT order_id FROM input ORDER BY position
+"""
+
+
+class OrderRejected(ValueError):
+    """An order payload failed validation or could not be inserted"""
+
+
+def _positive_int(value, field):
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise OrderRejected(f"'{field}' must be a positive integer, got {value!r}")
+    return value
+
+
+def _price(value, field):
+    try:
+        price = Decimal(str(value))
+    except InvalidOperation:
+        raise OrderRejected(f"'{field}' is not a valid amount: {value!r}")
+    if not price.is_finite():
+        raise OrderRejected(f"'{field}' is not a valid amount: {value!r}")
+    return price
+
+
+class MenuCache:
+    """Menu prices and store ids used to validate orders, reloaded every ttl seconds
+
+    Items can be referenced by item_id or by (name, size), the key the
+    catalog uses.
+    """
+
+    def __init__(self, db_config, ttl=60.0):
+        self.db_config = db_config
+        self.ttl = ttl
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self.prices = {}
+        self.by_name = {}
+        self.store_ids = frozenset()
+
+    def refresh(self):
+        """Reload the menu and stores from the database"""
+        conn = psycopg2.connect(**connection_kwargs(self.db_config))
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT item_id, name, size, price FROM Menu_Items")
+                menu = cur.fetchall()
+                cur.execute("SELECT store_id FROM Stores")
+                stores = cur.fetchall()
+        finally:
+            conn.close()
+        self.prices = {item_id: price for item_id, _, _, price in menu}
+        self.by_name = {(name, size): item_id for item_id, name, size, _ in menu}
+        self.store_ids = frozenset(store_id for store_id, in stores)
+        self._loaded_at = time.monotonic()
+        logger.info(f"Menu cache loaded {len(self.prices)} items and {len(self.store_ids)} stores")
+
+    def current(self):
+        """Refresh the cache if it is older than ttl; returns self"""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            with self._lock:
+                if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+                    self.refresh()
+        return self
+
+    def validate(self, payload):
+        """Turn an order payload (dict or JSON text) into an Order, or raise OrderRejected
+
+        Payloads look like {"store_id": 1, "customer_id": 42, "items":
+        [{"item_id": 7, "quantity": 2}, {"name": "Margherita Pizza", "size":
+        "Large"}]}. customer_id, order_timestamp (ISO 8601, default now),
+        quantities (default 1), unit_price and total_amount are optional;
+        prices and totals that are sent must match the menu.
+        """
+        if isinstance(payload, (str, bytes)):
+            try:
+                payload = json.loads(payload)
+            except ValueError as e:
+                raise OrderRejected(f"Order is not valid JSON: {e}")
+        if not isinstance(payload, dict):
+            raise OrderRejected("Order must be a JSON object")
+        self.current()
+
+        store_id = _positive_int(payload.get('store_id'), 'store_id')
+        if store_id not in self.store_ids:
+            raise OrderRejected(f"Unknown store_id {store_id}")
+        customer_id = payload.get('customer_id')
+        if customer_id is not None:
+            _positive_int(customer_id, 'customer_id')
+
+        order_timestamp = payload.get('order_timestamp')
+        if order_timestamp is None:
+            order_timestamp = datetime.now()
+        else:
+            try:
+                order_timestamp = datetime.fromisoformat(str(order_timestamp))
+            except ValueError:
+                raise OrderRejected(f"'order_timestamp' is not an ISO 8601 timestamp: {order_timestamp!r}")
+            if order_timestamp.tzinfo is not None:
+                # Orders store local wall-clock time without a zone
+                order_timestamp = order_timestamp.astimezone().replace(tzinfo=None)
+
+        lines = payload.get('items')
+        if not isinstance(lines, list) or not lines:
+            raise OrderRejected("Order needs a non-empty 'items' list")
+        items = []
+        total = Decimal('0.00')
+        for number, line in enumerate(lines, 1):
+            if not isinstance(line, dict):
+                raise OrderRejected(f"Item {number} must be a JSON object")
+            if 'item_id' in line:
+                item_id = _positive_int(line['item_id'], f"items[{number}].item_id")
+                if item_id not in self.prices:
+                    raise OrderRejected(f"Item {number}: unknown item_id {item_id}")
+            else:
+                item_id = self.by_name.get((line.get('name'), line.get('size')))
+                if item_id is None:
+                    raise OrderRejected(f"Item {number}: unknown menu item {line.get('name')!r} ({line.get('size')})")
+            quantity = _positive_int(line.get('quantity', 1), f"items[{number}].quantity")
+            if quantity > MAX_QUANTITY:
+                raise OrderRejected(f"Item {number}: quantity {quantity} exceeds {MAX_QUANTITY}")
+            price = self.prices[item_id]
+            if 'unit_price' in line and _price(line['unit_price'], f"items[{number}].unit_price") != price:
+                raise OrderRejected(f"Item {number}: unit_price {line['unit_price']} does not match "
+                                    f"the menu price {price}")
+            items.append((item_id, quantity, price))
+            total += price * quantity
+
+        if total > MAX_TOTAL:
+            raise OrderRejected(f"Order total {total} exceeds {MAX_TOTAL}")
+        if 'total_amount' in payload and _price(payload['total_amount'], 'total_amount') != total:
+            raise OrderRejected(f"total_amount {payload['total_amount']} does not match the computed total {total}")
+        return Order(customer_id, store_id, order_timestamp, total, items)
+
+
+class OrderIngestor:
+    """Validate orders and insert them with group commit over a few writer connections
+
+    submit() validates an order in the caller's thread and queues it. Each
+    writer thread takes up to group_size queued orders, waiting at most
+    max_delay seconds for a group to fill, and inserts the whole group in
+    one statement and one transaction, so many small orders share a commit
+    (and its WAL flush). When a group fails, its orders are retried one by
+    one so only the offending orders are rejected.
+
+    With more than one writer, groups commit in any order, so a lower order
+    id can become visible after a higher one. An order_id high-water mark
+    read with MAX(order_id) may therefore skip orders; readers have to wait
+    out in-flight writers as inventory.py consume does.
+    """
+
+    def __init__(self, db_config=None, writers=2, group_size=64, max_delay=0.005, menu_ttl=60.0):
+        self.db_config = db_config or get_db_config()
+        self.menu = MenuCache(self.db_config, ttl=menu_ttl)
+        self.group_size = max(1, group_size)
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        self.groups = 0
+        self.committed = 0
+        self.rejected = 0
+        self._stats_lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run_writer, name=f'ingest-writer-{n}', daemon=True)
+                         for n in range(max(1, writers))]
+        self.menu.current()
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, payload):
+        """Queue an order; returns a Future resolving to its order_id
+
+        Invalid payloads raise OrderRejected right away; orders the database
+        refuses (e.g. an unknown customer) fail their future with it.
+        """
+        order = self.menu.validate(payload)
+        future = Future()
+        self.queue.put((order, future))
+        return future
+
+    def ingest(self, payload, timeout=None):
+        """Insert one order and wait for its commit; returns the order_id"""
+        return self.submit(payload).result(timeout)
+
+    def close(self):
+        """Write the queued orders and stop the writers"""
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _next_group(self):
+        """Return (group, stop): up to group_size queued orders and whether close() was called"""
+        first = self.queue.get()
+        if first is None:
+            return [], True
+        group = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(group) < self.group_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                return group, True
+            group.append(entry)
+        return group, False
+
+    def _connect(self):
+        conn = psycopg2.connect(**connection_kwargs(self.db_config))
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_get_serial_sequence('orders', 'order_id')")
+            sequence = cur.fetchone()[0]
+            # Co-partitioned order items carry their order's timestamp
+            partitioned = is_partitioned(cur)
+        conn.commit()
+        sql = INSERT_GROUP_SQL.format(item_timestamp=', order_timestamp' if partitioned else '',
+                                      input_timestamp=', input.order_timestamp' if partitioned else '')
+        return conn, sql, sequence
+
+    def _run_writer(self):
+        conn = None
+        stop = False
+        while not stop:
+            group, stop = self._next_group()
+            if not group:
+                continue
+            try:
+                if conn is None or conn.closed:
+                    conn, sql, sequence = self._connect()
+                self._write_group(conn, sql, sequence, group)
+            except Exception as e:
+                # Connection-level failure or a bug: fail the group so no caller waits
+                # on it forever, and reconnect for the next one
+                if isinstance(e, psycopg2.Error):
+                    logger.error(f"Order writer lost its connection: {e}")
+                else:
+                    logger.exception(f"Order writer failed on a group of {len(group)} orders")
+                for _, future in group:
+                    if not future.done():
+                        future.set_exception(e)
+                if conn is not None:
+                    conn.close()
+                conn = None
+        if conn is not None:
+            conn.close()
+
+    def _insert(self, conn, sql, sequence, orders):
+        params = {
+            'sequence': sequence,
+            'customers': [order.customer_id for order in orders],
+            'stores': [order.store_id for order in orders],
+            'timestamps': [order.order_timestamp for order in orders],
+            'totals': [order.total_amount for order in orders],
+            'positions': [position for position, order in enumerate(orders, 1) for _ in order.items],
+            'items': [item_id for order in orders for item_id, _, _ in order.items],
+            'quantities': [quantity for order in orders for _, quantity, _ in order.items],
+            'prices': [price for order in orders for _, _, price in order.items],
+        }
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            order_ids = [order_id for order_id, in cur.fetchall()]
+        conn.commit()
+        return order_ids
+
+    def _write_group(self, conn, sql, sequence, group):
+        try:
+            order_ids = self._insert(conn, sql, sequence, [order for order, _ in group])
+        except (psycopg2.IntegrityError, psycopg2.DataError):
+            conn.rollback()
+            logger.warning(f"Group of {len(group)} orders failed, retrying them one by one")
+            for order, future in group:
+                try:
+                    order_id, = self._insert(conn, sql, sequence, [order])
+                except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+                    conn.rollback()
+                    with self._stats_lock:
+                        self.rejected += 1
+                    future.set_exception(OrderRejected(str(e).strip()))
+                else:
+                    with self._stats_lock:
+                        self.groups += 1
+                        self.committed += 1
+                    future.set_result(order_id)
+            return
+        with self._stats_lock:
+            self.groups += 1
+            self.committed += len(group)
+        for (_, future), order_id in zip(group, order_ids):
+            future.set_result(order_id)
+
+
+def _percentile(values, fraction):
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return None
+    return round(values[max(0, math.ceil(fraction * len(values)) - 1)], 3)
+
+
+def _customer_source(cur):
+    """(low, high, ids) of the customer ids, as BoundWorkload expects"""
+    cur.execute("SELECT MIN(customer_id), MAX(customer_id), COUNT(*) FROM Customers")
+    low, high, count = cur.fetchone()
+    if not count:
+        raise ValueError("Customers table has no rows to reference")
+    if high - low + 1 == count:
+        return low, high, None
+    cur.execute("SELECT customer_id FROM Customers ORDER BY customer_id")
+    return low, high, array('q', (customer_id for customer_id, in cur.fetchall()))
+
+
+def simulate(ingestor, stores=8, orders=None, duration=None, rate=None, workload=None, seed=None):
+    """Replay `stores` concurrent point-of-sale terminals against the ingestor
+
+    Every simulated store runs in its own thread and draws customers, items
+    and quantities from the workload model. Without a rate each terminal
+    waits for its previous order to commit (closed loop); with a rate it
+    sends that many orders per second regardless (open loop). Stops after
+    `orders` orders in total or `duration` seconds. Returns throughput and
+    commit latency figures (submit to commit, in milliseconds).
+    """
+    if orders is None and duration is None:
+        raise ValueError("simulate() needs orders or duration")
+    conn = psycopg2.connect(**connection_kwargs(ingestor.db_config))
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT store_id, city FROM Stores ORDER BY store_id")
+            store_rows = cur.fetchall()
+            cur.execute("SELECT item_id, price, name, category, size FROM Menu_Items ORDER BY item_id")
+            menu_items = cur.fetchall()
+            customer_source = _customer_source(cur)
+    finally:
+        conn.close()
+    now = datetime.now()
+    bound = (workload or WorkloadModel()).bind(store_rows, customer_source, menu_items,
+                                               now - timedelta(days=1), now)
+    seed = random.randrange(2**32) if seed is None else seed
+
+    latencies = []
+    failures = [0]
+    lock = threading.Lock()
+    remaining = [orders]
+    groups_before, committed_before = ingestor.groups, ingestor.committed
+    started = time.perf_counter()
+    deadline = started + duration if duration is not None else None
+
+    def take_ticket():
+        if deadline is not None and time.perf_counter() >= deadline:
+            return False
+        if remaining[0] is None:
+            return True
+        with lock:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def record(future, submitted):
+        latency = (time.perf_counter() - submitted) * 1000
+        with lock:
+            if future.exception() is None:
+                latencies.append(latency)
+            else:
+                failures[0] += 1
+
+    def terminal(index):
+        rng = random.Random(seed * 1000003 + index)
+        store_id = store_rows[index % len(store_rows)][0]
+        pending = []
+        next_at = time.perf_counter()
+        while take_ticket():
+            payload = {
+                'store_id': store_id,
+                'customer_id': bound.pick_customer(rng),
+                'items': [{'item_id': bound.pick_menu_item(rng)[0], 'quantity': bound.pick_quantity(rng)}
+                          for _ in range(bound.pick_item_count(rng))],
+            }
+            submitted = time.perf_counter()
+            future = ingestor.submit(payload)
+            future.add_done_callback(lambda done, submitted=submitted: record(done, submitted))
+            if rate:
+                pending.append(future)
+                next_at += rng.expovariate(rate)
+                time.sleep(max(0.0, next_at - time.perf_counter()))
+            else:
+                try:
+                    future.result()
+                except Exception:
+                    pass
+        for future in pending:
+            try:
+                future.result()
+            except Exception:
+                pass
+
+    threads = [threading.Thread(target=terminal, args=(index,), name=f'pos-{index}') for index in range(stores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    groups = ingestor.groups - groups_before
+    committed = ingestor.committed - committed_before
+    return {
+        'stores': stores,
+        'orders': len(latencies),
+        'failed': failures[0],
+        'seconds': round(elapsed, 3),
+        'orders_per_second': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'groups': groups,
+        'mean_group_size': round(committed / groups, 2) if groups else None,
+        'latency_ms': {
+            'p50': _percentile(latencies, 0.50),
+            'p95': _percentile(latencies, 0.95),
+            'p99': _percentile(latencies, 0.99),
+            'max': _percentile(latencies, 1.0),
+        },
+    }
+
+
+def main():
+    """Ingest orders from JSON files or replay simulated point-of-sale traffic"""
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description='RushMore Pizzeria order ingestion')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    ingest = subparsers.add_parser('ingest', help='Insert orders from a JSON file (an array or one object per line)')
+    ingest.add_argument('path', nargs='?', default='-', help="JSON orders file ('-' for stdin, the default)")
+    simulate_parser = subparsers.add_parser('simulate', help='Replay concurrent simulated stores and report '
+                                                             'orders/s and commit latency')
+    simulate_parser.add_argument('--stores', type=int, default=8,
+                                 help='Concurrent simulated stores (default: 8)')
+    simulate_parser.add_argument('--orders', type=int, default=None,
+                                 help='Stop after this many orders in total')
+    simulate_parser.add_argument('--duration', type=float, default=None,
+                                 help='Stop after this many seconds (default: 10 when --orders is not given)')
+    simulate_parser.add_argument('--rate', type=float, default=None,
+                                 help='Orders per second per store (default: send the next order after the commit)')
+    simulate_parser.add_argument('--workload', default=None,
+                                 help='YAML workload model for the simulated orders (default: uniform)')
+    simulate_parser.add_argument('--seed', type=int, default=None)
+    for command in (ingest, simulate_parser):
+        command.add_argument('--writers', type=int, default=2,
+                             help='Writer connections (default: 2)')
+        command.add_argument('--group-size', type=int, default=64,
+                             help='Most orders committed together in one transaction (default: 64)')
+        command.add_argument('--max-delay-ms', type=float, default=5.0,
+                             help='Longest a writer waits for a group to fill (default: 5)')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    with OrderIngestor(writers=args.writers, group_size=args.group_size,
+                       max_delay=args.max_delay_ms / 1000) as ingestor:
+        if args.command == 'ingest':
+            with (sys.stdin if args.path == '-' else open(args.path)) as f:
+                text = f.read()
+            stripped = text.lstrip()
+            payloads = json.loads(text) if stripped.startswith('[') else [line for line in text.splitlines()
+                                                                           if line.strip()]
+            results = []
+            for payload in payloads:
+                try:
+                    results.append((payload, ingestor.submit(payload)))
+                except OrderRejected as e:
+                    results.append((payload, e))
+            failed = 0
+            for payload, outcome in results:
+                if isinstance(outcome, Future):
+                    try:
+                        outcome = outcome.result()
+                    except OrderRejected as e:
+                        outcome = e
+                    except Exception as e:
+                        # A lost connection fails the order's group; report it and go on
+                        failed += 1
+                        print(json.dumps({'failed': str(e).strip() or type(e).__name__}))
+                        continue
+                if isinstance(outcome, Exception):
+                    failed += 1
+                    print(json.dumps({'rejected': str(outcome)}))
+                else:
+                    print(json.dumps({'order_id': outcome}))
+            if failed:
+                logger.warning(f"Rejected or failed {failed} of {len(results)} orders")
+        elif args.command == 'simulate':
+            workload = WorkloadModel.from_yaml(args.workload) if args.workload else None
+            duration = args.duration if args.duration is not None or args.orders is not None else 10.0
+            report = simulate(ingestor, stores=args.stores, orders=args.orders, duration=duration,
+                              rate=args.rate, workload=workload, seed=args.seed)
+            print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
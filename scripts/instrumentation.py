@@ -0,0 +1,353 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import tracemalloc
+import logging
+from contextlib import contextmanager
+import psycopg2
+import psycopg2.extensions
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Client-side counters kept per connection and diffed per stage
+IO_FIELDS = ('rows', 'round_trips', 'bytes_sent', 'write_seconds', 'load_seconds',
+             'encode_seconds', 'wait_seconds', 'shard_seconds')
+
+# (stage key, Prometheus metric suffix, help text)
+PROMETHEUS_METRICS = [
+    ('seconds', 'seconds', 'Wall time of the stage'),
+    ('generate_seconds', 'generate_seconds', 'Time spent generating rows (summed over worker processes)'),
+    ('encode_seconds', 'encode_seconds', 'Time spent encoding rows for the load backend'),
+    ('write_seconds', 'write_seconds', 'Time spent waiting on the database for writes and queries'),
+    ('rows', 'rows', 'Rows written by the load backend'),
+    ('rows_per_second', 'rows_per_second', 'Rows written per second of wall time'),
+    ('bytes_sent', 'bytes_sent', 'Query and COPY bytes sent to the server'),
+    ('round_trips', 'round_trips', 'Statements and COPY operations sent to the server'),
+    ('rss_bytes', 'rss_bytes', 'Resident set size after the stage'),
+    ('peak_rss_bytes', 'peak_rss_bytes', 'Peak resident set size of the process after the stage'),
+    ('wal_bytes', 'wal_bytes', 'WAL generated on the server during the stage'),
+    ('wal_records', 'wal_records', 'WAL records generated during the stage (pg_stat_wal)'),
+    ('wal_fpi', 'wal_fpi', 'WAL full page images generated during the stage (pg_stat_wal)'),
+    ('statement_calls', 'statement_calls', 'Statements executed in this database (pg_stat_statements)'),
+    ('statement_seconds', 'statement_seconds', 'Server execution time of those statements (pg_stat_statements)'),
+]
+
+
+def memory_usage_mb():
+    """Return (current RSS, peak RSS) of this process in MB, None where unavailable"""
+    current = peak = None
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+        peak /= (1024 * 1024) if sys.platform == 'darwin' else 1024
+    return current, peak
+
+
+class IOCounters:
+    """Client-side I/O counters of one connection (plus the worker shards it ran)"""
+
+    def __init__(self):
+        for field in IO_FIELDS:
+            setattr(self, field, 0)
+
+    def snapshot(self):
+        return {field: getattr(self, field) for field in IO_FIELDS}
+
+    def add(self, counters):
+        for field in IO_FIELDS:
+            setattr(self, field, getattr(self, field) + counters.get(field, 0))
+
+
+class CountingReader:
+    """File wrapper counting the bytes COPY reads from it"""
+
+    def __init__(self, file):
+        self.file = file
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def readline(self, size=-1):
+        data = self.file.readline(size)
+        self.bytes_read += len(data)
+        return data
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """Cursor counting round trips, bytes sent and time spent waiting on the server
+
+    FETCHes issued internally by named cursors are not counted.
+    """
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            io = self.connection.io
+            io.write_seconds += time.perf_counter() - started
+            io.round_trips += 1
+            io.bytes_sent += len(self.query or b'')
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        vars_list = list(vars_list)
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            io = self.connection.io
+            io.write_seconds += time.perf_counter() - started
+            io.round_trips += len(vars_list)
+            io.bytes_sent += len(self.query or b'') * len(vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        reader = CountingReader(file)
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, reader, size)
+        finally:
+            io = self.connection.io
+            io.write_seconds += time.perf_counter() - started
+            io.round_trips += 1
+            io.bytes_sent += len(sql) + reader.bytes_read
+
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    """Connection whose cursors report into its IOCounters"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.io = IOCounters()
+        self.cursor_factory = InstrumentedCursor
+
+
+class InstrumentedLoader:
+    """Load backend wrapper counting rows and the time spent inside load()
+
+    Time in load() not spent waiting on the server is counted as encoding.
+    """
+
+    def __init__(self, loader, io):
+        self.loader = loader
+        self.io = io
+        self.name = loader.name
+
+    def load(self, table, columns, rows):
+        started = time.perf_counter()
+        write_seconds = self.io.write_seconds
+        count = self.loader.load(table, columns, rows)
+        seconds = time.perf_counter() - started
+        self.io.load_seconds += seconds
+        self.io.encode_seconds += seconds - (self.io.write_seconds - write_seconds)
+        self.io.rows += count
+        return count
+
+
+def _query_optional(cur, sql):
+    try:
+        cur.execute(sql)
+        return cur.fetchone()
+    except psycopg2.Error as e:
+        logger.debug(f"Server statistic unavailable: {e}")
+        return None
+
+
+def server_snapshot(conn):
+    """Read cumulative server statistics over an autocommit connection
+
+    WAL position (all versions), pg_stat_wal (PostgreSQL 14+) and
+    pg_stat_statements totals for the current database (when the extension
+    is installed); anything unavailable is left out. WAL figures are
+    cluster-wide, so concurrent activity on the server is included, and
+    pg_stat_wal is only flushed by backends about once a second, so its
+    counters can lag for very short stages (the LSN-based wal_bytes does not).
+    """
+    snapshot = {}
+    with conn.cursor() as cur:
+        row = _query_optional(cur, "SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), '0/0')::bigint")
+        if row:
+            snapshot['wal_bytes'] = row[0]
+
+        row = _query_optional(cur, "SELECT to_regclass('pg_catalog.pg_stat_wal') IS NOT NULL")
+        if row and row[0]:
+            row = _query_optional(cur, "SELECT wal_records, wal_fpi FROM pg_stat_wal")
+            if row:
+                snapshot['wal_records'], snapshot['wal_fpi'] = row
+
+        row = _query_optional(cur, "SELECT to_regclass('pg_stat_statements') IS NOT NULL")
+        if row and row[0]:
+            # Column was renamed from total_time in PostgreSQL 13
+            row = _query_optional(cur, """
+                SELECT COUNT(*) FROM pg_attribute
+                WHERE attrelid = 'pg_stat_statements'::regclass AND attname = 'total_exec_time'
+            """)
+            total = 'total_exec_time' if row and row[0] else 'total_time'
+            row = _query_optional(cur, f"""
+                SELECT COALESCE(SUM(calls), 0), COALESCE(SUM({total}), 0) / 1000.0
+                FROM pg_stat_statements
+                WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+            """)
+            if row:
+                snapshot['statement_calls'], snapshot['statement_seconds'] = int(row[0]), float(row[1])
+    return snapshot
+
+
+@contextmanager
+def profiled(profile_dir, name):
+    """Run the body under cProfile and tracemalloc and dump both into profile_dir
+
+    Writes <name>.prof (load with pstats or snakeviz) and <name>.memory.txt
+    with the top allocation sites and the traced peak.
+    """
+    os.makedirs(profile_dir, exist_ok=True)
+    profiler = cProfile.Profile()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if not tracing:
+            tracemalloc.stop()
+        profiler.dump_stats(os.path.join(profile_dir, f"{name}.prof"))
+        with open(os.path.join(profile_dir, f"{name}.memory.txt"), 'w') as f:
+            f.write(f"Peak traced memory: {peak / (1024 * 1024):.1f} MB\n\n")
+            for stat in snapshot.statistics('lineno')[:25]:
+                f.write(f"{stat}\n")
+        logger.info(f"Wrote profile of {name} to {profile_dir}")
+
+
+class Instrumentation:
+    """Structured per-stage metrics for a DatabasePopulator run
+
+    Each stage records wall time split into generation, encoding and
+    database write time, rows and rows/s, bytes sent, round trips, memory
+    and server-side WAL/statement deltas. Generation time is summed over
+    worker processes, so with --workers it can exceed the wall time.
+    """
+
+    def __init__(self, open_connection, profile_dir=None):
+        self.open_connection = open_connection
+        self.profile_dir = profile_dir
+        self.stages = []
+        self.phases = {}
+        self._stats_conn = None
+
+    def _server_snapshot(self):
+        try:
+            if self._stats_conn is None:
+                self._stats_conn = self.open_connection()
+                self._stats_conn.autocommit = True
+            return server_snapshot(self._stats_conn)
+        except psycopg2.Error as e:
+            logger.warning(f"Could not read server statistics: {e}")
+            return {}
+
+    @contextmanager
+    def stage(self, name, io):
+        """Measure one stage; io is the IOCounters of the populator's connection"""
+        io_before = io.snapshot()
+        server_before = self._server_snapshot()
+        started = time.perf_counter()
+        failed = True
+        try:
+            if self.profile_dir:
+                with profiled(self.profile_dir, name):
+                    yield
+            else:
+                yield
+            failed = False
+        finally:
+            seconds = time.perf_counter() - started
+            io_after = io.snapshot()
+            server_after = self._server_snapshot()
+            self.stages.append(self._stage_metrics(name, seconds, failed, io_before, io_after,
+                                                   server_before, server_after))
+
+    def _stage_metrics(self, name, seconds, failed, io_before, io_after, server_before, server_after):
+        delta = {field: io_after[field] - io_before[field] for field in IO_FIELDS}
+        # Time this process spent working, plus the time worker shards spent
+        busy_seconds = seconds - delta['wait_seconds'] + delta['shard_seconds']
+        rss, peak_rss = memory_usage_mb()
+        metrics = {
+            'stage': name,
+            'failed': failed,
+            'seconds': round(seconds, 6),
+            'generate_seconds': round(max(busy_seconds - delta['load_seconds'], 0.0), 6),
+            'encode_seconds': round(delta['encode_seconds'], 6),
+            'write_seconds': round(delta['write_seconds'], 6),
+            'rows': delta['rows'],
+            'rows_per_second': round(delta['rows'] / seconds, 1) if seconds > 0 else None,
+            'bytes_sent': delta['bytes_sent'],
+            'round_trips': delta['round_trips'],
+            'rss_bytes': int(rss * 1024 * 1024) if rss is not None else None,
+            'peak_rss_bytes': int(peak_rss * 1024 * 1024) if peak_rss is not None else None
+        }
+        for key in ('wal_bytes', 'wal_records', 'wal_fpi', 'statement_calls', 'statement_seconds'):
+            if key in server_before and key in server_after:
+                metrics[key] = server_after[key] - server_before[key]
+        logger.info(f"Stage {name}: {seconds:.3f}s (generate {metrics['generate_seconds']:.3f}s, "
+                    f"encode {metrics['encode_seconds']:.3f}s, write {metrics['write_seconds']:.3f}s), "
+                    f"{metrics['rows']} rows, {metrics['bytes_sent']} bytes in {metrics['round_trips']} round trips")
+        return metrics
+
+    def record_phases(self, group, timings):
+        """Record named phase timings, e.g. the fast-load index rebuild"""
+        self.phases.setdefault(group, {}).update(
+            {phase: round(seconds, 6) for phase, seconds in timings.items()})
+
+    def close(self):
+        if self._stats_conn is not None:
+            self._stats_conn.close()
+            self._stats_conn = None
+
+    def to_json(self):
+        return json.dumps({'stages': self.stages, 'phases': self.phases}, indent=2)
+
+    def to_prometheus(self, prefix='rushmore_populate'):
+        """Render the metrics in the Prometheus text exposition format"""
+        lines = []
+        for key, suffix, help_text in PROMETHEUS_METRICS:
+            samples = [(stage['stage'], stage[key]) for stage in self.stages if stage.get(key) is not None]
+            if not samples:
+                continue
+            lines.append(f"# HELP {prefix}_stage_{suffix} {help_text}")
+            lines.append(f"# TYPE {prefix}_stage_{suffix} gauge")
+            lines.extend(f'{prefix}_stage_{suffix}{{stage="{stage}"}} {value}' for stage, value in samples)
+        if self.phases:
+            lines.append(f"# HELP {prefix}_phase_seconds Wall time of a named phase")
+            lines.append(f"# TYPE {prefix}_phase_seconds gauge")
+            for group, timings in self.phases.items():
+                lines.extend(f'{prefix}_phase_seconds{{group="{group}",phase="{phase}"}} {seconds}'
+                             for phase, seconds in timings.items())
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path, fmt='json'):
+        """Write the metrics to path ('-' for stdout) as JSON or Prometheus text"""
+        output = self.to_prometheus() if fmt == 'prometheus' else self.to_json() + '\n'
+        if path == '-':
+            sys.stdout.write(output)
+        else:
+            with open(path, 'w') as f:
+                f.write(output)
+            logger.info(f"Wrote {fmt} metrics to {path}")
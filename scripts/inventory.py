@@ -0,0 +1,308 @@
+import os
+import json
+import time
+import logging
+from datetime import timedelta
+import psycopg2
+from db import connection_kwargs, get_db_config
+from vectorized import np, require_numpy
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sql', 'inventory.sql')
+
+# Deduct the ingredients of a window of orders in one statement: aggregate
+# Order_Items x Menu_Item_Ingredients per ingredient, update the stock and
+# record the movements
+CONSUME_SQL = """
+    WITH consumption AS (
+        SELECT mii.ingredient_id, SUM(oi.quantity * mii.quantity_required) AS quantity_used
+        FROM Order_Items oi
+        JOIN Menu_Item_Ingredients mii ON mii.menu_item_id = oi.item_id
+        WHERE oi.order_id BETWEEN %(first)s AND %(last)s
+        GROUP BY mii.ingredient_id
+    ), updated AS (
+        UPDATE Ingredients i
+        SET stock_quantity = i.stock_quantity - c.quantity_used
+        FROM consumption c
+        WHERE i.ingredient_id = c.ingredient_id
+        RETURNING i.ingredient_id, c.quantity_used, i.stock_quantity
+    )
+    INSERT INTO inventory_movements (ingredient_id, first_order_id, last_order_id, quantity_used, stock_after)
+    SELECT ingredient_id, %(first)s, %(last)s, quantity_used, stock_quantity
+    FROM updated
+    RETURNING ingredient_id, quantity_used, stock_after
+"""
+
+
+def reset_inventory(cur):
+    """Rewind the consumption watermark and movements (if installed) after the order data was cleared"""
+    cur.execute("SELECT to_regclass('inventory_watermark') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return
+    cur.execute("UPDATE inventory_watermark SET last_order_id = 0, applied_at = NULL")
+    cur.execute("TRUNCATE inventory_movements")
+
+
+class RecipeMatrix:
+    """Dense menu item x ingredient matrix of Menu_Item_Ingredients quantities
+
+    A demand vector (quantity per menu item) or a matrix of them (one row
+    per store, day, ...) multiplied by the recipe matrix gives the
+    ingredient requirements in a single matrix product.
+    """
+
+    def __init__(self, item_ids, ingredient_ids, matrix):
+        require_numpy()
+        self.item_ids = list(item_ids)
+        self.ingredient_ids = list(ingredient_ids)
+        self.item_index = {item_id: i for i, item_id in enumerate(self.item_ids)}
+        self.matrix = matrix
+
+    @classmethod
+    def load(cls, cur):
+        """Build the matrix from the Menu_Items, Ingredients and recipe tables"""
+        require_numpy()
+        cur.execute("SELECT item_id FROM Menu_Items ORDER BY item_id")
+        item_ids = [row[0] for row in cur.fetchall()]
+        cur.execute("SELECT ingredient_id FROM Ingredients ORDER BY ingredient_id")
+        ingredient_ids = [row[0] for row in cur.fetchall()]
+        cur.execute("SELECT menu_item_id, ingredient_id, quantity_required FROM Menu_Item_Ingredients")
+        recipes = cur.fetchall()
+
+        item_index = {item_id: i for i, item_id in enumerate(item_ids)}
+        ingredient_index = {ingredient_id: j for j, ingredient_id in enumerate(ingredient_ids)}
+        matrix = np.zeros((len(item_ids), len(ingredient_ids)))
+        if recipes:
+            rows = [item_index[item_id] for item_id, _, _ in recipes]
+            columns = [ingredient_index[ingredient_id] for _, ingredient_id, _ in recipes]
+            matrix[rows, columns] = [float(quantity) for _, _, quantity in recipes]
+        return cls(item_ids, ingredient_ids, matrix)
+
+    def demand_vector(self, item_quantities):
+        """Turn an {item_id: quantity} mapping into a demand vector"""
+        demand = np.zeros(len(self.item_ids))
+        for item_id, quantity in item_quantities.items():
+            demand[self.item_index[item_id]] = quantity
+        return demand
+
+    def requirements(self, demand):
+        """Ingredient quantities for a demand vector, or per row of a demand matrix"""
+        return np.asarray(demand, dtype=float) @ self.matrix
+
+
+class InventoryEngine:
+    """Deplete Ingredients.stock_quantity from orders in bulk and forecast needs
+
+    consume() deducts every order after the watermark (optionally capped
+    at max_orders) with one set-based statement and advances the watermark
+    in the same transaction, so each order is consumed exactly once. Order
+    ids are drawn before their rows commit and concurrent writers commit
+    them out of order, so the watermark only advances to committed_order_id()
+    rather than MAX(order_id). That covers writers drawing ids in the INSERT
+    that writes them (such as ingest.py); a population run reserves its id
+    blocks up front, so consume after it has finished.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def install(self):
+        """Create the watermark and movement tables"""
+        with open(INVENTORY_PATH) as f:
+            ddl = f.read()
+        with self.conn.cursor() as cur:
+            cur.execute(ddl)
+        self.conn.commit()
+        logger.info("Inventory tables installed")
+
+    def committed_order_id(self, lock_timeout=5.0):
+        """Return an order id at or below which no order is still being written
+
+        A SHARE lock on Orders waits for every open writer transaction, after
+        which each id the sequence has handed out is either committed or
+        rolled back. The lock is released right away. Returns None if the
+        writers did not drain within lock_timeout seconds.
+        """
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("SELECT set_config('lock_timeout', %s, true)", (f"{int(lock_timeout * 1000)}ms",))
+                cur.execute("LOCK TABLE Orders IN SHARE MODE")
+                cur.execute("SELECT pg_sequence_last_value(pg_get_serial_sequence('orders', 'order_id'))")
+                last = cur.fetchone()[0] or 0
+            self.conn.commit()
+        except psycopg2.errors.LockNotAvailable:
+            self.conn.rollback()
+            return None
+        except Exception:
+            self.conn.rollback()
+            raise
+        return last
+
+    def consume(self, max_orders=None, through_order_id=None, lock_timeout=5.0):
+        """Deduct the ingredients of all new orders; returns (first, last, movements)"""
+        started = time.perf_counter()
+        committed = self.committed_order_id(lock_timeout)
+        if committed is None:
+            logger.warning(f"Order writers did not finish within {lock_timeout}s; nothing consumed")
+            return None, None, []
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("SELECT last_order_id FROM inventory_watermark WHERE name = 'orders' FOR UPDATE")
+                row = cur.fetchone()
+                if row is None:
+                    raise RuntimeError("Inventory tables are not installed; run 'inventory.py install' first")
+                first = row[0] + 1
+
+                last = committed
+                if through_order_id is not None:
+                    last = min(last, through_order_id)
+                if max_orders is not None:
+                    last = min(last, first + max_orders - 1)
+                if last < first:
+                    self.conn.rollback()
+                    logger.info("No new orders to consume")
+                    return first, last, []
+
+                cur.execute(CONSUME_SQL, {'first': first, 'last': last})
+                movements = cur.fetchall()
+                cur.execute("""
+                    UPDATE inventory_watermark SET last_order_id = %s, applied_at = CURRENT_TIMESTAMP
+                    WHERE name = 'orders'
+                """, (last,))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        seconds = time.perf_counter() - started
+        stockouts = sum(1 for _, _, stock_after in movements if stock_after <= 0)
+        logger.info(f"Consumed orders {first}-{last} ({last - first + 1} orders) into {len(movements)} "
+                    f"ingredients in {seconds:.3f}s; {stockouts} ingredients out of stock")
+        return first, last, movements
+
+    def stockouts(self):
+        """Return (ingredient_id, name, stock_quantity, unit, first stock-out) of depleted ingredients"""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT i.ingredient_id, i.name, i.stock_quantity, i.unit,
+                       (SELECT MIN(m.applied_at) FROM inventory_movements m
+                        WHERE m.ingredient_id = i.ingredient_id AND m.stock_after <= 0)
+                FROM Ingredients i
+                WHERE i.stock_quantity <= 0
+                ORDER BY i.stock_quantity
+            """)
+            rows = cur.fetchall()
+        self.conn.commit()
+        return rows
+
+    def demand_per_order(self, recipes, stores=None, window=timedelta(days=28)):
+        """Average quantity of each menu item per order over the latest window
+
+        Returns (store_ids, matrix) with one demand row per store, or a single
+        row for all stores when stores is None. The window ends at the newest
+        order rather than now, so it also works on generated history.
+        """
+        by_store = stores is not None
+        group = 'o.store_id' if by_store else '0'
+        params = {'window': window, 'stores': list(stores) if by_store else None}
+        with self.conn.cursor() as cur:
+            cur.execute(f"""
+                WITH recent AS (
+                    SELECT o.order_id, {group} AS store_id
+                    FROM Orders o
+                    WHERE o.order_timestamp >= (SELECT MAX(order_timestamp) FROM Orders) - %(window)s
+                    AND (%(stores)s::integer[] IS NULL OR o.store_id = ANY(%(stores)s))
+                ), order_counts AS (
+                    SELECT store_id, COUNT(*) AS orders FROM recent GROUP BY store_id
+                )
+                SELECT r.store_id, oi.item_id, SUM(oi.quantity)::float8 / MAX(c.orders)
+                FROM recent r
+                JOIN Order_Items oi ON oi.order_id = r.order_id
+                JOIN order_counts c ON c.store_id = r.store_id
+                GROUP BY r.store_id, oi.item_id
+            """, params)
+            rows = cur.fetchall()
+        self.conn.commit()
+
+        store_ids = list(stores) if by_store else [0]
+        row_index = {store_id: r for r, store_id in enumerate(store_ids)}
+        demand = np.zeros((len(store_ids), len(recipes.item_ids)))
+        for store_id, item_id, quantity in rows:
+            demand[row_index[store_id], recipes.item_index[item_id]] = quantity
+        return store_ids, demand
+
+    def forecast(self, orders, stores=None, window=timedelta(days=28)):
+        """Ingredients needed for the next `orders` orders (per store when stores are given)
+
+        Returns {store_id or None: [(ingredient_id, name, unit, needed, stock, shortfall)]},
+        using the recent item mix per order and the recipe matrix.
+        """
+        with self.conn.cursor() as cur:
+            recipes = RecipeMatrix.load(cur)
+            cur.execute("SELECT ingredient_id, name, unit, stock_quantity FROM Ingredients ORDER BY ingredient_id")
+            ingredients = cur.fetchall()
+        self.conn.commit()
+        store_ids, demand = self.demand_per_order(recipes, stores, window)
+
+        # One matrix product for every store
+        needed = recipes.requirements(demand * orders)
+        forecast = {}
+        for store_id, row in zip(store_ids, needed):
+            forecast[store_id if stores is not None else None] = [
+                (ingredient_id, name, unit, round(float(quantity), 2), stock,
+                 round(max(float(quantity) - max(float(stock), 0.0), 0.0), 2))
+                for (ingredient_id, name, unit, stock), quantity in zip(ingredients, row)
+            ]
+        return forecast
+
+
+def main():
+    """Consume orders from inventory, list stock-outs and forecast ingredient needs"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='RushMore Pizzeria inventory depletion engine')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('install', help='Create the inventory tables (idempotent)')
+    consume = subparsers.add_parser('consume', help='Deduct the ingredients of orders after the watermark')
+    consume.add_argument('--max-orders', type=int, default=None,
+                         help='Consume at most this many orders (default: all new orders)')
+    consume.add_argument('--through-order-id', type=int, default=None,
+                         help='Consume orders up to and including this order id')
+    consume.add_argument('--lock-timeout', type=float, default=5.0,
+                         help='Seconds to wait for in-flight order writers (default: 5)')
+    subparsers.add_parser('stockouts', help='List ingredients that are out of stock')
+    forecast = subparsers.add_parser('forecast', help='Ingredients needed for the next N orders')
+    forecast.add_argument('--orders', type=int, required=True)
+    forecast.add_argument('--store', type=int, action='append', default=None, dest='stores',
+                          help='Forecast per store (repeatable; default: all stores together)')
+    forecast.add_argument('--window-days', type=int, default=28,
+                          help='Days of recent orders the item mix is taken from (default: 28)')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    conn = psycopg2.connect(**connection_kwargs(get_db_config()))
+    try:
+        engine = InventoryEngine(conn)
+        if args.command == 'install':
+            engine.install()
+        elif args.command == 'consume':
+            engine.consume(max_orders=args.max_orders, through_order_id=args.through_order_id,
+                           lock_timeout=args.lock_timeout)
+        elif args.command == 'stockouts':
+            for ingredient_id, name, stock, unit, since in engine.stockouts():
+                print(f"{ingredient_id}\t{name}\t{stock} {unit}\tout of stock since {since}")
+        elif args.command == 'forecast':
+            forecast = engine.forecast(args.orders, args.stores, timedelta(days=args.window_days))
+            print(json.dumps({'all' if store is None else str(store): [
+                {'ingredient_id': ingredient_id, 'name': name, 'unit': unit, 'needed': needed,
+                 'stock': float(stock), 'shortfall': shortfall}
+                for ingredient_id, name, unit, needed, stock, shortfall in rows if needed
+            ] for store, rows in forecast.items()}, indent=2))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
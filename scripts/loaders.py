@@ -0,0 +1,226 @@
+import io
+import struct
+import tempfile
+import logging
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from psycopg2.extras import execute_batch
+from columnar import ColumnBatch
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL binary COPY framing
+COPY_BINARY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+COPY_BINARY_TRAILER = struct.pack('>h', -1)
+
+PG_EPOCH = datetime(2000, 1, 1)
+PG_EPOCH_DATE = date(2000, 1, 1)
+
+
+def _count_rows(rows, counter):
+    """Yield rows while counting them into counter[0]"""
+    for row in rows:
+        counter[0] += 1
+        yield row
+
+
+class BatchLoader:
+    """Load rows with execute_batch INSERT statements (fallback backend)"""
+
+    name = 'batch'
+
+    def __init__(self, cur, page_size=1000):
+        self.cur = cur
+        self.page_size = page_size
+
+    def load(self, table, columns, rows):
+        """Insert rows into table and return the number of rows written"""
+        if isinstance(rows, ColumnBatch):
+            rows = rows.rows()
+        placeholders = ', '.join(['%s'] * len(columns))
+        counter = [0]
+        execute_batch(self.cur,
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            _count_rows(rows, counter),
+            page_size=self.page_size
+        )
+        return counter[0]
+
+
+class CopyLoader:
+    """Stream rows into COPY ... FROM STDIN through a spooled buffer"""
+
+    name = 'copy'
+
+    def __init__(self, cur, fmt='text', spool_size=64 * 1024 * 1024):
+        if fmt not in ('text', 'binary'):
+            raise ValueError(f"Unsupported COPY format: {fmt}")
+        self.cur = cur
+        self.fmt = fmt
+        self.spool_size = spool_size
+        self._column_types = {}
+
+    def load(self, table, columns, rows):
+        """COPY rows into table and return the number of rows written
+        
+        A ColumnBatch is encoded straight from its column arrays; any other
+        iterable of tuples goes through the per-value encoders.
+        """
+        if isinstance(rows, ColumnBatch):
+            return self._load_batch(table, columns, rows)
+        with tempfile.SpooledTemporaryFile(max_size=self.spool_size) as buf:
+            if self.fmt == 'binary':
+                count = self._write_binary(buf, table, columns, rows)
+            else:
+                count = self._write_text(buf, rows)
+            buf.seek(0)
+            self.cur.copy_expert(
+                f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT {self.fmt})",
+                buf
+            )
+        return count
+
+    def _load_batch(self, table, columns, batch):
+        if tuple(columns) != batch.names:
+            raise ValueError(f"Columns {', '.join(columns)} do not match the batch columns {', '.join(batch.names)}")
+        if self.fmt == 'binary':
+            batch.check_types(self.get_column_types(table))
+            data = batch.copy_binary()
+        else:
+            data = batch.copy_text()
+        self.cur.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT {self.fmt})",
+            io.BytesIO(data)
+        )
+        return len(batch)
+
+    def _write_text(self, buf, rows):
+        count = 0
+        for row in rows:
+            buf.write(('\t'.join(_text_value(v) for v in row) + '\n').encode('utf-8'))
+            count += 1
+        return count
+
+    def _write_binary(self, buf, table, columns, rows):
+        types = self.get_column_types(table)
+        encoders = [BINARY_ENCODERS[types[column.lower()]] for column in columns]
+        field_count = struct.pack('>h', len(columns))
+        count = 0
+        buf.write(COPY_BINARY_HEADER)
+        for row in rows:
+            parts = [field_count]
+            for encode, value in zip(encoders, row):
+                if value is None:
+                    parts.append(b'\xff\xff\xff\xff')
+                else:
+                    data = encode(value)
+                    parts.append(struct.pack('>i', len(data)))
+                    parts.append(data)
+            buf.write(b''.join(parts))
+            count += 1
+        buf.write(COPY_BINARY_TRAILER)
+        return count
+
+    def get_column_types(self, table):
+        """Look up (and cache) the base type name of each column in table"""
+        key = table.lower()
+        if key not in self._column_types:
+            self.cur.execute("""
+                SELECT a.attname, t.typname
+                FROM pg_attribute a
+                JOIN pg_type t ON t.oid = a.atttypid
+                WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+            """, (key,))
+            self._column_types[key] = dict(self.cur.fetchall())
+        return self._column_types[key]
+
+
+def _text_value(value):
+    """Format a Python value for COPY text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, float):
+        return repr(value)
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+
+def _encode_numeric(value):
+    """Encode a number as PostgreSQL binary NUMERIC (base-10000 digits)"""
+    if isinstance(value, float):
+        # Same literal psycopg2 would send for an INSERT parameter
+        value = Decimal(repr(value))
+    elif not isinstance(value, Decimal):
+        value = Decimal(value)
+    if value.is_nan():
+        return struct.pack('>hhHH', 0, 0, 0xC000, 0)
+
+    sign, digits, exponent = value.as_tuple()
+    digit_str = ''.join(map(str, digits))
+    if exponent > 0:
+        digit_str += '0' * exponent
+        exponent = 0
+    dscale = -exponent
+    if len(digit_str) < dscale:
+        digit_str = '0' * (dscale - len(digit_str)) + digit_str
+
+    int_part = digit_str[:len(digit_str) - dscale]
+    frac_part = digit_str[len(digit_str) - dscale:]
+    int_part = '0' * (-len(int_part) % 4) + int_part
+    frac_part = frac_part + '0' * (-len(frac_part) % 4)
+
+    groups = [int(int_part[i:i + 4]) for i in range(0, len(int_part), 4)]
+    weight = len(groups) - 1
+    groups += [int(frac_part[i:i + 4]) for i in range(0, len(frac_part), 4)]
+
+    # Strip leading and trailing zero digits
+    while groups and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+    while groups and groups[-1] == 0:
+        groups.pop()
+    if not groups:
+        weight = 0
+
+    return struct.pack(f'>hhHH{len(groups)}H', len(groups), weight,
+                       0x4000 if sign else 0x0000, dscale, *groups)
+
+
+def _encode_timestamp(value):
+    return struct.pack('>q', (value - PG_EPOCH) // timedelta(microseconds=1))
+
+
+def _encode_date(value):
+    return struct.pack('>i', (value - PG_EPOCH_DATE).days)
+
+
+def _encode_text(value):
+    return str(value).encode('utf-8')
+
+
+BINARY_ENCODERS = {
+    'int2': lambda v: struct.pack('>h', v),
+    'int4': lambda v: struct.pack('>i', v),
+    'int8': lambda v: struct.pack('>q', v),
+    'float8': lambda v: struct.pack('>d', v),
+    'numeric': _encode_numeric,
+    'timestamp': _encode_timestamp,
+    'date': _encode_date,
+    'varchar': _encode_text,
+    'text': _encode_text,
+    'bpchar': _encode_text,
+}
+
+
+def make_loader(cur, backend='copy', copy_format='text'):
+    """Create the load backend selected on the command line"""
+    if backend == 'batch':
+        return BatchLoader(cur)
+    if backend == 'copy':
+        return CopyLoader(cur, fmt=copy_format)
+    raise ValueError(f"Unknown load backend: {backend}")
@@ -0,0 +1,283 @@
+import re
+import logging
+from bisect import bisect_right
+from datetime import datetime
+import psycopg2
+from db import connection_kwargs, get_db_config
+from columnar import ColumnBatch, from_micros, to_micros
+
+logger = logging.getLogger(__name__)
+
+# Co-partitioned tables, referencing table first so it is detached first
+PARTITIONED_TABLES = ['order_items', 'orders']
+
+RANGE_BOUND = re.compile(r"FOR VALUES FROM \((.+)\) TO \((.+)\)")
+
+
+def month_start(moment):
+    return datetime(moment.year, moment.month, 1)
+
+
+def add_months(moment, months):
+    year, month = divmod(moment.month - 1 + months, 12)
+    return datetime(moment.year + year, month + 1, 1)
+
+
+def parse_bound(value):
+    """Parse one range partition bound as printed by pg_get_expr"""
+    value = value.strip()
+    if value == 'MINVALUE':
+        return datetime.min
+    if value == 'MAXVALUE':
+        return datetime.max
+    return datetime.fromisoformat(value.strip("'"))
+
+
+def is_partitioned(cur, table='orders'):
+    """Return True when table is a partitioned table (schema_partitioned.sql)"""
+    cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = %s::regclass", (table,))
+    return cur.fetchone()[0]
+
+
+class PartitionManager:
+    """Create, route rows into and retire the monthly partitions of Orders and Order_Items
+
+    Partitions are named <table>_pYYYYMM and cover one calendar month of
+    order_timestamp. Rows outside every monthly partition land in the
+    <table>_default partition.
+    """
+
+    def __init__(self, conn, tables=PARTITIONED_TABLES):
+        self.conn = conn
+        self.tables = list(tables)
+        self._bounds = {}
+
+    def partitions(self, table):
+        """Return ([(lower, upper, name)] sorted by lower bound, default partition or None)"""
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT c.oid::regclass::text, pg_get_expr(c.relpartbound, c.oid)
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass
+            """, (table,))
+            rows = cur.fetchall()
+
+        ranges = []
+        default = None
+        for name, bound in rows:
+            match = RANGE_BOUND.match(bound)
+            if match:
+                ranges.append((parse_bound(match.group(1)), parse_bound(match.group(2)), name))
+            elif bound == 'DEFAULT':
+                default = name
+        ranges.sort()
+        return ranges, default
+
+    def load_bounds(self):
+        """Cache the partition bounds used by route()"""
+        for table in self.tables:
+            ranges, default = self.partitions(table)
+            self._bounds[table] = ([lower for lower, _, _ in ranges], [upper for _, upper, _ in ranges],
+                                   [name for _, _, name in ranges], default)
+
+    def route(self, table, rows, timestamp_index):
+        """Group rows by the partition their timestamp falls in; returns (partition, rows) pairs"""
+        if table not in self._bounds:
+            self.load_bounds()
+        lowers, uppers, names, default = self._bounds[table]
+        if isinstance(rows, ColumnBatch):
+            return self._route_batch(table, rows, timestamp_index)
+        groups = {}
+        for row in rows:
+            moment = row[timestamp_index]
+            index = bisect_right(lowers, moment) - 1
+            if index >= 0 and moment < uppers[index]:
+                name = names[index]
+            elif default is not None:
+                name = default
+            else:
+                raise ValueError(f"No partition of {table} accepts order_timestamp {moment}")
+            groups.setdefault(name, []).append(row)
+        return list(groups.items())
+
+    def _route_batch(self, table, batch, timestamp_index):
+        """route() for a ColumnBatch: compare epoch microseconds, then take each group"""
+        lowers, uppers, names, default = self._bounds[table]
+        lowers = [to_micros(lower) for lower in lowers]
+        uppers = [to_micros(upper) for upper in uppers]
+        groups = {}
+        for position, moment in enumerate(batch.values[timestamp_index]):
+            index = bisect_right(lowers, moment) - 1
+            if index >= 0 and moment < uppers[index]:
+                name = names[index]
+            elif default is not None:
+                name = default
+            else:
+                raise ValueError(f"No partition of {table} accepts order_timestamp {from_micros(moment)}")
+            groups.setdefault(name, []).append(position)
+        if len(groups) == 1:
+            return [(name, batch) for name in groups]
+        return [(name, batch.take(indices)) for name, indices in groups.items()]
+
+    def ensure(self, start, end):
+        """Create any missing monthly partitions covering start..end; returns their names
+
+        A partition cannot be created while the default partition holds rows
+        for its month, so those rows are moved: set aside (referencing table
+        first, so deleting them cascades to nothing), the partitions are
+        created and the rows are inserted again through the parent, all in
+        one transaction.
+        """
+        missing = []
+        for table in self.tables:
+            ranges, default = self.partitions(table)
+            month = month_start(start)
+            while month <= end:
+                upper = add_months(month, 1)
+                if not any(lower < upper and month < existing_upper for lower, existing_upper, _ in ranges):
+                    missing.append((table, default, month, upper))
+                month = upper
+
+        created = []
+        moved = {}
+        try:
+            with self.conn.cursor() as cur:
+                for table, default, month, upper in missing:
+                    if default is None:
+                        continue
+                    if table not in moved:
+                        cur.execute(f"CREATE TEMP TABLE {table}_moving (LIKE {table}) ON COMMIT DROP")
+                        moved[table] = 0
+                    columns = ', '.join(self._columns(cur, table))
+                    cur.execute(f"""
+                        WITH moving AS (
+                            DELETE FROM {default}
+                            WHERE order_timestamp >= %s AND order_timestamp < %s
+                            RETURNING {columns}
+                        )
+                        INSERT INTO {table}_moving ({columns}) SELECT {columns} FROM moving
+                    """, (month, upper))
+                    moved[table] += cur.rowcount
+
+                for table, _, month, upper in missing:
+                    name = f"{table}_p{month:%Y%m}"
+                    cur.execute(f"""
+                        CREATE TABLE {name} PARTITION OF {table}
+                        FOR VALUES FROM (%s) TO (%s)
+                    """, (month, upper))
+                    created.append(name)
+
+                # Referenced table first, so the moved rows' foreign keys hold
+                for table in reversed(self.tables):
+                    if moved.get(table):
+                        columns = ', '.join(self._columns(cur, table))
+                        cur.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_moving")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        if created:
+            logger.info(f"Created {len(created)} partitions: {', '.join(created)}")
+        for table, count in moved.items():
+            if count:
+                logger.info(f"Moved {count} rows of {table} from the default partition into the new partitions")
+        self._bounds = {}
+        return created
+
+    @staticmethod
+    def _columns(cur, table):
+        cur.execute("""
+            SELECT attname FROM pg_attribute
+            WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+            ORDER BY attnum
+        """, (table,))
+        return [row[0] for row in cur.fetchall()]
+
+    def premake(self, months_ahead=3):
+        """Create the partitions of the current month and the next months_ahead months"""
+        now = datetime.now()
+        return self.ensure(now, add_months(now, months_ahead))
+
+    def detach(self, before, drop=False):
+        """Detach (or drop) every monthly partition that ends on or before 'before'
+
+        Order_Items partitions go first since they reference Orders. A
+        detached partition becomes a standalone archive table; its foreign
+        keys are dropped so it no longer references the live tables.
+        """
+        retired = []
+        with self.conn.cursor() as cur:
+            for table in self.tables:
+                ranges, _ = self.partitions(table)
+                for lower, upper, name in ranges:
+                    if upper > before:
+                        continue
+                    cur.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+                    if drop:
+                        cur.execute(f"DROP TABLE {name}")
+                    else:
+                        cur.execute("""
+                            SELECT conname FROM pg_constraint
+                            WHERE conrelid = %s::regclass AND contype = 'f'
+                        """, (name,))
+                        for (constraint,) in cur.fetchall():
+                            cur.execute(f"ALTER TABLE {name} DROP CONSTRAINT {constraint}")
+                    retired.append(name)
+        self.conn.commit()
+        if retired:
+            logger.info(f"{'Dropped' if drop else 'Detached'} {len(retired)} partitions: {', '.join(retired)}")
+        self._bounds = {}
+        return retired
+
+
+def main():
+    """Manage the monthly Orders/Order_Items partitions from the command line"""
+    import argparse
+
+    def month(value):
+        return datetime.strptime(value, '%Y-%m')
+
+    parser = argparse.ArgumentParser(description='Manage monthly partitions of the partitioned RushMore schema')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help='List the partitions and their row counts')
+    create = subparsers.add_parser('create', help='Create monthly partitions for a range of months')
+    create.add_argument('--from', dest='start', type=month, required=True, metavar='YYYY-MM')
+    create.add_argument('--to', dest='end', type=month, required=True, metavar='YYYY-MM')
+    premake = subparsers.add_parser('premake', help='Create partitions for the current and upcoming months')
+    premake.add_argument('--months', type=int, default=3,
+                         help='Months ahead of the current one (default: 3)')
+    detach = subparsers.add_parser('detach', help='Detach partitions that end on or before a month')
+    detach.add_argument('--before', type=month, required=True, metavar='YYYY-MM')
+    detach.add_argument('--drop', action='store_true',
+                        help='Drop the detached partitions instead of keeping them as archive tables')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    conn = psycopg2.connect(**connection_kwargs(get_db_config()))
+    try:
+        with conn.cursor() as cur:
+            if not is_partitioned(cur):
+                parser.error("Orders is not partitioned; create the schema from sql/schema_partitioned.sql")
+        manager = PartitionManager(conn)
+        if args.command == 'list':
+            with conn.cursor() as cur:
+                for table in reversed(manager.tables):
+                    ranges, default = manager.partitions(table)
+                    for lower, upper, name in ranges + [(None, None, default)] * bool(default):
+                        cur.execute(f"SELECT COUNT(*) FROM {name}")
+                        span = f"{lower:%Y-%m-%d} .. {upper:%Y-%m-%d}" if lower else "default"
+                        print(f"{table}\t{name}\t{span}\t{cur.fetchone()[0]}")
+        elif args.command == 'create':
+            manager.ensure(args.start, args.end)
+        elif args.command == 'premake':
+            manager.premake(args.months)
+        elif args.command == 'detach':
+            manager.detach(args.before, drop=args.drop)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import io
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import psycopg2
+from db import connection_kwargs
+from loaders import make_loader
+from checkpoints import CHUNK_SQL
+from columnar import ColumnBatch
+
+logger = logging.getLogger(__name__)
+
+DRIVERS = ('psycopg2', 'psycopg', 'asyncpg')
+
+
+def _numbered(sql):
+    """Rewrite %s placeholders as $1, $2, ... for asyncpg"""
+    parts = sql.split('%s')
+    return parts[0] + ''.join(f"${i}{part}" for i, part in enumerate(parts[1:], 1))
+
+
+class Psycopg2Writer:
+    """Blocking psycopg2 connection driven from a thread (libpq releases the GIL while waiting)"""
+
+    def __init__(self, db_config, loader='copy', copy_format='text'):
+        self.db_config = db_config
+        self.loader_backend = loader
+        self.copy_format = copy_format
+        self.conn = None
+
+    async def connect(self):
+        self.conn = await asyncio.to_thread(psycopg2.connect, **connection_kwargs(self.db_config))
+        self.cur = self.conn.cursor()
+        self.loader = make_loader(self.cur, self.loader_backend, self.copy_format)
+
+    async def write(self, loads, checkpoint):
+        await asyncio.to_thread(self._write, loads, checkpoint)
+
+    def _write(self, loads, checkpoint):
+        try:
+            for table, columns, rows in loads:
+                self.loader.load(table, columns, rows)
+            if checkpoint:
+                self.cur.execute(CHUNK_SQL, checkpoint)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    async def close(self):
+        if self.conn:
+            await asyncio.to_thread(self.conn.close)
+
+
+class PsycopgWriter:
+    """psycopg 3 AsyncConnection writing each load with COPY ... FROM STDIN"""
+
+    def __init__(self, db_config, **options):
+        try:
+            import psycopg
+        except ImportError:
+            raise RuntimeError("--async-driver psycopg needs psycopg 3 (pip install 'psycopg[binary]')")
+        self.psycopg = psycopg
+        self.db_config = db_config
+        self.conn = None
+
+    async def connect(self):
+        kwargs = connection_kwargs(self.db_config)
+        kwargs['dbname'] = kwargs.pop('database')
+        self.conn = await self.psycopg.AsyncConnection.connect(**kwargs)
+
+    async def write(self, loads, checkpoint):
+        async with self.conn.transaction():
+            async with self.conn.cursor() as cur:
+                for table, columns, rows in loads:
+                    if isinstance(rows, ColumnBatch):
+                        async with cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT BINARY)") as copy:
+                            await copy.write(rows.copy_binary())
+                        continue
+                    async with cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+                        for row in rows:
+                            await copy.write_row(row)
+                if checkpoint:
+                    await cur.execute(CHUNK_SQL, checkpoint)
+
+    async def close(self):
+        if self.conn:
+            await self.conn.close()
+
+
+class AsyncpgWriter:
+    """asyncpg connection writing each load with binary COPY
+
+    Column batches are sent as their own COPY binary stream; other rows go
+    through copy_records_to_table.
+    """
+
+    def __init__(self, db_config, **options):
+        try:
+            import asyncpg
+        except ImportError:
+            raise RuntimeError("--async-driver asyncpg needs asyncpg (pip install asyncpg)")
+        self.asyncpg = asyncpg
+        self.db_config = db_config
+        self.conn = None
+
+    async def connect(self):
+        kwargs = connection_kwargs(self.db_config)
+        self.conn = await self.asyncpg.connect(host=kwargs['host'], port=int(kwargs['port']),
+                                               user=kwargs['user'], password=kwargs['password'],
+                                               database=kwargs['database'], ssl=kwargs['sslmode'])
+
+    async def write(self, loads, checkpoint):
+        async with self.conn.transaction():
+            for table, columns, rows in loads:
+                columns = [column.lower() for column in columns]
+                if isinstance(rows, ColumnBatch):
+                    await self.conn.copy_to_table(table.lower(), source=io.BytesIO(rows.copy_binary()),
+                                                  columns=columns, format='binary')
+                else:
+                    await self.conn.copy_records_to_table(table.lower(), records=rows, columns=columns)
+            if checkpoint:
+                await self.conn.execute(_numbered(CHUNK_SQL), *checkpoint)
+
+    async def close(self):
+        if self.conn:
+            await self.conn.close()
+
+
+WRITERS = {
+    'psycopg2': Psycopg2Writer,
+    'psycopg': PsycopgWriter,
+    'asyncpg': AsyncpgWriter,
+}
+
+
+class PipelinedLoader:
+    """Overlap chunk generation with concurrent writes over several connections
+
+    A producer thread generates chunks into a bounded asyncio queue while
+    `writers` connections drain it, so chunk N+1 is generated while chunk N
+    (and up to writers - 1 others) is in flight. The queue depth bounds how
+    many generated chunks are held in memory. Each chunk is written and
+    committed in one transaction together with its checkpoint, so chunks
+    can commit out of order and a failed run still resumes exactly.
+    """
+
+    def __init__(self, db_config, writers=4, driver='psycopg2', queue_depth=None,
+                 loader='copy', copy_format='text'):
+        if driver not in WRITERS:
+            raise ValueError(f"Unknown async driver: {driver} (choose from {', '.join(DRIVERS)})")
+        self.db_config = db_config
+        self.writers = writers
+        self.driver = driver
+        self.queue_depth = queue_depth or 2 * writers
+        self.loader = loader
+        self.copy_format = copy_format
+        self.generate_seconds = 0.0
+        self.write_seconds = 0.0
+        self.rows = 0
+
+    def run(self, stage, chunks, run_id=None):
+        """Load (chunk first id, chunk size, loads) items; loads are (table, columns, rows)
+
+        The chunks iterable is consumed in a producer thread. When run_id is
+        given every chunk is committed with its populate_checkpoints row.
+        Returns the number of chunks written.
+        """
+        started = time.perf_counter()
+        written = asyncio.run(self._run(stage, iter(chunks), run_id))
+        wall = time.perf_counter() - started
+        logger.info(f"Pipelined {written} {stage} chunks ({self.rows} rows) over {self.writers} {self.driver} "
+                    f"writers in {wall:.2f}s: generating {self.generate_seconds:.2f}s, "
+                    f"writing {self.write_seconds:.2f}s (summed over writers)")
+        return written
+
+    async def _run(self, stage, chunks, run_id):
+        queue = asyncio.Queue(self.queue_depth)
+        writers = [WRITERS[self.driver](self.db_config, loader=self.loader, copy_format=self.copy_format)
+                   for _ in range(self.writers)]
+        written = [0]
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='generate') as executor:
+            try:
+                await asyncio.gather(*(writer.connect() for writer in writers))
+                tasks = [asyncio.ensure_future(self._produce(chunks, queue, executor))]
+                tasks += [asyncio.ensure_future(self._drain(writer, queue, stage, run_id, written))
+                          for writer in writers]
+                try:
+                    await asyncio.gather(*tasks)
+                except BaseException:
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                    raise
+            finally:
+                await asyncio.gather(*(writer.close() for writer in writers), return_exceptions=True)
+        return written[0]
+
+    async def _produce(self, chunks, queue, executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = time.perf_counter()
+            chunk = await loop.run_in_executor(executor, next, chunks, None)
+            self.generate_seconds += time.perf_counter() - started
+            if chunk is None:
+                break
+            await queue.put(chunk)
+        for _ in range(self.writers):
+            await queue.put(None)
+
+    async def _drain(self, writer, queue, stage, run_id, written):
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                return
+            first_id, size, loads = chunk
+            checkpoint = (run_id, stage, first_id, size) if run_id is not None else None
+            started = time.perf_counter()
+            await writer.write(loads, checkpoint)
+            self.write_seconds += time.perf_counter() - started
+            self.rows += sum(len(rows) for _, _, rows in loads)
+            written[0] += 1
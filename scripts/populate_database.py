@@ -1,60 +1,166 @@
-import os
+import time
+import json
+import hashlib
+import multiprocessing
 import psycopg2
-from psycopg2.extras import execute_batch
 from faker import Faker
 import random
 from datetime import datetime, timedelta
+from itertools import islice
+from array import array
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
 import logging
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
+from db import connection_kwargs, get_db_config
+from loaders import make_loader
+from vectorized import NumpyOrderGenerator, require_numpy
+from workload import WorkloadModel
+from catalog import CATALOG_PATH, Catalog
+from checkpoints import CheckpointLog
+from pipeline import PipelinedLoader
+from columnar import ORDER_COLUMNS, ORDER_ITEM_COLUMNS, ColumnBuilder
+from identity import IdentityGenerator
+from fast_load import FastLoadManager
+from rollups import reset_rollups
+from inventory import reset_inventory
+from partitions import PartitionManager, is_partitioned
+from instrumentation import (Instrumentation, InstrumentedConnection, InstrumentedLoader,
+                             memory_usage_mb, profiled)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Tables written by the populator, parents before children
+TABLES = [
+    'stores',
+    'customers',
+    'ingredients',
+    'menu_items',
+    'menu_item_ingredients',
+    'orders',
+    'order_items'
+]
+
+# Names repeat heavily, so they are interned per chunk
+CUSTOMER_COLUMNS = (('customer_id', 'int4'), ('first_name', 'category'), ('last_name', 'category'),
+                    ('email', 'text'), ('phone_number', 'text'), ('created_at', 'timestamp'))
+
+def chunked(rows, size):
+    """Group an iterable of rows into lists of at most size rows"""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+def derive_seed(seed, *parts):
+    """Derive a deterministic sub-seed (e.g. per stage and shard) from the run seed"""
+    key = ':'.join(str(part) for part in (seed,) + parts).encode('utf-8')
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], 'big')
+
+def split_range(first_id, count, shards, align=1):
+    """Split the id range [first_id, first_id + count) into contiguous (start, size) shards
+
+    Shard sizes are rounded up to a multiple of align, so shards start on
+    the chunk grid of the whole range.
+    """
+    size = -(-count // shards)
+    size = -(-size // align) * align
+    end = first_id + count
+    return [(start, min(size, end - start)) for start in range(first_id, end, size)]
+
+def run_shard(task):
+    """Generate and load one id-range shard in a worker process over its own connection"""
+    stage, first_id, count, options = task
+    populator = DatabasePopulator(**options)
+    populator.connect()
+    started = time.perf_counter()
+    try:
+        profile = (profiled(populator.profile_dir, f"{stage}-shard-{first_id}")
+                   if populator.profile_dir else nullcontext())
+        with profile:
+            if stage == 'customers':
+                result = populator.load_customer_range(first_id, count)
+            else:
+                result = populator.load_order_range(first_id, count)
+        
+        # Hand the shard's I/O counters back to the parent's instrumentation
+        io = None
+        if populator.instrument:
+            populator.conn.io.shard_seconds += time.perf_counter() - started
+            io = populator.conn.io.snapshot()
+        return result, io
+    finally:
+        populator.disconnect()
+
 class DatabasePopulator:
-    def __init__(self):
+    def __init__(self, loader='copy', copy_format='text', chunk_size=10000,
+                 workers=1, seed=None, db_config=None, generator='python', workload=None,
+                 customer_window=None, order_window=None, instrument=False, profile_dir=None,
+                 catalog=None, as_of=None, run_id=None, async_writers=0, async_driver='psycopg2',
+                 queue_depth=None, order_item_block=None):
+        if generator == 'numpy':
+            require_numpy()
+        if seed is None:
+            seed = random.SystemRandom().randrange(2**32)
         self.fake = Faker()
+        self.random = random.Random(seed)
+        self.fake.seed_instance(seed)
+        self.seed = seed
+        # Every generated time window is relative to as_of, not the clock
+        self.as_of = as_of or datetime.now()
+        self.run_id = run_id
+        self.checkpoints = None
+        self.numpy_generator = None
+        self.async_writers = async_writers
+        self.async_driver = async_driver
+        self.queue_depth = queue_depth
+        # (first order id, first order_item_id) of the orders stage's id blocks
+        self.order_item_block = order_item_block
         self.conn = None
         self.cur = None
+        self.loader_backend = loader
+        self.copy_format = copy_format
+        self.loader = None
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.db_config = db_config
+        self.generator = generator
+        self.workload = workload or WorkloadModel()
+        self.catalog = catalog or Catalog.from_yaml()
+        self.customer_identity = IdentityGenerator()
+        self.store_identity = IdentityGenerator(namespace=1)
+        self.customer_window = customer_window
+        self.order_window = order_window
+        self.instrument = instrument or profile_dir is not None
+        self.profile_dir = profile_dir
+        self.instrumentation = None
         
     def get_db_config(self):
         """Get database configuration from environment variables"""
-        config = {
-            'host': os.getenv('DB_HOST'),
-            'database': os.getenv('DB_NAME'),
-            'user': os.getenv('DB_USER'),
-            'password': os.getenv('DB_PASSWORD'),
-            'port': os.getenv('DB_PORT', '5432')
-        }
-        
-        # Validate required environment variables
-        missing_vars = []
-        for key, value in config.items():
-            if value is None and key != 'port':
-                missing_vars.append(key)
-        
-        if missing_vars:
-            raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
-        
-        logger.info(f"Database configuration loaded for host: {config['host']}")
-        return config
+        return get_db_config()
+    
+    def open_connection(self):
+        """Open a new database connection with the populator's configuration"""
+        if self.db_config is None:
+            self.db_config = self.get_db_config()
+        return psycopg2.connect(
+            connection_factory=InstrumentedConnection if self.instrument else None,
+            **connection_kwargs(self.db_config)
+        )
     
     def connect(self):
         """Establish database connection"""
-        config = self.get_db_config()
         try:
-            self.conn = psycopg2.connect(
-                host=config['host'],
-                database=config['database'],
-                user=config['user'],
-                password=config['password'],
-                port=config['port'],
-                sslmode=os.getenv('DB_SSLMODE', 'require')
-            )
+            self.conn = self.open_connection()
             self.cur = self.conn.cursor()
+            self.loader = make_loader(self.cur, self.loader_backend, self.copy_format)
+            if self.instrument:
+                self.loader = InstrumentedLoader(self.loader, self.conn.io)
+            if self.run_id is not None:
+                self.checkpoints = CheckpointLog(self.conn, self.run_id)
             logger.info("Successfully connected to database")
         except Exception as e:
             logger.error(f"Database connection failed: {e}")
@@ -71,23 +177,22 @@ class DatabasePopulator:
     def clear_existing_data(self):
         """Clear all existing data from tables in correct order to avoid FK constraints"""
         logger.info("Clearing existing data...")
-        tables = [
-            'order_items',
-            'orders', 
-            'menu_item_ingredients',
-            'menu_items',
-            'ingredients',
-            'customers',
-            'stores'
-        ]
-        
-        for table in tables:
+        
+        for table in reversed(TABLES):
+            # A failed TRUNCATE only rolls back to its savepoint, so the
+            # transaction stays usable for the remaining tables and resets
+            self.cur.execute("SAVEPOINT clear_table")
             try:
                 self.cur.execute(f"TRUNCATE TABLE {table} RESTART IDENTITY CASCADE")
+                self.cur.execute("RELEASE SAVEPOINT clear_table")
                 logger.info(f"Cleared table: {table}")
-            except Exception as e:
+            except psycopg2.Error as e:
+                self.cur.execute("ROLLBACK TO SAVEPOINT clear_table")
                 logger.warning(f"Could not clear table {table}: {e}")
         
+        # Rollups and the inventory watermark describe the cleared orders, so they are reset with them
+        reset_rollups(self.cur)
+        reset_inventory(self.cur)
         self.conn.commit()
     
     def populate_stores(self, count=5):
@@ -97,178 +202,102 @@ class DatabasePopulator:
         cities = ['New York', 'Chicago', 'Los Angeles', 'Miami', 'Houston']
         
         # Calculate date range for store opening times
-        end_date = datetime.now() - timedelta(days=365)  # 1 year ago
-        start_date = datetime.now() - timedelta(days=5*365)  # 5 years ago
+        end_date = self.as_of - timedelta(days=365)  # 1 year ago
+        start_date = self.as_of - timedelta(days=5*365)  # 5 years ago
         
+        first_store_id = self.reserve_stage_ids('stores', 'stores', 'store_id', count)
+        self.reseed('stores')
         for i in range(count):
+            store_id = first_store_id + i
             stores.append((
+                store_id,
                 self.fake.street_address(),
                 cities[i % len(cities)],
-                self.fake.phone_number()[:20],
+                self.store_identity.phone_number(store_id),
                 self.fake.date_time_between(start_date=start_date, end_date=end_date)
             ))
         
-        execute_batch(self.cur,
-            "INSERT INTO Stores (address, city, phone_number, opened_at) VALUES (%s, %s, %s, %s)",
-            stores
-        )
-        self.conn.commit()
+        self.loader.load('Stores', ('store_id', 'address', 'city', 'phone_number', 'opened_at'), stores)
+        self.commit_stage('stores')
         logger.info(f"Added {count} stores")
     
-    def populate_customers(self, count=1000):
-        """Populate Customers table"""
-        logger.info(f"Populating {count} customers...")
-        customers = []
-        
-        # Calculate date range for customer creation times
-        end_date = datetime.now()
-        start_date = datetime.now() - timedelta(days=2*365)  # 2 years ago
+    def customer_date_range(self):
+        """Return the (start, end) range of generated customer creation times"""
+        if self.customer_window:
+            return self.customer_window
+        end_date = self.as_of
+        start_date = self.as_of - timedelta(days=2*365)  # 2 years ago
+        return start_date, end_date
+    
+    def generate_customers(self, count, first_customer_id):
+        """Yield customer rows with explicit ids one at a time
         
-        # Use a set to track used emails to ensure uniqueness
-        used_emails = set()
+        Email and phone number are derived from the customer id, so they are
+        unique without any lookup set, including across worker processes.
+        """
+        start_date, end_date = self.customer_date_range()
         
         for i in range(count):
+            customer_id = first_customer_id + i
             first_name = self.fake.first_name()
             last_name = self.fake.last_name()
             
-            # Generate unique email with multiple fallbacks
-            base_email = f"{first_name.lower()}.{last_name.lower()}"
-            email = f"{base_email}@{self.fake.free_email_domain()}"
-            
-            # If email already exists, add a number to make it unique
-            counter = 1
-            while email in used_emails:
-                email = f"{base_email}{counter}@{self.fake.free_email_domain()}"
-                counter += 1
-                
-            used_emails.add(email)
-            
-            customers.append((
+            yield (
+                customer_id,
                 first_name,
                 last_name,
-                email,
-                self.fake.phone_number()[:20],
+                self.customer_identity.email(first_name, last_name, self.fake.free_email_domain(), customer_id),
+                self.customer_identity.phone_number(customer_id),
                 self.fake.date_time_between(start_date=start_date, end_date=end_date)
-            ))
-        
-        execute_batch(self.cur,
-            "INSERT INTO Customers (first_name, last_name, email, phone_number, created_at) VALUES (%s, %s, %s, %s, %s)",
-            customers
-        )
-        self.conn.commit()
+            )
+    
+    def populate_customers(self, count=1000):
+        """Populate Customers table"""
+        logger.info(f"Populating {count} customers...")
+        if count <= 0:
+            return
+        
+        first_customer_id = self.reserve_stage_ids('customers', 'customers', 'customer_id', count)
+        if self.workers > 1:
+            self.run_sharded('customers', first_customer_id, count)
+        else:
+            self.load_customer_range(first_customer_id, count)
+        self.commit_stage('customers')
         logger.info(f"Added {count} customers")
+        self.log_memory('customers')
+    
+    def load_customer_range(self, first_customer_id, count):
+        """Generate and load customers with explicit ids (one worker shard), one commit per chunk"""
+        pending = self.pending_chunks('customers', first_customer_id, count)
+        
+        def chunks():
+            for start, size in pending:
+                self.reseed('customers', start)
+                customers = ColumnBuilder(CUSTOMER_COLUMNS).extend(self.generate_customers(size, start)).build()
+                yield start, size, [('Customers', customers.names, customers)]
+        
+        self.load_chunks('customers', chunks())
+        logger.info(f"Loaded customers {first_customer_id}-{first_customer_id + count - 1}")
+        return count
     
     def populate_ingredients(self):
         """Populate Ingredients table"""
         logger.info("Populating ingredients...")
-        ingredients_data = [
-            # Pizza ingredients
-            ('Pizza Dough', 'kg', 100.0),
-            ('Tomato Sauce', 'liters', 50.0),
-            ('Mozzarella Cheese', 'kg', 80.0),
-            ('Pepperoni', 'kg', 60.0),
-            ('Mushrooms', 'kg', 40.0),
-            ('Green Peppers', 'kg', 35.0),
-            ('Onions', 'kg', 30.0),
-            ('Black Olives', 'kg', 25.0),
-            ('Sausage', 'kg', 45.0),
-            ('Bacon', 'kg', 40.0),
-            ('Ham', 'kg', 35.0),
-            ('Pineapple', 'kg', 20.0),
-            ('Basil', 'kg', 10.0),
-            ('Oregano', 'kg', 8.0),
-            ('Garlic', 'kg', 15.0),
-            ('Parmesan Cheese', 'kg', 25.0),
-            ('Ricotta Cheese', 'kg', 20.0),
-            ('Spinach', 'kg', 15.0),
-            ('Jalapenos', 'kg', 12.0),
-            ('Anchovies', 'kg', 8.0),
-            # Drink ingredients
-            ('Cola Syrup', 'liters', 30.0),
-            ('Diet Cola Syrup', 'liters', 25.0),
-            ('Lemonade Mix', 'kg', 20.0),
-            ('Iced Tea Mix', 'kg', 18.0),
-            ('Coffee Beans', 'kg', 25.0),
-            ('Tea Leaves', 'kg', 15.0),
-            ('Bottled Water', 'units', 200.0),
-            # Side dish ingredients
-            ('Chicken Wings', 'kg', 40.0),
-            ('Potatoes', 'kg', 60.0),
-            ('Bread Dough', 'kg', 30.0),
-            ('Garlic Butter', 'kg', 20.0),
-            ('Ranch Dressing', 'liters', 15.0),
-            ('Blue Cheese Dressing', 'liters', 12.0),
-            ('Marinara Sauce', 'liters', 25.0),
-            ('Buffalo Sauce', 'liters', 18.0),
-            ('Mozzarella Cheese Sticks', 'kg', 22.0),
-            ('Flour', 'kg', 50.0),
-            ('Olive Oil', 'liters', 30.0),
-            ('Salt', 'kg', 10.0),
-            ('Black Pepper', 'kg', 8.0),
-            ('Red Pepper Flakes', 'kg', 5.0)
-        ]
-        
-        ingredients = []
-        for name, unit, stock in ingredients_data:
-            ingredients.append((name, stock, unit))
-        
-        execute_batch(self.cur,
-            "INSERT INTO Ingredients (name, stock_quantity, unit) VALUES (%s, %s, %s)",
-            ingredients
-        )
-        self.conn.commit()
+        first_id = self.reserve_stage_ids('ingredients', 'ingredients', 'ingredient_id', len(self.catalog.ingredients))
+        ingredients = [(first_id + i, name, stock, unit) for i, (name, unit, stock) in enumerate(self.catalog.ingredients)]
+        
+        self.loader.load('Ingredients', ('ingredient_id', 'name', 'stock_quantity', 'unit'), ingredients)
+        self.commit_stage('ingredients')
         logger.info(f"Added {len(ingredients)} ingredients")
     
     def populate_menu_items(self):
         """Populate Menu_Items table"""
         logger.info("Populating menu items...")
-        menu_items_data = [
-            # Pizzas
-            ('Margherita Pizza', 'Pizza', 'Small', 12.99),
-            ('Margherita Pizza', 'Pizza', 'Medium', 15.99),
-            ('Margherita Pizza', 'Pizza', 'Large', 18.99),
-            ('Pepperoni Pizza', 'Pizza', 'Small', 14.99),
-            ('Pepperoni Pizza', 'Pizza', 'Medium', 17.99),
-            ('Pepperoni Pizza', 'Pizza', 'Large', 20.99),
-            ('Vegetarian Pizza', 'Pizza', 'Small', 13.99),
-            ('Vegetarian Pizza', 'Pizza', 'Medium', 16.99),
-            ('Vegetarian Pizza', 'Pizza', 'Large', 19.99),
-            ('Supreme Pizza', 'Pizza', 'Small', 16.99),
-            ('Supreme Pizza', 'Pizza', 'Medium', 19.99),
-            ('Supreme Pizza', 'Pizza', 'Large', 22.99),
-            ('Hawaiian Pizza', 'Pizza', 'Small', 15.99),
-            ('Hawaiian Pizza', 'Pizza', 'Medium', 18.99),
-            ('Hawaiian Pizza', 'Pizza', 'Large', 21.99),
-            ('Meat Lovers Pizza', 'Pizza', 'Small', 17.99),
-            ('Meat Lovers Pizza', 'Pizza', 'Medium', 20.99),
-            ('Meat Lovers Pizza', 'Pizza', 'Large', 23.99),
-            ('BBQ Chicken Pizza', 'Pizza', 'Small', 16.49),
-            ('BBQ Chicken Pizza', 'Pizza', 'Medium', 19.49),
-            ('BBQ Chicken Pizza', 'Pizza', 'Large', 22.49),
-            # Drinks
-            ('Cola', 'Drink', '500ml', 2.99),
-            ('Diet Cola', 'Drink', '500ml', 2.99),
-            ('Lemonade', 'Drink', '500ml', 2.49),
-            ('Iced Tea', 'Drink', '500ml', 2.49),
-            ('Bottled Water', 'Drink', '500ml', 1.99),
-            ('Coffee', 'Drink', 'Regular', 2.99),
-            ('Hot Tea', 'Drink', 'Regular', 2.49),
-            # Sides
-            ('Garlic Bread', 'Side', 'N/A', 4.99),
-            ('Cheesy Bread', 'Side', 'N/A', 5.99),
-            ('Chicken Wings', 'Side', '8 pieces', 8.99),
-            ('Chicken Wings', 'Side', '16 pieces', 15.99),
-            ('Mozzarella Sticks', 'Side', '6 pieces', 6.99),
-            ('Potato Wedges', 'Side', 'Regular', 4.99),
-            ('Onion Rings', 'Side', 'Regular', 5.49),
-            ('Garden Salad', 'Side', 'Regular', 6.99)
-        ]
-        
-        execute_batch(self.cur,
-            "INSERT INTO Menu_Items (name, category, size, price) VALUES (%s, %s, %s, %s)",
-            menu_items_data
-        )
-        self.conn.commit()
+        first_id = self.reserve_stage_ids('menu_items', 'menu_items', 'item_id', len(self.catalog.menu_items))
+        menu_items_data = [(first_id + i,) + item for i, item in enumerate(self.catalog.menu_items)]
+        
+        self.loader.load('Menu_Items', ('item_id', 'name', 'category', 'size', 'price'), menu_items_data)
+        self.commit_stage('menu_items')
         logger.info(f"Added {len(menu_items_data)} menu items")
     
     def populate_menu_item_ingredients(self):
@@ -276,196 +305,357 @@ class DatabasePopulator:
         logger.info("Linking menu items with ingredients...")
         
         # Get all menu items and ingredients
-        self.cur.execute("SELECT item_id, name, category FROM Menu_Items")
+        self.cur.execute("SELECT item_id, name, size FROM Menu_Items")
         menu_items = self.cur.fetchall()
         
         self.cur.execute("SELECT ingredient_id, name FROM Ingredients")
         ingredients = {name: id for id, name in self.cur.fetchall()}
         
-        mappings = []
-        
-        for item_id, item_name, category in menu_items:
-            if category == 'Pizza':
-                # Base pizza ingredients
-                mappings.extend([
-                    (item_id, ingredients['Pizza Dough'], 0.25),
-                    (item_id, ingredients['Tomato Sauce'], 0.1),
-                    (item_id, ingredients['Mozzarella Cheese'], 0.2)
-                ])
-                
-                # Specific pizza toppings
-                if 'Margherita' in item_name:
-                    mappings.append((item_id, ingredients['Basil'], 0.02))
-                elif 'Pepperoni' in item_name:
-                    mappings.append((item_id, ingredients['Pepperoni'], 0.15))
-                elif 'Vegetarian' in item_name:
-                    mappings.extend([
-                        (item_id, ingredients['Mushrooms'], 0.08),
-                        (item_id, ingredients['Green Peppers'], 0.06),
-                        (item_id, ingredients['Onions'], 0.05),
-                        (item_id, ingredients['Black Olives'], 0.04)
-                    ])
-                elif 'Supreme' in item_name:
-                    mappings.extend([
-                        (item_id, ingredients['Pepperoni'], 0.08),
-                        (item_id, ingredients['Sausage'], 0.06),
-                        (item_id, ingredients['Mushrooms'], 0.04),
-                        (item_id, ingredients['Green Peppers'], 0.04),
-                        (item_id, ingredients['Onions'], 0.03)
-                    ])
-                elif 'Hawaiian' in item_name:
-                    mappings.extend([
-                        (item_id, ingredients['Ham'], 0.1),
-                        (item_id, ingredients['Pineapple'], 0.08)
-                    ])
-                elif 'Meat Lovers' in item_name:
-                    mappings.extend([
-                        (item_id, ingredients['Pepperoni'], 0.08),
-                        (item_id, ingredients['Sausage'], 0.06),
-                        (item_id, ingredients['Bacon'], 0.05),
-                        (item_id, ingredients['Ham'], 0.05)
-                    ])
-                    
-            elif category == 'Drink':
-                if 'Cola' in item_name and 'Diet' not in item_name:
-                    mappings.append((item_id, ingredients['Cola Syrup'], 0.05))
-                elif 'Diet Cola' in item_name:
-                    mappings.append((item_id, ingredients['Diet Cola Syrup'], 0.05))
-                elif 'Lemonade' in item_name:
-                    mappings.append((item_id, ingredients['Lemonade Mix'], 0.03))
-                elif 'Iced Tea' in item_name:
-                    mappings.append((item_id, ingredients['Iced Tea Mix'], 0.03))
-                elif 'Coffee' in item_name:
-                    mappings.append((item_id, ingredients['Coffee Beans'], 0.02))
-                elif 'Hot Tea' in item_name:
-                    mappings.append((item_id, ingredients['Tea Leaves'], 0.01))
-                elif 'Bottled Water' in item_name:
-                    mappings.append((item_id, ingredients['Bottled Water'], 1))
-                    
-            elif category == 'Side':
-                if 'Garlic Bread' in item_name:
-                    mappings.extend([
-                        (item_id, ingredients['Bread Dough'], 0.1),
-                        (item_id, ingredients['Garlic Butter'], 0.05)
-                    ])
-                elif 'Cheesy Bread' in item_name:
-                    mappings.extend([
-                        (item_id, ingredients['Bread Dough'], 0.1),
-                        (item_id, ingredients['Mozzarella Cheese'], 0.08),
-                        (item_id, ingredients['Garlic Butter'], 0.03)
-                    ])
-                elif 'Chicken Wings' in item_name:
-                    mappings.append((item_id, ingredients['Chicken Wings'], 0.4))
-                    if '8 pieces' in item_name:
-                        mappings.append((item_id, ingredients['Buffalo Sauce'], 0.05))
-                    else:  # 16 pieces
-                        mappings.append((item_id, ingredients['Buffalo Sauce'], 0.1))
-                elif 'Mozzarella Sticks' in item_name:
-                    mappings.extend([
-                        (item_id, ingredients['Mozzarella Cheese Sticks'], 0.3),
-                        (item_id, ingredients['Marinara Sauce'], 0.08)
-                    ])
-                elif 'Potato Wedges' in item_name:
-                    mappings.extend([
-                        (item_id, ingredients['Potatoes'], 0.2),
-                        (item_id, ingredients['Olive Oil'], 0.03)
-                    ])
-                elif 'Onion Rings' in item_name:
-                    mappings.extend([
-                        (item_id, ingredients['Onions'], 0.15),
-                        (item_id, ingredients['Flour'], 0.08),
-                        (item_id, ingredients['Olive Oil'], 0.05)
-                    ])
-                elif 'Garden Salad' in item_name:
-                    mappings.extend([
-                        (item_id, ingredients['Spinach'], 0.1),
-                        (item_id, ingredients['Onions'], 0.02),
-                        (item_id, ingredients['Green Peppers'], 0.02)
-                    ])
-        
-        execute_batch(self.cur,
-            "INSERT INTO Menu_Item_Ingredients (menu_item_id, ingredient_id, quantity_required) VALUES (%s, %s, %s)",
-            mappings
-        )
-        self.conn.commit()
+        # Recipes are keyed by (name, size), so each item is one lookup
+        mappings = self.catalog.link(menu_items, ingredients)
+        
+        self.loader.load('Menu_Item_Ingredients', ('menu_item_id', 'ingredient_id', 'quantity_required'), mappings)
+        self.commit_stage('menu_item_ingredients')
         logger.info(f"Added {len(mappings)} menu item-ingredient relationships")
     
-    def populate_orders(self, count=5000):
-        """Populate Orders table"""
-        logger.info(f"Populating {count} orders...")
-        
-        # Get store and customer IDs
-        self.cur.execute("SELECT store_id FROM Stores")
-        store_ids = [row[0] for row in self.cur.fetchall()]
-        
-        self.cur.execute("SELECT customer_id FROM Customers")
-        customer_ids = [row[0] for row in self.cur.fetchall()]
-        
-        orders = []
+    def table_has_rows(self, table):
+        """Return True when table already contains data"""
+        self.cur.execute(f"SELECT EXISTS (SELECT 1 FROM {table})")
+        return self.cur.fetchone()[0]
+    
+    def read_high_water_marks(self):
+        """Read the current high-water marks once and continue generation after them
+        
+        Id sequences are advanced past the highest existing ids, and the
+        customer and order time windows start at the latest existing
+        timestamps so appended data moves forward in time.
+        """
+        for table, column in (('stores', 'store_id'), ('customers', 'customer_id'), ('orders', 'order_id')):
+            self.cur.execute("SELECT pg_get_serial_sequence(%s, %s)", (table, column))
+            sequence = self.cur.fetchone()[0]
+            self.cur.execute(f"""
+                SELECT setval(%s, MAX({column}))
+                FROM {table}
+                HAVING MAX({column}) >= (SELECT last_value FROM {sequence})
+            """, (sequence,))
         
-        # Calculate date range for order timestamps
-        end_date = datetime.now()
-        start_date = datetime.now() - timedelta(days=365)  # 1 year ago
+        self.cur.execute("""
+            SELECT (SELECT MAX(customer_id) FROM Customers),
+                   (SELECT MAX(created_at) FROM Customers),
+                   (SELECT MAX(order_id) FROM Orders),
+                   (SELECT MAX(order_timestamp) FROM Orders)
+        """)
+        max_customer_id, max_created_at, max_order_id, max_order_timestamp = self.cur.fetchone()
+        self.conn.commit()
         
-        for _ in range(count):
-            store_id = random.choice(store_ids)
-            customer_id = random.choice(customer_ids)
-            order_time = self.fake.date_time_between(start_date=start_date, end_date=end_date)
-            
-            # Placeholder for total amount (will be updated later)
-            orders.append((customer_id, store_id, order_time, 0.0))
+        now = self.as_of
+        if max_created_at and max_created_at < now:
+            self.customer_window = (max_created_at, now)
+        if max_order_timestamp and max_order_timestamp < now:
+            self.order_window = (max_order_timestamp, now)
         
-        execute_batch(self.cur,
-            "INSERT INTO Orders (customer_id, store_id, order_timestamp, total_amount) VALUES (%s, %s, %s, %s)",
-            orders
+        logger.info(f"High-water marks: customer_id={max_customer_id}, order_id={max_order_id}, "
+                    f"last order at {max_order_timestamp}")
+    
+    def reserve_ids(self, table, column, count):
+        """Reserve a contiguous block of serial ids and return the first one"""
+        if count <= 0:
+            return None
+        self.cur.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, %s), nextval(pg_get_serial_sequence(%s, %s)) + %s - 1)",
+            (table, column, table, column, count)
         )
+        return self.cur.fetchone()[0] - count + 1
+    
+    def reserve_stage_ids(self, stage, table, column, count):
+        """Reserve a stage's id block once per run and commit the reservation
+        
+        A resumed run gets the block recorded by the interrupted one, so its
+        rows keep the ids an uninterrupted run would have given them.
+        """
+        if self.checkpoints:
+            recorded = self.checkpoints.stage(stage)
+            if recorded and recorded[0] is not None:
+                return recorded[0]
+        first_id = self.reserve_ids(table, column, count)
+        if self.checkpoints:
+            self.checkpoints.begin_stage(stage, first_id, count)
         self.conn.commit()
-        logger.info(f"Added {count} orders")
+        return first_id
     
-    def populate_order_items(self):
-        """Populate Order_Items table and update order totals"""
-        logger.info("Populating order items...")
+    def reseed(self, *parts):
+        """Reseed random and Faker from the run seed, e.g. per stage and chunk
+        
+        Each chunk's rows then depend only on the seed and the chunk's first
+        id, not on the chunks generated before it, which worker process
+        generated it or whether the run was resumed.
+        """
+        seed = derive_seed(self.seed, *parts)
+        self.random.seed(seed)
+        self.fake.seed_instance(seed)
+    
+    def pending_chunks(self, stage, first_id, count):
+        """Return the (start, size) chunks of an id range that are not committed yet"""
+        chunks = [(start, min(self.chunk_size, first_id + count - start))
+                  for start in range(first_id, first_id + count, self.chunk_size)]
+        if self.checkpoints is None:
+            return chunks
+        committed = self.checkpoints.committed_chunks(stage, first_id, first_id + count - 1)
+        if committed:
+            logger.info(f"Skipping {len(committed)} {stage} chunks committed by an earlier attempt")
+        return [chunk for chunk in chunks if chunk[0] not in committed]
+    
+    def commit_chunk(self, stage, chunk_first_id, count):
+        """Commit a chunk's rows together with its checkpoint"""
+        if self.checkpoints:
+            self.checkpoints.chunk(stage, chunk_first_id, count)
+        self.conn.commit()
+    
+    def commit_stage(self, stage):
+        """Commit a stage together with its completion checkpoint"""
+        if self.checkpoints:
+            self.checkpoints.complete_stage(stage)
+        self.conn.commit()
+    
+    def generate_order_lines(self, order_id, workload):
+        """Generate the line items of one order and return them with the order total"""
+        # Each order has 1-5 items
+        num_items = workload.pick_item_count(self.random)
+        order_total = 0
+        lines = []
+        
+        for _ in range(num_items):
+            item_id, price = workload.pick_menu_item(self.random)
+            quantity = workload.pick_quantity(self.random)
+            order_total += price * quantity
+            lines.append((order_id, item_id, quantity, price))
+        
+        return lines, order_total
+    
+    def fetch_id_source(self, table, column):
+        """Return (low, high, ids) describing the existing ids in table.column
+        
+        ids is None when the ids are contiguous and can be drawn straight from
+        their known range; otherwise they are streamed through a server-side
+        cursor into a compact array.
+        """
+        self.cur.execute(f"SELECT MIN({column}), MAX({column}), COUNT(*) FROM {table}")
+        low, high, count = self.cur.fetchone()
+        if not count:
+            raise ValueError(f"Table {table} has no rows to reference")
+        
+        if high - low + 1 == count:
+            return low, high, None
+        
+        ids = array('q')
+        with self.conn.cursor(name=f"{table}_id_source") as id_cur:
+            id_cur.itersize = self.chunk_size
+            id_cur.execute(f"SELECT {column} FROM {table} ORDER BY {column}")
+            for (row_id,) in id_cur:
+                ids.append(row_id)
+        return low, high, ids
+    
+    def order_date_range(self):
+        """Return the (start, end) range of generated order timestamps"""
+        if self.order_window:
+            return self.order_window
+        end_date = self.as_of
+        start_date = self.as_of - timedelta(days=365)  # 1 year ago
+        return start_date, end_date
+    
+    def bind_workload(self, customer_source=None):
+        """Bind the workload model to the stores, customers and menu in the database"""
+        self.cur.execute("SELECT store_id, city FROM Stores ORDER BY store_id")
+        stores = self.cur.fetchall()
         
-        # Get order and menu item IDs
-        self.cur.execute("SELECT order_id FROM Orders")
-        order_ids = [row[0] for row in self.cur.fetchall()]
+        if customer_source is None:
+            customer_source = self.fetch_id_source('Customers', 'customer_id')
         
-        self.cur.execute("SELECT item_id, price FROM Menu_Items")
+        self.cur.execute("SELECT item_id, price, name, category, size FROM Menu_Items ORDER BY item_id")
         menu_items = self.cur.fetchall()
         
-        order_items = []
-        order_totals = {}
-        
-        for order_id in order_ids:
-            # Each order has 1-5 items
-            num_items = random.randint(1, 5)
-            order_total = 0
-            
-            for _ in range(num_items):
-                item_id, price = random.choice(menu_items)
-                quantity = random.randint(1, 3)
-                item_total = price * quantity
-                order_total += item_total
-                
-                order_items.append((order_id, item_id, quantity, price))
+        start_date, end_date = self.order_date_range()
+        return self.workload.bind(stores, customer_source, menu_items, start_date, end_date)
+    
+    def generate_orders(self, count, first_order_id, workload):
+        """Yield (order row, order item rows) for count orders with final totals"""
+        for i in range(count):
+            order_id = first_order_id + i
+            store_id = workload.pick_store(self.random)
+            customer_id = workload.pick_customer(self.random)
+            order_time = workload.pick_timestamp(self.random)
             
-            order_totals[order_id] = order_total
-        
-        # Insert order items
-        execute_batch(self.cur,
-            "INSERT INTO Order_Items (order_id, item_id, quantity, unit_price) VALUES (%s, %s, %s, %s)",
-            order_items
-        )
-        
-        # Update order totals
-        for order_id, total in order_totals.items():
-            self.cur.execute(
-                "UPDATE Orders SET total_amount = %s WHERE order_id = %s",
-                (total, order_id)
-            )
-        
+            lines, order_total = self.generate_order_lines(order_id, workload)
+            yield (order_id, customer_id, store_id, order_time, order_total), lines
+    
+    def first_order_item_id(self, order_id):
+        """First order_item_id of the chunk of orders starting at order_id"""
+        first_order_id, first_item_id = self.order_item_block
+        return first_item_id + (order_id - first_order_id) * self.workload.max_items_per_order
+    
+    def generate_order_chunks(self, first_order_id, count, workload):
+        """Yield (orders, order items) ColumnBatch chunks from the selected generator"""
+        if self.generator == 'numpy':
+            # The lookup tables are built once per workload; the stream follows self.random
+            if self.numpy_generator is None or self.numpy_generator.workload is not workload:
+                self.numpy_generator = NumpyOrderGenerator(workload)
+            self.numpy_generator.reseed(self.random.getrandbits(64))
+            yield from self.numpy_generator.chunks(first_order_id, count, self.chunk_size)
+            return
+        
+        orders = self.generate_orders(count, first_order_id, workload)
+        for chunk in chunked(orders, self.chunk_size):
+            order_batch = ColumnBuilder(ORDER_COLUMNS).extend(order for order, _ in chunk)
+            item_batch = ColumnBuilder(ORDER_ITEM_COLUMNS).extend(line for _, lines in chunk for line in lines)
+            yield order_batch.build(), item_batch.build()
+    
+    def populate_orders(self, count=5000):
+        """Populate Orders and Order_Items tables with final order totals"""
+        logger.info(f"Populating {count} orders with order items...")
+        if count <= 0:
+            return
+        
+        # Order ids are reserved up front so line items can reference them
+        # and each order is written once with its final total
+        first_order_id = self.reserve_stage_ids('orders', 'orders', 'order_id', count)
+        # Item ids too: every order gets room for the most items it can have,
+        # so a chunk's item ids follow from its first order id alone
+        first_item_id = self.reserve_stage_ids('order_item_ids', 'order_items', 'order_item_id',
+                                               count * self.workload.max_items_per_order)
+        self.order_item_block = (first_order_id, first_item_id)
+        
+        if is_partitioned(self.cur):
+            # Every month of the order window gets its partitions before any shard loads
+            PartitionManager(self.conn).ensure(*self.order_date_range())
+        
+        if self.workers > 1:
+            item_count = sum(items for _, items in self.run_sharded('orders', first_order_id, count))
+        else:
+            _, item_count = self.load_order_range(first_order_id, count)
+        self.commit_stage('orders')
+        
+        logger.info(f"Added {count} orders and {item_count} order items")
+        self.log_memory('orders')
+    
+    def load_order_range(self, first_order_id, count):
+        """Generate and load orders with explicit ids plus their items (one worker shard)
+        
+        Returns (orders, order items) loaded, one commit per chunk.
+        """
+        workload = self.bind_workload()
+        partitions = PartitionManager(self.conn) if is_partitioned(self.cur) else None
+        if partitions:
+            partitions.load_bounds()
+        pending = self.pending_chunks('orders', first_order_id, count)
+        counts = [0, 0]
+        
+        def chunks():
+            for start, size in pending:
+                self.reseed('orders', start)
+                loads = []
+                next_item_id = self.first_order_item_id(start)
+                for orders, order_items in self.generate_order_chunks(start, size, workload):
+                    item_ids = array('i', range(next_item_id, next_item_id + len(order_items)))
+                    order_items = order_items.with_column('order_item_id', 'int4', item_ids)
+                    next_item_id += len(order_items)
+                    if partitions:
+                        # Co-partitioned items carry their order's timestamp
+                        first_id = int(orders.column('order_id')[0])
+                        timestamps = orders.gather('order_timestamp', order_items.column('order_id'), first_id)
+                        order_items = order_items.with_column('order_timestamp', 'timestamp', timestamps)
+                    loads += self.route_rows('Orders', orders.names, orders, partitions)
+                    loads += self.route_rows('Order_Items', order_items.names, order_items, partitions)
+                    counts[1] += len(order_items)
+                counts[0] += size
+                yield start, size, loads
+        
+        self.load_chunks('orders', chunks())
+        return counts[0], counts[1]
+    
+    def load_chunks(self, stage, chunks):
+        """Load (chunk first id, size, [(table, columns, rows)]) chunks, committing each with its checkpoint
+        
+        With async writers the chunks are generated in a producer thread and
+        written over several concurrent connections (see pipeline.py);
+        otherwise generation and writes alternate on this connection.
+        """
+        if not self.async_writers:
+            for start, size, loads in chunks:
+                for table, columns, rows in loads:
+                    self.loader.load(table, columns, rows)
+                self.commit_chunk(stage, start, size)
+            return
+        
+        # The writers open their own connections; nothing may stay locked here
         self.conn.commit()
-        logger.info(f"Added {len(order_items)} order items")
+        if self.db_config is None:
+            self.db_config = self.get_db_config()
+        pipeline = PipelinedLoader(self.db_config, self.async_writers, self.async_driver, self.queue_depth,
+                                   loader=self.loader_backend, copy_format=self.copy_format)
+        started = time.perf_counter()
+        pipeline.run(stage, chunks, self.checkpoints.run_id if self.checkpoints else None)
+        if self.instrument:
+            self.conn.io.rows += pipeline.rows
+            self.conn.io.write_seconds += pipeline.write_seconds
+            self.conn.io.wait_seconds += time.perf_counter() - started
+    
+    def route_rows(self, table, columns, rows, partitions=None):
+        """Return the (table, columns, rows) loads for rows, one per target partition
+        
+        Routing rows by order_timestamp on the client lets every COPY target a
+        single partition instead of going through tuple routing on the server.
+        """
+        if partitions is None:
+            return [(table, columns, rows)]
+        return [(partition, columns, partition_rows)
+                for partition, partition_rows in partitions.route(table.lower(), rows, columns.index('order_timestamp'))]
+    
+    def run_sharded(self, stage, first_id, count):
+        """Generate and load an id range in a process pool, one chunk-aligned shard per worker"""
+        options = {
+            'loader': self.loader_backend,
+            'copy_format': self.copy_format,
+            'chunk_size': self.chunk_size,
+            'db_config': self.db_config,
+            'generator': self.generator,
+            'workload': self.workload,
+            # Pin the time windows so every shard uses the same ones
+            'customer_window': self.customer_date_range(),
+            'order_window': self.order_date_range(),
+            'instrument': self.instrument,
+            'profile_dir': self.profile_dir,
+            # Chunks are seeded from the run seed and their first id, so the
+            # data does not depend on the number of workers
+            'seed': self.seed,
+            'as_of': self.as_of,
+            'run_id': self.checkpoints.run_id if self.checkpoints else None,
+            'async_writers': self.async_writers,
+            'async_driver': self.async_driver,
+            'queue_depth': self.queue_depth,
+            'order_item_block': self.order_item_block
+        }
+        tasks = [(stage, start, size, options)
+                 for start, size in split_range(first_id, count, self.workers, align=self.chunk_size)]
+        logger.info(f"Generating {stage} in {len(tasks)} shards across {self.workers} worker processes")
+        
+        # Spawned (not forked) workers never inherit the parent's connection
+        context = multiprocessing.get_context('spawn')
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            results = list(pool.map(run_shard, tasks))
+        
+        if self.instrument:
+            self.conn.io.wait_seconds += time.perf_counter() - started
+            for _, io in results:
+                self.conn.io.add(io)
+        return [result for result, _ in results]
+    
+    def log_memory(self, stage):
+        """Log current and peak memory use of the process after a stage"""
+        current, peak = memory_usage_mb()
+        current = f"{current:.1f} MB" if current is not None else "n/a"
+        peak = f"{peak:.1f} MB" if peak is not None else "n/a"
+        logger.info(f"Memory after {stage}: rss={current}, peak rss={peak}")
     
     def validate_data(self):
         """Validate that data was populated correctly"""
@@ -499,25 +689,119 @@ class DatabasePopulator:
         
         logger.info("Data validation completed")
     
-    def populate_all(self, clear_existing=True):
-        """Populate all tables in correct order"""
+    def stages(self, customers, orders, clear_existing=True):
+        """Return the (name, callable) population stages in foreign key order
+
+        In incremental mode the catalog tables are only filled when they are
+        still empty.
+        """
+        stages = []
+        if clear_existing or not self.table_has_rows('Stores'):
+            stages.append(('stores', lambda: self.populate_stores(5)))
+        stages.append(('customers', lambda: self.populate_customers(customers)))
+        if clear_existing or not self.table_has_rows('Ingredients'):
+            stages.append(('ingredients', self.populate_ingredients))
+        if clear_existing or not self.table_has_rows('Menu_Items'):
+            stages.append(('menu_items', self.populate_menu_items))
+        if clear_existing or not self.table_has_rows('Menu_Item_Ingredients'):
+            stages.append(('menu_item_ingredients', self.populate_menu_item_ingredients))
+        stages.append(('orders', lambda: self.populate_orders(orders)))
+        return stages
+
+    def fingerprint(self):
+        """Hash of the workload model and catalog, which shape the generated data"""
+        catalog = (self.catalog.ingredients, self.catalog.menu_items,
+                   sorted((list(key), list(recipe.items())) for key, recipe in self.catalog.recipes.items()))
+        spec = json.dumps([vars(self.workload), catalog], sort_keys=True, default=str)
+        return hashlib.sha256(spec.encode('utf-8')).hexdigest()
+    
+    def run_settings(self, clear_existing, customers, orders):
+        """Settings recorded with a run so that a resumed run replays it exactly"""
+        return {
+            'clear_existing': clear_existing,
+            'customers': customers,
+            'orders': orders,
+            'chunk_size': self.chunk_size,
+            'generator': self.generator,
+            'customer_window': [moment.isoformat() for moment in self.customer_date_range()],
+            'order_window': [moment.isoformat() for moment in self.order_date_range()],
+            'fingerprint': self.fingerprint()
+        }
+    
+    def restore_settings(self, settings):
+        """Adopt the settings of an interrupted run; returns (clear_existing, customers, orders)"""
+        if settings['fingerprint'] != self.fingerprint():
+            raise ValueError("The workload or catalog differs from the interrupted run; "
+                             "resume with the same --workload and --catalog")
+        self.chunk_size = settings['chunk_size']
+        self.generator = settings['generator']
+        if self.generator == 'numpy':
+            require_numpy()
+        self.customer_window = tuple(datetime.fromisoformat(moment) for moment in settings['customer_window'])
+        self.order_window = tuple(datetime.fromisoformat(moment) for moment in settings['order_window'])
+        return settings['clear_existing'], settings['customers'], settings['orders']
+    
+    def populate_all(self, clear_existing=True, customers=1000, orders=5000,
+                     fast_load=False, unlogged=False, index_workers=4, resume=False):
+        """Populate all tables in correct order
+        
+        Every run is recorded in the populate_* checkpoint tables. With
+        resume=True the latest unfinished run is continued with its own seed,
+        time windows, sizes and ids: completed stages and committed chunks
+        are skipped, so the result matches an uninterrupted run.
+        """
+        deferred = None
         try:
             self.connect()
+            CheckpointLog.install(self.cur)
+            self.conn.commit()
+            if resume:
+                run = CheckpointLog.unfinished(self.conn)
+                if run is None:
+                    raise ValueError("No unfinished population run to resume")
+                self.checkpoints, self.seed, self.as_of, settings = run
+                clear_existing, customers, orders = self.restore_settings(settings)
+                logger.info(f"Resuming run {self.checkpoints.run_id} with seed {self.seed} as of {self.as_of}")
+            else:
+                logger.info(f"Population seed {self.seed}, as of {self.as_of}")
+            
+            if self.instrument:
+                self.instrumentation = Instrumentation(self.open_connection, self.profile_dir)
+            
+            if fast_load:
+                # Load without secondary indexes and FK checks, rebuild them afterwards
+                deferred = FastLoadManager(self.conn, self.open_connection, TABLES,
+                                           unlogged=unlogged, index_workers=index_workers)
+                deferred.prepare()
+            
+            if not resume:
+                if clear_existing:
+                    self.clear_existing_data()
+                else:
+                    # Incremental mode: append after the existing data
+                    self.read_high_water_marks()
+                self.checkpoints = CheckpointLog.start(self.conn, self.seed, self.as_of,
+                                                       self.run_settings(clear_existing, customers, orders))
+                self.conn.commit()
             
-            if clear_existing:
-                self.clear_existing_data()
+            for name, stage in self.stages(customers, orders, clear_existing):
+                recorded = self.checkpoints.stage(name)
+                if recorded and recorded[2]:
+                    logger.info(f"Stage {name} already completed, skipping")
+                    continue
+                with self.instrumentation.stage(name, self.conn.io) if self.instrumentation else nullcontext():
+                    stage()
             
-            # Populate in correct order to respect foreign keys
-            self.populate_stores(5)
-            self.populate_customers(1000)
-            self.populate_ingredients()
-            self.populate_menu_items()
-            self.populate_menu_item_ingredients()
-            self.populate_orders(5000)
-            self.populate_order_items()
+            if deferred:
+                deferred.finish()
+                if self.instrumentation:
+                    self.instrumentation.record_phases('fast_load', deferred.timings)
+                deferred = None
             
             # Validate the data
             self.validate_data()
+            self.checkpoints.finish()
+            self.conn.commit()
             
             logger.info("Database population completed successfully!")
             
@@ -525,7 +809,14 @@ class DatabasePopulator:
             logger.error(f"Error during population: {e}")
             if self.conn:
                 self.conn.rollback()
+            if deferred:
+                try:
+                    deferred.finish()
+                except Exception as restore_error:
+                    logger.error(f"Could not restore deferred indexes and constraints: {restore_error}")
         finally:
+            if self.instrumentation:
+                self.instrumentation.close()
             self.disconnect()
 
 def main():
@@ -534,20 +825,71 @@ def main():
     
     parser = argparse.ArgumentParser(description='Populate RushMore Pizzeria database with synthetic data')
     parser.add_argument('--keep-existing', action='store_true', 
-                       help='Keep existing data (default: clear all data first)')
+                       help='Keep existing data and append new customers and orders after it (default: clear all data first)')
     parser.add_argument('--customers', type=int, default=1000,
-                       help='Number of customers to generate (default: 1000)')
+                       help='Number of customers to generate, or to append with --keep-existing (default: 1000)')
     parser.add_argument('--orders', type=int, default=5000,
-                       help='Number of orders to generate (default: 5000)')
+                       help='Number of orders to generate, or to append with --keep-existing (default: 5000)')
+    parser.add_argument('--chunk-size', type=int, default=10000,
+                       help='Rows generated and flushed per chunk (default: 10000)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Worker processes generating customers and orders in parallel (default: 1)')
+    parser.add_argument('--seed', type=int, default=None,
+                       help='Seed that makes every stage reproducible (default: random, logged)')
+    parser.add_argument('--as-of', type=datetime.fromisoformat, default=None, metavar='YYYY-MM-DD[THH:MM]',
+                       help='Anchor the generated time windows at this moment instead of now (with --seed: identical data)')
+    parser.add_argument('--resume', action='store_true',
+                       help='Continue the latest interrupted run from its last committed chunk')
+    parser.add_argument('--generator', choices=['python', 'numpy'], default='python',
+                       help='Order generator: per-row Python loops or vectorized NumPy (default: python)')
+    parser.add_argument('--workload', default=None,
+                       help='YAML workload model for order traffic (default: uniform)')
+    parser.add_argument('--catalog', default=None,
+                       help='YAML catalog of ingredients, menu items and recipes (default: config/catalog.yaml)')
+    parser.add_argument('--catalog-variants', type=int, default=1,
+                       help='Repeat every menu item as this many distinct SKUs (default: 1)')
+    parser.add_argument('--fast-load', action='store_true',
+                       help='Drop secondary indexes and FKs during the load and rebuild/validate them afterwards')
+    parser.add_argument('--unlogged', action='store_true',
+                       help='With --fast-load, load into UNLOGGED tables and make them LOGGED afterwards')
+    parser.add_argument('--index-workers', type=int, default=4,
+                       help='Parallel connections rebuilding indexes in --fast-load mode (default: 4)')
+    parser.add_argument('--loader', choices=['copy', 'batch'], default='copy',
+                       help='Load backend: COPY FROM STDIN or execute_batch INSERTs (default: copy)')
+    parser.add_argument('--async-writers', type=int, default=0,
+                       help='Write chunks over N concurrent connections while the next chunks are generated '
+                            '(default: 0, generate and write in turn)')
+    parser.add_argument('--async-driver', choices=['psycopg2', 'psycopg', 'asyncpg'], default='psycopg2',
+                       help='Driver of the async writers: psycopg2 in threads, psycopg 3 or asyncpg (default: psycopg2)')
+    parser.add_argument('--queue-depth', type=int, default=None,
+                       help='Generated chunks buffered ahead of the async writers (default: 2 per writer)')
+    parser.add_argument('--copy-format', choices=['text', 'binary'], default='text',
+                       help='COPY data format when using the copy loader (default: text)')
+    parser.add_argument('--metrics', default=None, metavar='PATH',
+                       help="Write per-stage metrics to PATH ('-' for stdout)")
+    parser.add_argument('--metrics-format', choices=['json', 'prometheus'], default='json',
+                       help='Format of --metrics output (default: json)')
+    parser.add_argument('--profile', nargs='?', const='profiles', default=None, metavar='DIR',
+                       help='Dump cProfile and tracemalloc output per stage into DIR (default: profiles)')
     
     args = parser.parse_args()
     
-    populator = DatabasePopulator()
+    workload = WorkloadModel.from_yaml(args.workload) if args.workload else None
+    catalog = Catalog.from_yaml(args.catalog or CATALOG_PATH).with_variants(args.catalog_variants)
+    populator = DatabasePopulator(loader=args.loader, copy_format=args.copy_format,
+                                  chunk_size=args.chunk_size, workers=args.workers,
+                                  seed=args.seed, generator=args.generator, workload=workload, catalog=catalog,
+                                  as_of=args.as_of, async_writers=args.async_writers,
+                                  async_driver=args.async_driver, queue_depth=args.queue_depth,
+                                  instrument=args.metrics is not None, profile_dir=args.profile)
     
-    # Note: For custom customer and order counts, you would need to modify the methods
-    # to accept parameters. Currently using defaults for simplicity.
+    populator.populate_all(clear_existing=not args.keep_existing,
+                           customers=args.customers, orders=args.orders,
+                           fast_load=args.fast_load, unlogged=args.unlogged,
+                           index_workers=args.index_workers, resume=args.resume)
     
-    populator.populate_all(clear_existing=not args.keep_existing)
+    if args.metrics and populator.instrumentation:
+        populator.instrumentation.write(args.metrics, args.metrics_format)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
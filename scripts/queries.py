@@ -0,0 +1,44 @@
+import os
+import re
+from collections import OrderedDict
+
+ANALYSIS_QUERIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sql', 'analysis_queries.sql')
+
+
+def query_name(title):
+    """Turn a comment title such as '1. Total sales revenue per store' into a name"""
+    title = re.sub(r'^\d+\.\s*', '', title.strip())
+    return re.sub(r'[^a-z0-9]+', '_', title.lower()).strip('_')
+
+
+def load_analysis_queries(path=ANALYSIS_QUERIES_PATH):
+    """Parse an SQL file into an ordered {name: sql} mapping
+
+    Each statement is named after the last '--' comment line before it;
+    section comments ending in ':' (e.g. '-- Additional useful queries:')
+    are ignored.
+    """
+    with open(path) as f:
+        lines = f.read().splitlines()
+
+    queries = OrderedDict()
+    title = None
+    statement = []
+    for line in lines:
+        stripped = line.strip()
+        if not statement and stripped.startswith('--'):
+            comment = stripped.lstrip('-').strip()
+            if comment and not comment.endswith(':'):
+                title = comment
+            continue
+        if not stripped and not statement:
+            continue
+
+        statement.append(line)
+        if stripped.endswith(';'):
+            name = query_name(title) if title else f"query_{len(queries) + 1}"
+            queries[name] = '\n'.join(statement).strip().rstrip(';')
+            title = None
+            statement = []
+
+    return queries
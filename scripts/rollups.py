@@ -0,0 +1,321 @@
+import os
+import sys
+import json
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import psycopg2
+import psycopg2.extensions
+from db import connection_kwargs, get_db_config
+from queries import load_analysis_queries
+
+logger = logging.getLogger(__name__)
+
+ROLLUPS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sql', 'rollups.sql')
+
+ROLLUP_TABLES = ['rollup_store_hourly', 'rollup_item_daily', 'rollup_customer_totals']
+
+# The reports of sql/analysis_queries.sql answered from the rollup tables,
+# keyed by the same names; each returns the same columns as the raw query
+REPORT_QUERIES = OrderedDict([
+    ('total_sales_revenue_per_store', """
+        SELECT
+            s.store_id,
+            s.city,
+            SUM(r.order_count)::bigint as total_orders,
+            SUM(r.revenue) as total_revenue,
+            ROUND(SUM(r.revenue) / SUM(r.order_count), 2) as avg_order_value
+        FROM Stores s
+        JOIN rollup_store_hourly r ON s.store_id = r.store_id
+        GROUP BY s.store_id, s.city
+        ORDER BY total_revenue DESC
+    """),
+    ('top_10_most_valuable_customers', """
+        SELECT
+            c.customer_id,
+            c.first_name,
+            c.last_name,
+            c.email,
+            r.order_count as total_orders,
+            r.revenue as total_spent,
+            ROUND(r.revenue / r.order_count, 2) as avg_order_value
+        FROM rollup_customer_totals r
+        JOIN Customers c ON c.customer_id = r.customer_id
+        ORDER BY r.revenue DESC
+        LIMIT 10
+    """),
+    ('most_popular_menu_items_by_quantity_sold', """
+        SELECT
+            mi.name,
+            mi.category,
+            mi.size,
+            SUM(r.quantity)::bigint as total_quantity_sold,
+            SUM(r.revenue) as total_revenue
+        FROM Menu_Items mi
+        JOIN rollup_item_daily r ON mi.item_id = r.item_id
+        GROUP BY mi.item_id, mi.name, mi.category, mi.size
+        ORDER BY total_quantity_sold DESC
+        LIMIT 15
+    """),
+    ('average_order_value', """
+        SELECT
+            ROUND(SUM(revenue) / SUM(order_count), 2) as overall_avg_order_value,
+            MIN(min_amount) as min_order_value,
+            MAX(max_amount) as max_order_value
+        FROM rollup_store_hourly
+    """),
+    ('busiest_hours_of_the_day_for_orders', """
+        SELECT
+            EXTRACT(HOUR FROM hour_start) as hour_of_day,
+            SUM(order_count)::bigint as order_count,
+            ROUND(SUM(order_count)::bigint * 100.0 / (SELECT SUM(order_count)::bigint FROM rollup_store_hourly), 2) as percentage
+        FROM rollup_store_hourly
+        GROUP BY hour_of_day
+        ORDER BY order_count DESC
+    """),
+    ('monthly_revenue_trend', """
+        SELECT
+            DATE_TRUNC('month', hour_start) as month,
+            SUM(order_count)::bigint as order_count,
+            SUM(revenue) as monthly_revenue
+        FROM rollup_store_hourly
+        GROUP BY month
+        ORDER BY month
+    """),
+    ('customer_retention_analysis', """
+        SELECT
+            COUNT(*) as total_customers,
+            COUNT(*) FILTER (WHERE r.order_count > 1) as returning_customers,
+            ROUND(COUNT(*) FILTER (WHERE r.order_count > 1) * 100.0 / NULLIF(COUNT(*), 0), 2) as retention_rate
+        FROM rollup_customer_totals r
+        JOIN Customers c ON c.customer_id = r.customer_id
+    """),
+])
+
+# Column ordered by in the LIMIT reports; rows tied at the cut-off may differ
+LIMIT_ORDER_COLUMNS = {
+    'top_10_most_valuable_customers': 5,
+    'most_popular_menu_items_by_quantity_sold': 3,
+}
+
+
+def reset_rollups(cur):
+    """Empty the rollups (if installed) after the order data was cleared"""
+    cur.execute("SELECT to_regclass('rollup_watermark') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return
+    cur.execute(f"TRUNCATE TABLE {', '.join(ROLLUP_TABLES)}")
+    cur.execute("UPDATE rollup_watermark SET watermark = NULL, refreshed_at = NULL")
+
+
+def same_report(name, raw_rows, rollup_rows):
+    """Compare report rows, ignoring the order of ties and ties at a LIMIT cut-off"""
+    if sorted(map(repr, raw_rows)) == sorted(map(repr, rollup_rows)):
+        return True
+    key = LIMIT_ORDER_COLUMNS.get(name)
+    if key is None or len(raw_rows) != len(rollup_rows):
+        return False
+    # Same ordered values, and the same rows above the last (tied) value
+    if [row[key] for row in raw_rows] != [row[key] for row in rollup_rows]:
+        return False
+    cutoff = raw_rows[-1][key]
+    return (sorted(repr(row) for row in raw_rows if row[key] != cutoff)
+            == sorted(repr(row) for row in rollup_rows if row[key] != cutoff))
+
+
+class RollupManager:
+    """Maintain the rollup tables and answer the analysis reports from them
+
+    refresh() re-aggregates everything from a trailing lookback window before
+    the watermark onwards, so orders that arrive late (with a timestamp up
+    to the lookback behind the newest order) are still picked up. Hourly
+    and daily buckets in the window are rebuilt, and customer totals are
+    recomputed for every customer with an order in the window. Orders that
+    are changed further back in time need refresh(full=True).
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def install(self):
+        """Create the rollup tables, view and indexes"""
+        with open(ROLLUPS_PATH) as f:
+            ddl = f.read()
+        with self.conn.cursor() as cur:
+            cur.execute(ddl)
+        self.conn.commit()
+        logger.info("Rollup tables installed")
+
+    def refresh(self, full=False, lookback=timedelta(days=1)):
+        """Bring the rollups up to date and return (cutoff, new watermark)"""
+        started = time.perf_counter()
+        # One snapshot for every statement, so the buckets, customer totals
+        # and the new watermark all describe the same set of orders
+        self.conn.commit()
+        isolation_level = self.conn.isolation_level
+        self.conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ)
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("SELECT watermark FROM rollup_watermark WHERE name = 'orders' FOR UPDATE")
+                row = cur.fetchone()
+                if row is None:
+                    raise RuntimeError("Rollups are not installed; run 'rollups.py install' first")
+                watermark = row[0]
+
+                if full or watermark is None:
+                    cutoff = None
+                    cur.execute(f"TRUNCATE TABLE {', '.join(ROLLUP_TABLES)}")
+                else:
+                    # Rebuild whole days, which covers both hourly and daily buckets
+                    cutoff = (watermark - lookback).replace(hour=0, minute=0, second=0, microsecond=0)
+                    cur.execute("DELETE FROM rollup_store_hourly WHERE hour_start >= %s", (cutoff,))
+                    cur.execute("DELETE FROM rollup_item_daily WHERE day >= %s", (cutoff.date(),))
+                window_start = cutoff or datetime.min
+
+                cur.execute("""
+                    INSERT INTO rollup_store_hourly (store_id, hour_start, order_count, revenue, min_amount, max_amount)
+                    SELECT COALESCE(store_id, 0), DATE_TRUNC('hour', order_timestamp),
+                           COUNT(*), SUM(total_amount), MIN(total_amount), MAX(total_amount)
+                    FROM Orders
+                    WHERE order_timestamp >= %s
+                    GROUP BY 1, 2
+                """, (window_start,))
+                store_buckets = cur.rowcount
+
+                cur.execute("""
+                    INSERT INTO rollup_item_daily (item_id, day, quantity, revenue)
+                    SELECT oi.item_id, o.order_timestamp::date,
+                           SUM(oi.quantity), SUM(oi.quantity * oi.unit_price)
+                    FROM Orders o
+                    JOIN Order_Items oi ON oi.order_id = o.order_id
+                    WHERE o.order_timestamp >= %s AND oi.item_id IS NOT NULL
+                    GROUP BY 1, 2
+                """, (window_start,))
+                item_buckets = cur.rowcount
+
+                if cutoff is None:
+                    cur.execute("""
+                        INSERT INTO rollup_customer_totals (customer_id, order_count, revenue, first_order_at, last_order_at)
+                        SELECT customer_id, COUNT(*), SUM(total_amount), MIN(order_timestamp), MAX(order_timestamp)
+                        FROM Orders
+                        WHERE customer_id IS NOT NULL
+                        GROUP BY customer_id
+                    """)
+                else:
+                    cur.execute("""
+                        INSERT INTO rollup_customer_totals (customer_id, order_count, revenue, first_order_at, last_order_at)
+                        SELECT customer_id, COUNT(*), SUM(total_amount), MIN(order_timestamp), MAX(order_timestamp)
+                        FROM Orders
+                        WHERE customer_id IN (
+                            SELECT customer_id FROM Orders WHERE order_timestamp >= %s
+                        )
+                        GROUP BY customer_id
+                        ON CONFLICT (customer_id) DO UPDATE SET
+                            order_count = EXCLUDED.order_count,
+                            revenue = EXCLUDED.revenue,
+                            first_order_at = EXCLUDED.first_order_at,
+                            last_order_at = EXCLUDED.last_order_at
+                    """, (cutoff,))
+                customers = cur.rowcount
+
+                cur.execute("SELECT MAX(order_timestamp) FROM Orders")
+                new_watermark = cur.fetchone()[0]
+                cur.execute("""
+                    UPDATE rollup_watermark SET watermark = %s, refreshed_at = CURRENT_TIMESTAMP
+                    WHERE name = 'orders'
+                """, (new_watermark,))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            self.conn.set_isolation_level(isolation_level)
+
+        logger.info(f"Refreshed rollups from {cutoff or 'the beginning'} to {new_watermark}: "
+                    f"{store_buckets} store hours, {item_buckets} item days, {customers} customers "
+                    f"({time.perf_counter() - started:.2f}s)")
+        return cutoff, new_watermark
+
+    def report(self, name):
+        """Return (column names, rows) of a report answered from the rollups"""
+        if name not in REPORT_QUERIES:
+            raise ValueError(f"Unknown report: {name} (choose from {', '.join(REPORT_QUERIES)})")
+        with self.conn.cursor() as cur:
+            cur.execute(REPORT_QUERIES[name])
+            columns = [column.name for column in cur.description]
+            rows = cur.fetchall()
+        self.conn.commit()
+        return columns, rows
+
+    def verify(self):
+        """Run every report on the rollups and the raw tables; return the names that differ"""
+        raw_queries = load_analysis_queries()
+        mismatches = []
+        with self.conn.cursor() as cur:
+            for name in REPORT_QUERIES:
+                started = time.perf_counter()
+                cur.execute(raw_queries[name])
+                raw_rows = cur.fetchall()
+                raw_ms = (time.perf_counter() - started) * 1000
+                _, rollup_rows = self.report(name)
+                rollup_ms = (time.perf_counter() - started) * 1000 - raw_ms
+                matches = same_report(name, raw_rows, rollup_rows)
+                if not matches:
+                    mismatches.append(name)
+                logger.info(f"{name}: {'identical' if matches else 'DIFFERENT'} "
+                            f"(raw {raw_ms:.1f} ms, rollup {rollup_ms:.1f} ms)")
+        self.conn.commit()
+        return mismatches
+
+
+def main():
+    """Install, refresh and query the rollup layer from the command line"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Maintain and query the RushMore Pizzeria rollup tables')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('install', help='Create the rollup tables (idempotent)')
+    refresh = subparsers.add_parser('refresh', help='Aggregate new orders since the watermark')
+    refresh.add_argument('--full', action='store_true',
+                         help='Rebuild the rollups from all orders')
+    refresh.add_argument('--lookback-hours', type=float, default=24,
+                         help='Re-aggregate this far before the watermark to catch late orders (default: 24)')
+    report = subparsers.add_parser('report', help='Answer an analysis report from the rollups')
+    report.add_argument('name', choices=list(REPORT_QUERIES) + ['all'])
+    report.add_argument('--json', action='store_true', help='Print rows as JSON')
+    subparsers.add_parser('verify', help='Check every report against the raw analysis queries')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    conn = psycopg2.connect(**connection_kwargs(get_db_config()))
+    try:
+        manager = RollupManager(conn)
+        if args.command == 'install':
+            manager.install()
+        elif args.command == 'refresh':
+            manager.refresh(full=args.full, lookback=timedelta(hours=args.lookback_hours))
+        elif args.command == 'report':
+            names = list(REPORT_QUERIES) if args.name == 'all' else [args.name]
+            for name in names:
+                columns, rows = manager.report(name)
+                if args.json:
+                    print(json.dumps({name: [dict(zip(columns, row)) for row in rows]}, default=str))
+                else:
+                    print(f"-- {name}")
+                    print('\t'.join(columns))
+                    for row in rows:
+                        print('\t'.join(str(value) for value in row))
+        elif args.command == 'verify':
+            mismatches = manager.verify()
+            if mismatches:
+                logger.error(f"Reports differing from the raw queries: {', '.join(mismatches)}")
+                sys.exit(1)
+            logger.info("All rollup reports match the raw queries")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+import os
+import gzip
+import json
+import mmap
+import time
+import queue
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import psycopg2
+from db import connection_kwargs, get_db_config
+from fast_load import FastLoadManager
+from rollups import reset_rollups
+from inventory import reset_inventory
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+MANIFEST_NAME = 'manifest.json'
+
+# Snapshot tables, parents before children, with the key their files are split by.
+# Order items are split by order id so their files line up with the orders files.
+SNAPSHOT_TABLES = [
+    ('stores', 'store_id'),
+    ('customers', 'customer_id'),
+    ('ingredients', 'ingredient_id'),
+    ('menu_items', 'item_id'),
+    ('menu_item_ingredients', 'menu_item_id'),
+    ('orders', 'order_id'),
+    ('order_items', 'order_id'),
+]
+
+READ_SIZE = 1024 * 1024
+
+
+class _HashingWriter:
+    """Write-through file wrapper that hashes and counts the bytes written"""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+
+def table_columns(cur, table):
+    """Return [(column, type)] of table in column order, types as format_type() spells them"""
+    cur.execute("""
+        SELECT attname, format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum
+    """, (table,))
+    return [list(row) for row in cur.fetchall()]
+
+
+def reset_sequences(cur, table):
+    """Move the serial sequences of table past the largest id it holds"""
+    for column, _ in table_columns(cur, table):
+        cur.execute("SELECT pg_get_serial_sequence(%s, %s)", (table, column))
+        sequence = cur.fetchone()[0]
+        if sequence:
+            cur.execute(f"SELECT setval(%s, COALESCE(MAX({column}), 1), MAX({column}) IS NOT NULL) FROM {table}",
+                        (sequence,))
+
+
+def _key_ranges(first, last, keys_per_file):
+    """Split [first, last] into consecutive (first, last) ranges of at most keys_per_file keys"""
+    if first is None:
+        return [(None, None)]
+    return [(start, min(start + keys_per_file - 1, last)) for start in range(first, last + 1, keys_per_file)]
+
+
+def _parallel(tasks, workers, open_connection, work):
+    """Run work(conn, task) for every task over up to `workers` connections
+
+    Every thread keeps one connection and pulls tasks from a shared queue,
+    so large and small files balance out. Returns the results in task order
+    and re-raises the first failure once all threads stopped.
+    """
+    pending = queue.SimpleQueue()
+    for index, task in enumerate(tasks):
+        pending.put((index, task))
+    results = [None] * len(tasks)
+    failed = threading.Event()
+
+    def drain():
+        conn = open_connection()
+        try:
+            while not failed.is_set():
+                try:
+                    index, task = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    results[index] = work(conn, task)
+                except Exception:
+                    failed.set()
+                    raise
+        finally:
+            conn.close()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tasks)))) as pool:
+        futures = [pool.submit(drain) for _ in range(max(1, min(workers, len(tasks))))]
+    for future in futures:
+        future.result()
+    return results
+
+
+class Snapshot:
+    """A populated dataset saved as gzip-compressed COPY binary files plus a manifest
+
+    Every table is written as one or more files covering consecutive key
+    ranges. manifest.json lists the columns and types of each table and the
+    key range, row count, size and SHA-256 checksum of each file, so a
+    snapshot can be checked before anything is loaded. Exports read all
+    files from one exported transaction snapshot, so parallel workers see a
+    consistent dataset; imports verify and stream each file from a
+    memory-mapped read over their own connection.
+    """
+
+    def __init__(self, directory, manifest=None):
+        self.directory = directory
+        self._manifest = manifest
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            with open(os.path.join(self.directory, MANIFEST_NAME)) as f:
+                self._manifest = json.load(f)
+            if self._manifest.get('format') != SNAPSHOT_FORMAT:
+                raise ValueError(f"Snapshot {self.directory} has format {self._manifest.get('format')}, "
+                                 f"expected {SNAPSHOT_FORMAT}")
+        return self._manifest
+
+    def tables(self):
+        return [table['name'] for table in self.manifest['tables']]
+
+    @classmethod
+    def export(cls, db_config, directory, keys_per_file=1000000, workers=4, compress_level=6):
+        """Write the populated tables of the database into a new snapshot directory"""
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+            raise ValueError(f"{directory} already holds a snapshot")
+        started = time.perf_counter()
+
+        def open_connection():
+            return psycopg2.connect(**connection_kwargs(db_config))
+
+        conn = open_connection()
+        try:
+            # Hold a repeatable read transaction open and share its snapshot with the workers
+            conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_export_snapshot(), current_setting('server_version_num')::int")
+                snapshot_id, server_version = cur.fetchone()
+                tables = []
+                tasks = []
+                for table, key in SNAPSHOT_TABLES:
+                    cur.execute(f"SELECT MIN({key}), MAX({key}), COUNT(*) FROM {table}")
+                    first, last, rows = cur.fetchone()
+                    columns = table_columns(cur, table)
+                    tables.append({'name': table, 'key': key, 'columns': columns, 'rows': rows, 'files': []})
+                    for index, (low, high) in enumerate(_key_ranges(first, last, keys_per_file)):
+                        path = f"{table}.{index:05d}.pgcopy.gz"
+                        # Rows whose key is NULL (e.g. an item without an order) go in the first file
+                        tasks.append((table, key, [name for name, _ in columns], low, high, index == 0, path))
+                source = cls._populate_run(cur)
+
+            def export_file(worker_conn, task):
+                if worker_conn.status == psycopg2.extensions.STATUS_READY:
+                    worker_conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+                    with worker_conn.cursor() as worker_cur:
+                        worker_cur.execute("SET TRANSACTION SNAPSHOT %s", (snapshot_id,))
+                return cls._export_file(worker_conn, directory, task, compress_level)
+
+            files = _parallel(tasks, workers, open_connection, export_file)
+        finally:
+            conn.close()
+
+        by_table = {table['name']: table for table in tables}
+        for (table, *_), entry in zip(tasks, files):
+            by_table[table]['files'].append(entry)
+        for table in tables:
+            exported = sum(entry['rows'] for entry in table['files'])
+            if exported != table['rows']:
+                raise RuntimeError(f"Exported {exported} rows of {table['name']}, expected {table['rows']}")
+
+        manifest = {
+            'format': SNAPSHOT_FORMAT,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'server_version_num': server_version,
+            'database': db_config['database'],
+            'populate_run': source,
+            'tables': tables,
+        }
+        with open(os.path.join(directory, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        total_bytes = sum(entry['bytes'] for table in tables for entry in table['files'])
+        logger.info(f"Exported {sum(table['rows'] for table in tables)} rows in {len(tasks)} files "
+                    f"({total_bytes / 2**20:.1f} MiB) to {directory} in {time.perf_counter() - started:.2f}s")
+        return cls(directory, manifest)
+
+    @staticmethod
+    def _populate_run(cur):
+        """Seed, as-of and settings of the latest finished population run, if recorded"""
+        cur.execute("SELECT to_regclass('populate_runs') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return None
+        cur.execute("""
+            SELECT run_id, seed, as_of, settings FROM populate_runs
+            WHERE finished_at IS NOT NULL
+            ORDER BY run_id DESC
+            LIMIT 1
+        """)
+        row = cur.fetchone()
+        if row is None:
+            return None
+        run_id, seed, as_of, settings = row
+        return {'run_id': run_id, 'seed': seed, 'as_of': as_of.isoformat(), 'settings': settings}
+
+    @staticmethod
+    def _export_file(conn, directory, task, compress_level):
+        table, key, columns, low, high, with_nulls, path = task
+        where = ''
+        if low is not None:
+            where = f" WHERE {key} BETWEEN {int(low)} AND {int(high)}"
+            if with_nulls:
+                where += f" OR {key} IS NULL"
+        query = f"SELECT {', '.join(columns)} FROM {table}{where}"
+        with open(os.path.join(directory, path), 'wb') as f:
+            out = _HashingWriter(f)
+            with gzip.GzipFile(filename='', mode='wb', fileobj=out, compresslevel=compress_level, mtime=0) as data:
+                with conn.cursor() as cur:
+                    cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT BINARY)", data, size=READ_SIZE)
+                    rows = cur.rowcount
+        logger.info(f"Exported {rows} rows of {table} to {path}")
+        return {'path': path, 'first_key': low, 'last_key': high, 'rows': rows,
+                'bytes': out.size, 'sha256': out.sha256.hexdigest()}
+
+    def verify(self, workers=4):
+        """Check the size and checksum of every file; raises ValueError on the first mismatch"""
+        entries = [entry for table in self.manifest['tables'] for entry in table['files']]
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for data in pool.map(self._check, entries):
+                data.close()
+        logger.info(f"Verified {len(entries)} snapshot files in {self.directory}")
+
+    def _check(self, entry):
+        """Check one file and return it memory-mapped; the caller closes the map"""
+        path = os.path.join(self.directory, entry['path'])
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size != entry['bytes']:
+                raise ValueError(f"Snapshot file {entry['path']} has {size} bytes, expected {entry['bytes']}")
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hashlib.sha256(data).hexdigest() != entry['sha256']:
+            data.close()
+            raise ValueError(f"Snapshot file {entry['path']} does not match its checksum")
+        return data
+
+    def load(self, db_config, workers=4, fast_load=False, unlogged=False, index_workers=4):
+        """Replace the data of the snapshot tables with the snapshot
+
+        Files are loaded in parallel, one connection per worker and one
+        transaction per file. Without fast_load the tables are loaded in
+        turn, parents first, so foreign keys hold throughout; with fast_load
+        the secondary indexes and foreign keys are dropped and every file of
+        every table loads at once, then FastLoadManager rebuilds and
+        validates them.
+        """
+        manifest = self.manifest
+        started = time.perf_counter()
+
+        def open_connection():
+            return psycopg2.connect(**connection_kwargs(db_config))
+
+        conn = open_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT current_setting('server_version_num')::int")
+                if cur.fetchone()[0] // 10000 != manifest['server_version_num'] // 10000:
+                    logger.warning(f"Snapshot was exported from server version {manifest['server_version_num']}")
+                for table in manifest['tables']:
+                    columns = table_columns(cur, table['name'])
+                    if columns != table['columns']:
+                        raise ValueError(f"Columns of {table['name']} do not match the snapshot: "
+                                         f"{columns} != {table['columns']}")
+
+                tables = self.tables()
+                for table in reversed(tables):
+                    cur.execute(f"TRUNCATE TABLE {table} RESTART IDENTITY CASCADE")
+                reset_rollups(cur)
+                reset_inventory(cur)
+                conn.commit()
+
+            deferred = None
+            if fast_load:
+                deferred = FastLoadManager(conn, open_connection, tables, unlogged=unlogged,
+                                           index_workers=index_workers)
+                deferred.prepare()
+
+            def import_file(worker_conn, task):
+                return self._import_file(worker_conn, *task)
+
+            tasks = [(table['name'], table['columns'], entry) for table in manifest['tables']
+                     for entry in table['files']]
+            if fast_load:
+                _parallel(tasks, workers, open_connection, import_file)
+            else:
+                for table in tables:
+                    _parallel([task for task in tasks if task[0] == table], workers, open_connection, import_file)
+
+            if deferred:
+                deferred.finish()
+            with conn.cursor() as cur:
+                for table in tables:
+                    reset_sequences(cur, table)
+                    if not fast_load:
+                        cur.execute(f"ANALYZE {table}")
+            conn.commit()
+        finally:
+            conn.close()
+
+        rows = sum(table['rows'] for table in manifest['tables'])
+        logger.info(f"Imported {rows} rows from {self.directory} in {time.perf_counter() - started:.2f}s")
+        return rows
+
+    def _import_file(self, conn, table, columns, entry):
+        data = self._check(entry)
+        try:
+            with gzip.GzipFile(fileobj=data, mode='rb') as stream, conn.cursor() as cur:
+                cur.copy_expert(f"COPY {table} ({', '.join(name for name, _ in columns)}) "
+                                f"FROM STDIN WITH (FORMAT BINARY)", stream, size=READ_SIZE)
+                if cur.rowcount != entry['rows']:
+                    raise ValueError(f"Snapshot file {entry['path']} loaded {cur.rowcount} rows, "
+                                     f"expected {entry['rows']}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            data.close()
+        logger.info(f"Imported {entry['rows']} rows of {table} from {entry['path']}")
+        return entry['rows']
+
+
+def main():
+    """Export the populated tables to a snapshot, verify one or load one into the database"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='RushMore Pizzeria dataset snapshots')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    export = subparsers.add_parser('export', help='Write the populated tables to a snapshot directory')
+    export.add_argument('directory')
+    export.add_argument('--keys-per-file', type=int, default=1000000,
+                        help='Key range of each file; order items follow their orders (default: 1000000)')
+    export.add_argument('--compress-level', type=int, default=6, choices=range(1, 10), metavar='1-9',
+                        help='gzip compression level (default: 6)')
+    verify = subparsers.add_parser('verify', help='Check the sizes and checksums of a snapshot')
+    verify.add_argument('directory')
+    load = subparsers.add_parser('import', help='Replace the data of the snapshot tables with a snapshot')
+    load.add_argument('directory')
+    load.add_argument('--fast-load', action='store_true',
+                      help='Drop secondary indexes and FKs, load all tables at once and rebuild them afterwards')
+    load.add_argument('--unlogged', action='store_true',
+                      help='With --fast-load, load into UNLOGGED tables and make them LOGGED afterwards')
+    load.add_argument('--index-workers', type=int, default=4,
+                      help='Parallel connections rebuilding indexes in --fast-load mode (default: 4)')
+    for command in (export, verify, load):
+        command.add_argument('--workers', type=int, default=4,
+                             help='Files processed in parallel, one connection each (default: 4)')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == 'export':
+        db_config = get_db_config()
+        Snapshot.export(db_config, args.directory, keys_per_file=args.keys_per_file,
+                        workers=args.workers, compress_level=args.compress_level)
+    elif args.command == 'verify':
+        Snapshot(args.directory).verify(workers=args.workers)
+    elif args.command == 'import':
+        Snapshot(args.directory).load(get_db_config(), workers=args.workers, fast_load=args.fast_load,
+                                      unlogged=args.unlogged, index_workers=args.index_workers)
+
+
+if __name__ == "__main__":
+    main()
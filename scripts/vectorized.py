@@ -0,0 +1,71 @@
+from columnar import ORDER_COLUMNS, ORDER_ITEM_COLUMNS, ColumnBatch, to_cents
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; only needed for --generator numpy
+    np = None
+
+
+def require_numpy():
+    """Raise a helpful error when the NumPy generator is requested without NumPy"""
+    if np is None:
+        raise RuntimeError("The numpy generator requires NumPy (pip install numpy)")
+
+
+class NumpyOrderGenerator:
+    """Generate orders and their order items a whole chunk at a time with NumPy
+
+    Store ids, customer ids, timestamps, item counts, menu picks and quantities
+    are drawn as arrays from a bound workload model (see workload.py), using the
+    same distributions as the per-row Python generator. The arrays go straight
+    into columnar batches (see columnar.py): line and order totals stay in
+    integer cents, so they are exact, and no per-row Python objects are built.
+    """
+
+    def __init__(self, workload, seed=None):
+        require_numpy()
+        self.workload = workload
+        self.rng = np.random.default_rng(seed)
+
+        self.item_ids = np.array(workload.item_ids, dtype=np.int32)
+        self.price_cents = np.array([to_cents(price) for price in workload.prices], dtype=np.int64)
+
+    def reseed(self, seed):
+        """Restart the random stream, e.g. per chunk"""
+        self.rng = np.random.default_rng(seed)
+
+    def generate_chunk(self, first_order_id, n):
+        """Return (orders, order items) ColumnBatches for n orders starting at first_order_id"""
+        workload = self.workload
+        order_ids = np.arange(first_order_id, first_order_id + n, dtype=np.int32)
+        store_ids = workload.draw_stores(self.rng, n)
+        customer_ids = workload.draw_customers(self.rng, n)
+        seconds = workload.draw_epoch_seconds(self.rng, n)
+
+        # Each order has 1-5 items with quantities of 1-3
+        item_counts = workload.draw_item_counts(self.rng, n)
+        line_count = int(item_counts.sum())
+        picks = workload.draw_menu_indices(self.rng, line_count)
+        quantities = workload.draw_quantities(self.rng, line_count)
+
+        # Segment-sum line totals into order totals
+        line_cents = self.price_cents[picks] * quantities
+        starts = np.zeros(n, dtype=np.int64)
+        np.cumsum(item_counts[:-1], out=starts[1:])
+        total_cents = np.add.reduceat(line_cents, starts)
+
+        orders = ColumnBatch(ORDER_COLUMNS, [
+            order_ids, customer_ids.astype(np.int32), store_ids.astype(np.int32),
+            seconds * 1000000, total_cents
+        ])
+        order_items = ColumnBatch(ORDER_ITEM_COLUMNS, [
+            np.repeat(order_ids, item_counts), self.item_ids[picks],
+            quantities.astype(np.int32), self.price_cents[picks]
+        ])
+        return orders, order_items
+
+    def chunks(self, first_order_id, count, chunk_size):
+        """Yield (order rows, order item rows) chunks covering count orders"""
+        end = first_order_id + count
+        for start in range(first_order_id, end, chunk_size):
+            yield self.generate_chunk(start, min(chunk_size, end - start))
@@ -0,0 +1,254 @@
+import math
+from bisect import bisect_right
+from calendar import timegm
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+import yaml
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; only needed for --generator numpy
+    np = None
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _weights(values, length, name):
+    """Validate a list of non-negative relative weights (None means uniform)"""
+    if values is None:
+        return [1.0] * length
+    if len(values) != length:
+        raise ValueError(f"Workload '{name}' needs {length} weights, got {len(values)}")
+    values = [float(v) for v in values]
+    if any(v < 0 for v in values) or not any(values):
+        raise ValueError(f"Workload '{name}' weights must be non-negative and not all zero")
+    return values
+
+
+def _cdf(weights):
+    """Cumulative distribution table normalised to end at 1.0"""
+    total = float(sum(weights))
+    if total <= 0:
+        raise ValueError("Cannot sample from weights that sum to zero")
+    cdf = [w / total for w in accumulate(weights)]
+    cdf[-1] = 1.0
+    return cdf
+
+
+def _coprime_stride(n):
+    """Stride co-prime with n, used to spread Zipf ranks over the id range"""
+    if n <= 2:
+        return 1
+    stride = int(n * 0.6180339887) | 1
+    while math.gcd(stride, n) != 1:
+        stride += 2
+    return stride
+
+
+class WorkloadModel:
+    """Traffic model for generated orders, loaded from a YAML config
+
+    Every knob defaults to uniform, which reproduces the original generator:
+    stores, customers and menu items drawn uniformly, timestamps uniform over
+    the window, 1-5 items per order and quantities of 1-3.
+    """
+
+    def __init__(self, hourly=None, weekend_hourly=None, weekday=None, monthly=None,
+                 store_weights=None, zipf_exponent=0.0, category_weights=None,
+                 item_weights=None, size_weights=None, items_per_order=None, quantity=None):
+        self.hourly = _weights(hourly, 24, 'hourly')
+        self.weekend_hourly = _weights(weekend_hourly, 24, 'weekend_hourly') if weekend_hourly else self.hourly
+        self.weekday = _weights(weekday, 7, 'weekday')
+        self.monthly = _weights(monthly, 12, 'monthly')
+        self.store_weights = dict(store_weights or {})
+        self.zipf_exponent = float(zipf_exponent or 0.0)
+        if self.zipf_exponent < 0:
+            raise ValueError("Workload 'zipf_exponent' must be non-negative")
+        self.category_weights = dict(category_weights or {})
+        self.item_weights = dict(item_weights or {})
+        self.size_weights = dict(size_weights or {})
+        self.items_per_order = _weights(items_per_order, 5, 'items_per_order')
+        self.quantity = _weights(quantity, 3, 'quantity')
+
+    @property
+    def max_items_per_order(self):
+        """Most line items a generated order can have"""
+        return len(self.items_per_order)
+
+    @classmethod
+    def from_yaml(cls, path):
+        """Load a workload model from a YAML file"""
+        with open(path) as f:
+            config = yaml.safe_load(f) or {}
+        stores = config.get('stores') or {}
+        customers = config.get('customers') or {}
+        menu = config.get('menu') or {}
+        return cls(
+            hourly=config.get('hourly'),
+            weekend_hourly=config.get('weekend_hourly'),
+            weekday=config.get('weekday'),
+            monthly=config.get('monthly'),
+            store_weights=stores.get('weights'),
+            zipf_exponent=customers.get('zipf_exponent', 0.0),
+            category_weights=menu.get('category_weights'),
+            item_weights=menu.get('item_weights'),
+            size_weights=menu.get('size_weights'),
+            items_per_order=config.get('items_per_order'),
+            quantity=config.get('quantity')
+        )
+
+    def bind(self, stores, customer_source, menu_items, start_date, end_date):
+        """Precompute sampling tables for concrete stores, customers, menu and window
+
+        stores are (store_id, city) rows, customer_source is a (low, high, ids)
+        id source and menu_items are (item_id, price, name, category, size) rows.
+        """
+        return BoundWorkload(self, stores, customer_source, menu_items, start_date, end_date)
+
+
+class BoundWorkload:
+    """Sampling tables of a WorkloadModel bound to the rows of one database
+
+    Draws use inverse transform sampling over precomputed CDFs, either one at
+    a time from a random.Random (pick_*) or in batches from a NumPy Generator
+    (draw_*).
+    """
+
+    def __init__(self, model, stores, customer_source, menu_items, start_date, end_date):
+        if not stores:
+            raise ValueError("Workload needs at least one store")
+        if not menu_items:
+            raise ValueError("Workload needs at least one menu item")
+
+        # Stores weighted by city
+        self.store_ids = [store_id for store_id, _ in stores]
+        self.store_cdf = _cdf([float(model.store_weights.get(city, 1.0)) for _, city in stores])
+
+        # Customers: Zipf ranks spread over the id range by a co-prime stride
+        self.customer_low, self.customer_high, self.customer_ids = customer_source
+        self.customer_count = (len(self.customer_ids) if self.customer_ids is not None
+                               else self.customer_high - self.customer_low + 1)
+        self.zipf_exponent = model.zipf_exponent
+        self.customer_stride = _coprime_stride(self.customer_count)
+
+        # Menu popularity from category, name and size weights
+        self.item_ids = [row[0] for row in menu_items]
+        self.prices = [row[1] for row in menu_items]
+        self.item_cdf = _cdf([
+            float(model.category_weights.get(category, 1.0))
+            * float(model.item_weights.get(name, 1.0))
+            * float(model.size_weights.get(size, 1.0))
+            for _, _, name, category, size in menu_items
+        ])
+        self.count_cdf = _cdf(model.items_per_order)
+        self.quantity_cdf = _cdf(model.quantity)
+
+        # Hour slots of the window weighted by hour of day, weekday and month;
+        # partial hours at either end are weighted by the share they cover
+        start_seconds = timegm(start_date.timetuple())
+        end_seconds = max(timegm(end_date.timetuple()), start_seconds + 1)
+        self.slot_starts = []
+        self.slot_lengths = []
+        slot_weights = []
+        for slot in range(start_seconds - start_seconds % 3600, end_seconds, 3600):
+            low, high = max(slot, start_seconds), min(slot + 3600, end_seconds)
+            moment = EPOCH + timedelta(seconds=slot)
+            hourly = model.weekend_hourly if moment.weekday() >= 5 else model.hourly
+            self.slot_starts.append(low)
+            self.slot_lengths.append(high - low)
+            slot_weights.append(model.weekday[moment.weekday()] * model.monthly[moment.month - 1]
+                                * hourly[moment.hour] * (high - low) / 3600)
+        if not any(slot_weights):
+            # A window that only covers zero-weight hours falls back to uniform
+            slot_weights = list(self.slot_lengths)
+        self.slot_cdf = _cdf(slot_weights)
+
+        if np is not None:
+            self._np_store_ids = np.array(self.store_ids, dtype=np.int64)
+            self._np_store_cdf = np.array(self.store_cdf)
+            self._np_customer_ids = (np.frombuffer(self.customer_ids, dtype=np.int64)
+                                     if self.customer_ids is not None else None)
+            self._np_item_cdf = np.array(self.item_cdf)
+            self._np_count_cdf = np.array(self.count_cdf)
+            self._np_quantity_cdf = np.array(self.quantity_cdf)
+            self._np_slot_starts = np.array(self.slot_starts, dtype=np.int64)
+            self._np_slot_lengths = np.array(self.slot_lengths, dtype=np.int64)
+            self._np_slot_cdf = np.array(self.slot_cdf)
+
+    # Inverse transforms shared by the scalar and batch samplers
+
+    def _zipf_rank(self, u):
+        """Map uniform u in [0, 1) to a Zipf rank in [0, customer_count)"""
+        n, s = self.customer_count, self.zipf_exponent
+        if s == 0:
+            return int(u * n)
+        if s == 1:
+            x = math.exp(u * math.log(n + 1))
+        else:
+            x = (1 + u * ((n + 1) ** (1 - s) - 1)) ** (1 / (1 - s))
+        return min(int(x), n) - 1
+
+    def _customer_from_rank(self, rank):
+        index = (rank * self.customer_stride) % self.customer_count
+        if self.customer_ids is not None:
+            return self.customer_ids[index]
+        return self.customer_low + index
+
+    # Scalar sampling from a random.Random
+
+    def pick_store(self, rng):
+        return self.store_ids[bisect_right(self.store_cdf, rng.random())]
+
+    def pick_customer(self, rng):
+        return self._customer_from_rank(self._zipf_rank(rng.random()))
+
+    def pick_timestamp(self, rng):
+        slot = bisect_right(self.slot_cdf, rng.random())
+        seconds = self.slot_starts[slot] + rng.randrange(self.slot_lengths[slot])
+        return EPOCH + timedelta(seconds=seconds)
+
+    def pick_item_count(self, rng):
+        return bisect_right(self.count_cdf, rng.random()) + 1
+
+    def pick_menu_item(self, rng):
+        index = bisect_right(self.item_cdf, rng.random())
+        return self.item_ids[index], self.prices[index]
+
+    def pick_quantity(self, rng):
+        return bisect_right(self.quantity_cdf, rng.random()) + 1
+
+    # Batch sampling from a NumPy Generator
+
+    def draw_stores(self, rng, n):
+        return self._np_store_ids[np.searchsorted(self._np_store_cdf, rng.random(n), side='right')]
+
+    def draw_customers(self, rng, n):
+        u = rng.random(n)
+        count, s = self.customer_count, self.zipf_exponent
+        if s == 0:
+            ranks = (u * count).astype(np.int64)
+        else:
+            if s == 1:
+                x = np.exp(u * math.log(count + 1))
+            else:
+                x = (1 + u * ((count + 1) ** (1 - s) - 1)) ** (1 / (1 - s))
+            ranks = np.minimum(x.astype(np.int64), count) - 1
+        index = (ranks * self.customer_stride) % count
+        if self._np_customer_ids is not None:
+            return self._np_customer_ids[index]
+        return self.customer_low + index
+
+    def draw_epoch_seconds(self, rng, n):
+        slots = np.searchsorted(self._np_slot_cdf, rng.random(n), side='right')
+        offsets = (rng.random(n) * self._np_slot_lengths[slots]).astype(np.int64)
+        return self._np_slot_starts[slots] + offsets
+
+    def draw_item_counts(self, rng, n):
+        return np.searchsorted(self._np_count_cdf, rng.random(n), side='right') + 1
+
+    def draw_menu_indices(self, rng, n):
+        return np.searchsorted(self._np_item_cdf, rng.random(n), side='right')
+
+    def draw_quantities(self, rng, n):
+        return np.searchsorted(self._np_quantity_cdf, rng.random(n), side='right') + 1
@@ -0,0 +1,30 @@
+-- RushMore Pizzeria inventory depletion
+-- Tracks which orders have been consumed from Ingredients.stock_quantity.
+-- Safe to run repeatedly; maintained by scripts/inventory.py.
+
+-- Highest order_id whose ingredients have been deducted
+CREATE TABLE IF NOT EXISTS inventory_watermark (
+    name VARCHAR(50) PRIMARY KEY,
+    last_order_id INTEGER NOT NULL DEFAULT 0,
+    applied_at TIMESTAMP
+);
+
+INSERT INTO inventory_watermark (name) VALUES ('orders') ON CONFLICT DO NOTHING;
+
+-- One row per ingredient and consumed window of orders. An audit log with no
+-- foreign key: the bulk loaders switch Ingredients to UNLOGGED, which a logged
+-- table referencing it would block.
+CREATE TABLE IF NOT EXISTS inventory_movements (
+    movement_id BIGSERIAL PRIMARY KEY,
+    ingredient_id INTEGER NOT NULL,
+    first_order_id INTEGER NOT NULL,
+    last_order_id INTEGER NOT NULL,
+    quantity_used NUMERIC(14, 2) NOT NULL,
+    stock_after NUMERIC(10, 2) NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Installs from before the key was removed
+ALTER TABLE inventory_movements DROP CONSTRAINT IF EXISTS inventory_movements_ingredient_id_fkey;
+
+CREATE INDEX IF NOT EXISTS idx_inventory_movements_ingredient ON inventory_movements(ingredient_id, applied_at);
@@ -0,0 +1,34 @@
+-- RushMore Pizzeria population checkpoints
+-- Control tables that let an interrupted populate_database.py run resume
+-- with the same seed, time windows and ids. Created automatically by
+-- scripts/populate_database.py; safe to run repeatedly.
+
+-- One row per population run and the settings needed to replay it
+CREATE TABLE IF NOT EXISTS populate_runs (
+    run_id SERIAL PRIMARY KEY,
+    seed BIGINT NOT NULL,
+    as_of TIMESTAMP NOT NULL,
+    settings JSONB NOT NULL,
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- Stages of a run with the id block they reserved
+CREATE TABLE IF NOT EXISTS populate_stages (
+    run_id INTEGER NOT NULL REFERENCES populate_runs(run_id) ON DELETE CASCADE,
+    stage VARCHAR(50) NOT NULL,
+    first_id BIGINT,
+    row_count BIGINT,
+    completed_at TIMESTAMP,
+    PRIMARY KEY (run_id, stage)
+);
+
+-- Chunks committed so far, written in the same transaction as their rows
+CREATE TABLE IF NOT EXISTS populate_checkpoints (
+    run_id INTEGER NOT NULL REFERENCES populate_runs(run_id) ON DELETE CASCADE,
+    stage VARCHAR(50) NOT NULL,
+    chunk_first_id BIGINT NOT NULL,
+    row_count INTEGER NOT NULL,
+    committed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (run_id, stage, chunk_first_id)
+);
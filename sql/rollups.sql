@@ -0,0 +1,58 @@
+-- RushMore Pizzeria rollup layer
+-- Pre-aggregated order data behind the reports in analysis_queries.sql.
+-- Safe to run repeatedly; refreshed by scripts/rollups.py.
+
+-- Orders per store and hour (store_id 0 collects orders without a store)
+CREATE TABLE IF NOT EXISTS rollup_store_hourly (
+    store_id INTEGER NOT NULL,
+    hour_start TIMESTAMP NOT NULL,
+    order_count BIGINT NOT NULL,
+    revenue NUMERIC(18, 2) NOT NULL,
+    min_amount NUMERIC(10, 2) NOT NULL,
+    max_amount NUMERIC(10, 2) NOT NULL,
+    PRIMARY KEY (store_id, hour_start)
+);
+
+-- Quantity and revenue per menu item and day
+CREATE TABLE IF NOT EXISTS rollup_item_daily (
+    item_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    quantity BIGINT NOT NULL,
+    revenue NUMERIC(18, 2) NOT NULL,
+    PRIMARY KEY (item_id, day)
+);
+
+-- Lifetime totals per customer
+CREATE TABLE IF NOT EXISTS rollup_customer_totals (
+    customer_id INTEGER PRIMARY KEY,
+    order_count BIGINT NOT NULL,
+    revenue NUMERIC(18, 2) NOT NULL,
+    first_order_at TIMESTAMP NOT NULL,
+    last_order_at TIMESTAMP NOT NULL
+);
+
+-- Latest order_timestamp covered by the rollups
+CREATE TABLE IF NOT EXISTS rollup_watermark (
+    name VARCHAR(50) PRIMARY KEY,
+    watermark TIMESTAMP,
+    refreshed_at TIMESTAMP
+);
+
+INSERT INTO rollup_watermark (name) VALUES ('orders') ON CONFLICT DO NOTHING;
+
+-- Daily per-store view over the hourly rollup
+CREATE OR REPLACE VIEW rollup_store_daily AS
+SELECT
+    store_id,
+    hour_start::date AS day,
+    SUM(order_count)::bigint AS order_count,
+    SUM(revenue) AS revenue,
+    MIN(min_amount) AS min_amount,
+    MAX(max_amount) AS max_amount
+FROM rollup_store_hourly
+GROUP BY store_id, hour_start::date;
+
+-- Indexes for the refresh window and the reports
+CREATE INDEX IF NOT EXISTS idx_rollup_store_hourly_hour ON rollup_store_hourly(hour_start);
+CREATE INDEX IF NOT EXISTS idx_rollup_item_daily_day ON rollup_item_daily(day);
+CREATE INDEX IF NOT EXISTS idx_rollup_customer_totals_revenue ON rollup_customer_totals(revenue DESC);
@@ -0,0 +1,83 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from benchmark import TemporaryPostgres, connect, create_database  # noqa: E402
+from db import get_db_config  # noqa: E402
+
+# Rows and order by of every table the populator writes, for dataset digests
+DIGEST_TABLES = [
+    ('stores', 'store_id'),
+    ('customers', 'customer_id'),
+    ('ingredients', 'ingredient_id'),
+    ('menu_items', 'item_id'),
+    ('menu_item_ingredients', 'menu_item_id, ingredient_id'),
+    ('orders', 'order_id'),
+    ('order_items', 'order_item_id'),
+]
+
+
+@pytest.fixture(scope='session')
+def pg_server():
+    """Admin settings of the server the tests create their databases on
+
+    A throwaway initdb cluster by default. With RUSHMORE_TEST_USE_ENV=1 the
+    DB_* server from the environment is used instead; the tests only create
+    and drop rushmore_test_* databases on it.
+    """
+    if os.environ.get('RUSHMORE_TEST_USE_ENV'):
+        yield get_db_config()
+        return
+    try:
+        server = TemporaryPostgres().__enter__()
+    except RuntimeError as e:
+        pytest.skip(f"No temporary PostgreSQL ({e}); set RUSHMORE_TEST_USE_ENV=1 to use the DB_* server")
+    try:
+        yield server.db_config('postgres')
+    finally:
+        server.__exit__(None, None, None)
+
+
+@pytest.fixture
+def make_database(pg_server):
+    """Factory creating empty databases with sql/schema.sql applied; dropped after the test"""
+    created = []
+
+    def make():
+        name = f"rushmore_test_{uuid.uuid4().hex[:12]}"
+        created.append(name)
+        return create_database(pg_server, name)
+
+    yield make
+
+    conn = connect(dict(pg_server, database='postgres'))
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            for name in created:
+                cur.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def database(make_database):
+    return make_database()
+
+
+def dataset_digest(config):
+    """{table: (row count, md5 of every row in key order)} of the populated tables"""
+    conn = connect(config)
+    try:
+        with conn.cursor() as cur:
+            digest = {}
+            for table, order_by in DIGEST_TABLES:
+                cur.execute(f"SELECT COUNT(*), md5(string_agg(t::text, '|' ORDER BY {order_by})) FROM {table} t")
+                digest[table] = cur.fetchone()
+        return digest
+    finally:
+        conn.close()
@@ -0,0 +1,62 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+from analytics import AnalyticsClient
+from benchmark import connect
+from populate_database import DatabasePopulator
+
+REPORT = 'top_10_most_valuable_customers'
+
+
+@pytest.fixture
+def populated(database):
+    DatabasePopulator(db_config=database, seed=5, as_of=datetime(2026, 1, 1), chunk_size=500).populate_all(
+        customers=100, orders=1000)
+    return database
+
+
+def write(config, sql):
+    conn = connect(config)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+        conn.commit()
+    finally:
+        # Closing flushes the session's statistics counters the watermark reads
+        conn.close()
+
+
+def test_cached_report_refreshes_after_update(populated):
+    with AnalyticsClient(populated, maxconn=2, watermark_ttl=0) as client:
+        before = client.run(REPORT)
+        assert client.run(REPORT) == before
+        assert client.cache.hits == 1
+
+        # An update appends nothing, so only the write counters move the watermark
+        write(populated, "UPDATE Orders SET total_amount = 99999 WHERE order_id = (SELECT MIN(order_id) FROM Orders)")
+        deadline = time.monotonic() + 15
+        while client.run(REPORT) == before and time.monotonic() < deadline:
+            time.sleep(0.2)
+        assert client.run(REPORT) != before
+
+
+def test_pool_keeps_its_prepared_connections(populated):
+    with AnalyticsClient(populated, maxconn=3, cache_ttl=0) as client:
+        backends = set()
+
+        def hit(i):
+            def query(conn, cur):
+                cur.execute("SELECT pg_backend_pid(), pg_sleep(0.01)")
+                backends.add(cur.fetchone()[0])
+            client._with_connection(query)
+            return client.run(REPORT, limit=i % 3 + 1)
+
+        with ThreadPoolExecutor(3) as pool:
+            list(pool.map(hit, range(60)))
+
+        assert len(backends) <= 3
+        assert len(client._prepared) <= 3
+        assert not any(conn.closed for conn in client._prepared)
@@ -0,0 +1,87 @@
+from datetime import datetime
+
+import pytest
+
+from benchmark import connect
+from conftest import dataset_digest
+from populate_database import DatabasePopulator
+
+SEED = 11
+AS_OF = datetime(2026, 1, 1)
+CUSTOMERS = 200
+ORDERS = 1500
+
+
+def populate(config, **options):
+    options.setdefault('chunk_size', 300)
+    populator = DatabasePopulator(db_config=config, seed=SEED, as_of=AS_OF, **options)
+    populator.populate_all(customers=CUSTOMERS, orders=ORDERS)
+
+
+def finished_runs(config):
+    conn = connect(config)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM populate_runs WHERE finished_at IS NOT NULL")
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('options', [
+    {'loader': 'copy', 'copy_format': 'binary'},
+    {'loader': 'batch'},
+    {'async_writers': 2},
+])
+def test_loaders_write_identical_data(database, options):
+    populate(database)
+    expected = dataset_digest(database)
+    populate(database, **options)
+    assert dataset_digest(database) == expected
+
+
+def test_worker_count_does_not_change_the_data(database):
+    populate(database)
+    expected = dataset_digest(database)
+    assert expected['order_items'][0] > ORDERS
+
+    populate(database, workers=3)
+    assert dataset_digest(database) == expected
+
+
+def test_resumed_run_matches_uninterrupted_run(database):
+    populate(database)
+    expected = dataset_digest(database)
+
+    # Fail the third Order_Items write, after some order chunks have committed
+    conn = connect(database)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE SEQUENCE fail_after;
+                CREATE FUNCTION fail_once() RETURNS trigger LANGUAGE plpgsql AS $$
+                BEGIN
+                    IF nextval('fail_after') = 3 THEN
+                        RAISE EXCEPTION 'injected failure';
+                    END IF;
+                    RETURN NULL;
+                END $$;
+                CREATE TRIGGER fail_once AFTER INSERT ON order_items
+                    FOR EACH STATEMENT EXECUTE FUNCTION fail_once();
+            """)
+        conn.commit()
+
+        populate(database, workers=2)
+        assert finished_runs(database) == 1
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM orders")
+            assert 0 < cur.fetchone()[0] < ORDERS
+            cur.execute("DROP TRIGGER fail_once ON order_items; DROP FUNCTION fail_once(); DROP SEQUENCE fail_after")
+        conn.commit()
+    finally:
+        conn.close()
+
+    # Seed, sizes and chunking come from the interrupted run
+    DatabasePopulator(db_config=database).populate_all(resume=True)
+    assert finished_runs(database) == 2
+    assert dataset_digest(database) == expected
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from benchmark import connect
+from populate_database import DatabasePopulator
+from rollups import RollupManager
+
+AS_OF = datetime(2026, 1, 1)
+
+
+def test_rollup_reports_match_raw_queries(database):
+    DatabasePopulator(db_config=database, seed=3, as_of=AS_OF, chunk_size=500).populate_all(
+        customers=150, orders=1200)
+    conn = connect(database)
+    try:
+        manager = RollupManager(conn)
+        manager.install()
+        manager.refresh(full=True)
+        assert manager.verify() == []
+
+        # Appended orders are picked up by an incremental refresh
+        DatabasePopulator(db_config=database, seed=4, as_of=datetime(2026, 2, 1), chunk_size=500).populate_all(
+            clear_existing=False, customers=20, orders=300)
+        manager.refresh()
+        assert manager.verify() == []
+    finally:
+        conn.close()
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from benchmark import connect
+from conftest import dataset_digest
+from populate_database import DatabasePopulator
+from snapshot import Snapshot
+
+
+def test_snapshot_round_trip(make_database, tmp_path):
+    source = make_database()
+    DatabasePopulator(db_config=source, seed=9, as_of=datetime(2026, 1, 1), chunk_size=400).populate_all(
+        customers=150, orders=1000)
+    # Order_Items.order_id is nullable; such rows must travel with the snapshot too
+    conn = connect(source)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO Order_Items (order_id, item_id, quantity, unit_price) VALUES (NULL, 1, 1, 9.99)")
+        conn.commit()
+    finally:
+        conn.close()
+    expected = dataset_digest(source)
+
+    directory = tmp_path / 'snapshot'
+    snapshot = Snapshot.export(source, str(directory), keys_per_file=300, workers=2)
+    exported = {table['name']: table['rows'] for table in snapshot.manifest['tables']}
+    assert exported['order_items'] == expected['order_items'][0]
+    assert len([table for table in snapshot.manifest['tables'] if len(table['files']) > 1]) >= 2
+
+    target = make_database()
+    Snapshot(str(directory)).verify()
+    Snapshot(str(directory)).load(target, workers=2)
+    assert dataset_digest(target) == expected